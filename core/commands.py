@@ -1,7 +1,17 @@
+import asyncio
+import hashlib
+import json
+import logging
+
 from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
 from aiogram.types import BotCommand, BotCommandScopeChat
+from sqlalchemy import select, update
+from core.config import COMMANDS_SYNC_RATE
 from core.database import Session, User
 
+logger = logging.getLogger(__name__)
+
 async def get_commands_for_role(role: str) -> list[BotCommand]:
     """Возвращает список команд в зависимости от роли пользователя"""
     
@@ -9,7 +19,9 @@ async def get_commands_for_role(role: str) -> list[BotCommand]:
         BotCommand(command="start", description="Показать информацию о боте и командах"),
         BotCommand(command="works_list", description="Показать список всех работ"),
         BotCommand(command="read_work", description="Читать конкретную работу по ID"),
-        BotCommand(command="read", description="Читать доступные работы")
+        BotCommand(command="read", description="Читать доступные работы"),
+        BotCommand(command="search", description="Поиск работ по названию и тексту"),
+        BotCommand(command="top", description="Лучшие работы")
     ]
     
     if role == 'author' or role == 'owner':
@@ -27,26 +39,87 @@ async def get_commands_for_role(role: str) -> list[BotCommand]:
         commands.extend([
             BotCommand(command="users", description="Список пользователей"),
             BotCommand(command="setrole", description="Установить роль пользователю"),
+            BotCommand(command="setroles", description="Установить роли списком или CSV-файлом"),
+            BotCommand(command="stats", description="Статистика работы бота"),
             BotCommand(command="init_owner", description="Инициализировать владельца бота")
         ])
     
     return commands
 
-async def setup_commands(bot: Bot):
-    """Установка команд для каждого пользователя индивидуально"""
-    session = Session()
+def commands_hash(commands: list[BotCommand]) -> str:
+    payload = json.dumps([(command.command, command.description) for command in commands], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+# меню читателя, которое раньше при каждом запуске отправлялось в чат каждого
+# пользователя; меню чата перекрывает меню по умолчанию, поэтому у таких
+# читателей новые команды не появятся, пока меню не отправлено заново
+LEGACY_READER_HASH = commands_hash([
+    BotCommand(command="start", description="Показать информацию о боте и командах"),
+    BotCommand(command="works_list", description="Показать список всех работ"),
+    BotCommand(command="read_work", description="Читать конкретную работу по ID"),
+    BotCommand(command="read", description="Читать доступные работы"),
+])
+
+# пользователи, чье меню уже проверено после запуска бота
+_synced: set[int] = set()
+
+async def sync_commands(bot: Bot, user_id: int):
+    """Установка меню команд для пользователя, если оно отличается от отправленного ранее"""
+    _synced.add(user_id)
+    async with Session() as session:
+        user = (await session.execute(
+            select(User.role, User.commands_hash).filter_by(user_id=user_id)
+        )).first()
+    if user is None:
+        # незарегистрированным пользователям хватает меню по умолчанию
+        return
+
+    commands = await get_commands_for_role(user.role)
+    new_hash = commands_hash(commands)
+    # без сохраненного хэша у читателя может остаться старое меню в его чате
+    old_hash = user.commands_hash or (LEGACY_READER_HASH if user.role == 'reader' else None)
+    if old_hash == new_hash:
+        return
+
     try:
-        users = session.query(User).all()
-        
-        for user in users:
-            try:
-                commands = await get_commands_for_role(user.role)
-                await bot.set_my_commands(commands, scope=BotCommandScopeChat(chat_id=user.user_id))
-            except Exception as e:
-                print(f"Error setting commands for user {user.user_id}: {e}")
-        
-        default_commands = await get_commands_for_role('reader')
-        await bot.set_my_commands(default_commands)
-        
-    finally:
-        session.close()
\ No newline at end of file
+        await bot.set_my_commands(commands, scope=BotCommandScopeChat(chat_id=user_id))
+    except TelegramAPIError as e:
+        # например, пользователь еще не писал боту - повторим при следующем запуске
+        logger.info(f"Error setting commands for user {user_id}: {e}")
+        return
+    async with Session() as session:
+        await session.execute(update(User).filter_by(user_id=user_id).values(commands_hash=new_hash))
+        await session.commit()
+
+async def sync_commands_once(bot: Bot, user_id: int):
+    """Проверка меню при первом обращении пользователя после запуска"""
+    if user_id not in _synced:
+        await sync_commands(bot, user_id)
+
+# фоновые обновления меню; ссылки хранятся, чтобы задачи не собрал GC
+_background: set[asyncio.Task] = set()
+
+async def _sync_many(bot: Bot, user_ids: list[int], rate: float):
+    for user_id in user_ids:
+        if user_id in _synced:
+            # пользователь успел обратиться к боту, и меню уже обновлено
+            continue
+        try:
+            await sync_commands(bot, user_id)
+        except Exception as e:
+            logger.warning(f"Failed to sync commands for {user_id}: {e}")
+        await asyncio.sleep(1 / rate)
+
+def schedule_sync(bot: Bot, user_ids: list[int], rate: float = COMMANDS_SYNC_RATE) -> asyncio.Task:
+    """Обновление меню многих пользователей в фоне, не более rate запросов в секунду"""
+    # до своей очереди меню обновится и при первом обращении пользователя
+    _synced.difference_update(user_ids)
+    task = asyncio.create_task(_sync_many(bot, list(user_ids), rate))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+async def setup_commands(bot: Bot):
+    """Меню по умолчанию; меню пользователей обновляются по требованию (sync_commands)"""
+    default_commands = await get_commands_for_role('reader')
+    await bot.set_my_commands(default_commands)
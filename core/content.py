@@ -0,0 +1,119 @@
+import zlib
+from typing import Optional
+
+from sqlalchemy import select, delete, update
+
+from core.config import WORK_CHUNK_SIZE, READ_PAGE_LENGTH
+from core.database import Work, WorkChunk, WorkPage, insert
+from core.utils import page_bounds
+
+
+def split_chunks(text: str, chunk_size: int = WORK_CHUNK_SIZE):
+    """Текст -> [(seq, сжатый фрагмент)] фрагментами по chunk_size символов"""
+    return [
+        (seq, zlib.compress(text[start:start + chunk_size].encode('utf-8')))
+        for seq, start in enumerate(range(0, len(text), chunk_size))
+    ]
+
+
+async def write_content(session, work_id: int, text: str) -> int:
+    """Сохранение текста работы; возвращает длину в символах"""
+    session.add_all([
+        WorkChunk(work_id=work_id, seq=seq, data=data) for seq, data in split_chunks(text)
+    ])
+    return len(text)
+
+
+class ChunkWriter:
+    """Запись текста по частям: в памяти не больше одного несжатого фрагмента.
+
+    Фрагменты вставляются через Core insert, без объектов ORM в сессии.
+    """
+
+    def __init__(self, session, work_id: int, chunk_size: int = WORK_CHUNK_SIZE):
+        self.session = session
+        self.work_id = work_id
+        self.chunk_size = chunk_size
+        self.length = 0
+        self._seq = 0
+        self._buffer = ''
+
+    async def _flush(self, text: str):
+        await self.session.execute(WorkChunk.__table__.insert().values(
+            work_id=self.work_id, seq=self._seq, data=zlib.compress(text.encode('utf-8'))
+        ))
+        self._seq += 1
+
+    async def write(self, text: str):
+        self.length += len(text)
+        self._buffer += text
+        while len(self._buffer) >= self.chunk_size:
+            await self._flush(self._buffer[:self.chunk_size])
+            self._buffer = self._buffer[self.chunk_size:]
+
+    async def close(self) -> int:
+        """Запись остатка; возвращает длину текста в символах"""
+        if self._buffer:
+            await self._flush(self._buffer)
+            self._buffer = ''
+        return self.length
+
+
+async def read_content(session, work_id: int, start: int = 0, end: Optional[int] = None,
+                       chunk_size: int = WORK_CHUNK_SIZE) -> str:
+    """Фрагмент текста [start, end) - читаются только нужные фрагменты"""
+    stmt = select(WorkChunk.data).where(
+        WorkChunk.work_id == work_id,
+        WorkChunk.seq >= start // chunk_size,
+    ).order_by(WorkChunk.seq)
+    if end is not None:
+        stmt = stmt.where(WorkChunk.seq <= (end - 1) // chunk_size)
+
+    chunks = (await session.scalars(stmt)).all()
+    text = ''.join(zlib.decompress(data).decode('utf-8') for data in chunks)
+    offset = (start // chunk_size) * chunk_size
+    return text[start - offset:None if end is None else end - offset]
+
+
+async def read_previews(session, work_ids, length: int) -> dict[int, str]:
+    """Начало текста (не длиннее первого фрагмента) для нескольких работ одним запросом"""
+    rows = (await session.execute(
+        select(WorkChunk.work_id, WorkChunk.data).where(
+            WorkChunk.work_id.in_(work_ids),
+            WorkChunk.seq == 0,
+        )
+    )).all()
+    return {work_id: zlib.decompress(data).decode('utf-8')[:length] for work_id, data in rows}
+
+
+async def build_pages(session, work_id: int, text: Optional[str] = None) -> int:
+    """Разметка текста на страницы для чтения; возвращает число страниц.
+
+    Выполняется при одобрении; для работ, одобренных раньше, - при первом чтении.
+    Повторная разметка той же работы параллельно не приводит к ошибке.
+    """
+    if text is None:
+        text = await read_content(session, work_id)
+    bounds = page_bounds(text, READ_PAGE_LENGTH) or [(0, 0)]
+    await session.execute(
+        insert(WorkPage).on_conflict_do_nothing(index_elements=[WorkPage.work_id, WorkPage.page]),
+        [{'work_id': work_id, 'page': page, 'start_offset': start, 'end_offset': end}
+         for page, (start, end) in enumerate(bounds)],
+    )
+    await session.execute(update(Work).where(Work.id == work_id).values(pages_count=len(bounds)))
+    return len(bounds)
+
+
+async def read_page(session, work_id: int, page: int) -> Optional[str]:
+    """Текст одной страницы; читаются только фрагменты, в которые она попадает"""
+    bounds = (await session.execute(
+        select(WorkPage.start_offset, WorkPage.end_offset).where(WorkPage.work_id == work_id, WorkPage.page == page)
+    )).first()
+    if bounds is None:
+        return None
+    return await read_content(session, work_id, *bounds)
+
+
+async def delete_content(session, work_id: int):
+    await session.execute(delete(WorkPage).where(WorkPage.work_id == work_id))
+    await session.execute(delete(WorkChunk).where(WorkChunk.work_id == work_id))
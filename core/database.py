@@ -1,44 +1,176 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Float, Boolean
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Float, Boolean, LargeBinary, Text, Index, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base, relationship
 
-engine = create_engine('sqlite:///bot_database.db')
-Session = sessionmaker(bind=engine)
+from core import profiler
+from core.config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    SQLITE_BUSY_TIMEOUT, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE,
+)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Настройка каждого нового соединения SQLite"""
+    cursor = dbapi_connection.cursor()
+    # WAL: читатели не ждут пишущую транзакцию, commit не блокирует чтение
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # в режиме WAL NORMAL безопасен для целостности и не делает fsync на каждый commit
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def create_engine_from_url(url: str = DATABASE_URL, **kwargs):
+    """AsyncEngine по URL из конфигурации (SQLite или PostgreSQL)"""
+    url = make_url(url)
+    options = {}
+    if 'poolclass' not in kwargs and url.database not in (None, '', ':memory:'):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    if url.get_backend_name() != 'sqlite':
+        options['pool_pre_ping'] = True
+    options.update(kwargs)
+
+    engine = create_async_engine(url, **options)
+    if url.get_backend_name() == 'sqlite':
+        event.listen(engine.sync_engine, 'connect', _set_sqlite_pragmas)
+    profiler.instrument(engine)
+    return engine
+
+engine = create_engine_from_url()
+# expire_on_commit=False: после commit атрибуты объектов остаются доступны
+# без повторного (неявного, а значит синхронного) запроса к базе
+Session = async_sessionmaker(bind=engine, expire_on_commit=False)
 Base = declarative_base()
 
+# Telegram ID не помещаются в 32 бита (INTEGER в PostgreSQL); в SQLite INTEGER 64-битный
+TelegramId = BigInteger().with_variant(Integer, 'sqlite')
+
+def insert(model):
+    """INSERT с поддержкой on_conflict_do_update для текущей базы"""
+    dialect = Session.kw['bind'].dialect.name
+    return (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(model)
+
 class User(Base):
     __tablename__ = 'users'
+    # /users с фильтром по роли листает по id; покрывает и подсчет GROUP BY role
+    __table_args__ = (Index('ix_users_role_id', 'role', 'id'),)
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, unique=True)
+    user_id = Column(TelegramId, unique=True)
     role = Column(String)
+    commands_hash = Column(String)  # хэш последнего отправленного меню команд (core.commands)
 
 class Work(Base):
     __tablename__ = 'works'
     id = Column(Integer, primary_key=True)
-    author_id = Column(Integer, ForeignKey('users.id'))
+    author_id = Column(Integer, ForeignKey('users.id'), index=True)
     title = Column(String)
-    content = Column(String)
+    # сам текст хранится сжатыми фрагментами в work_chunks (см. core.content)
+    content_length = Column(Integer)  # длина текста в символах
+    pages_count = Column(Integer)  # страниц для чтения (work_pages); None - еще не размечена
+    # аренда в очереди проверки (core.moderation): Telegram ID модератора и срок в time.time()
+    claimed_by = Column(TelegramId)
+    claimed_until = Column(Float, nullable=False, default=0)
     theme = Column(String)
     genre = Column(String)
     age_restriction = Column(Integer, default=0)
-    is_approved = Column(Boolean, default=False)
+    is_approved = Column(Boolean, default=False, index=True)
+    # rating = rating_sum / ratings_count; все три обновляются одним UPDATE (reader.process_review)
     rating = Column(Float, default=0.0)
+    rating_sum = Column(Integer, nullable=False, default=0)
     ratings_count = Column(Integer, default=0)
+    # гистограмма оценок для сводки отзывов, увеличивается тем же UPDATE, что и rating_sum
+    stars_1 = Column(Integer, nullable=False, default=0)
+    stars_2 = Column(Integer, nullable=False, default=0)
+    stars_3 = Column(Integer, nullable=False, default=0)
+    stars_4 = Column(Integer, nullable=False, default=0)
+    stars_5 = Column(Integer, nullable=False, default=0)
+
+    # lazy='raise': в асинхронной сессии связи подгружаются только явно
+    # (joinedload/selectinload), случайный N+1 сразу виден как ошибка
+    author = relationship('User', lazy='raise')
+
+class WorkChunk(Base):
+    """Фрагмент текста работы фиксированной длины, сжатый zlib"""
+    __tablename__ = 'work_chunks'
+    work_id = Column(Integer, ForeignKey('works.id'), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+
+class WorkPage(Base):
+    """Страница для чтения: символьные границы [start_offset, end_offset) в тексте работы"""
+    __tablename__ = 'work_pages'
+    work_id = Column(Integer, ForeignKey('works.id'), primary_key=True)
+    page = Column(Integer, primary_key=True)
+    start_offset = Column(Integer, nullable=False)
+    end_offset = Column(Integer, nullable=False)
+
+class WorkRanking(Base):
+    """Материализованный рейтинг одобренных работ для /top (см. core.rankings)"""
+    __tablename__ = 'work_rankings'
+    __table_args__ = (
+        Index('ix_work_rankings_score', 'score', 'work_id'),
+        Index('ix_work_rankings_genre_score', 'genre', 'score', 'work_id'),
+        Index('ix_work_rankings_theme_score', 'theme', 'score', 'work_id'),
+    )
+    work_id = Column(Integer, ForeignKey('works.id'), primary_key=True)
+    genre = Column(String)
+    theme = Column(String)
+    score = Column(Float, nullable=False)
+
+class Profile(Base):
+    """Последние известные username и имя пользователя Telegram"""
+    __tablename__ = 'profiles'
+    user_id = Column(TelegramId, primary_key=True)  # Telegram ID, как User.user_id
+    username = Column(String)
+    full_name = Column(String)
+    updated_at = Column(Float)
+    # в нижнем регистре для поиска по префиксу в /users (core.profiles.search_key)
+    username_key = Column(String, index=True)
+    name_key = Column(String, index=True)
 
 class Review(Base):
     __tablename__ = 'reviews'
+    # одна оценка на пользователя; второй индекс - страницы отзывов к работе, новые первыми
+    __table_args__ = (
+        Index('uq_reviews_work_user', 'work_id', 'user_id', unique=True),
+        Index('ix_reviews_work_id', 'work_id', 'id'),
+    )
     id = Column(Integer, primary_key=True)
     work_id = Column(Integer, ForeignKey('works.id'))
     user_id = Column(Integer, ForeignKey('users.id'))
     rating = Column(Integer)
-    review_text = Column(String)
+    review_text = Column(String)  # None - оценка без отзыва
     created_at = Column(String)
 
-def get_session():
-    session = Session()
-    try:
-        yield session
-    finally:
-        session.close()
+    work = relationship('Work', lazy='raise')
+    user = relationship('User', lazy='raise')
 
-Base.metadata.create_all(engine)
\ No newline at end of file
+class OutboxMessage(Base):
+    """Уведомление, записанное в одной транзакции с изменением (см. core.outbox)"""
+    __tablename__ = 'outbox'
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(TelegramId, nullable=False)
+    text = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(Float, nullable=False, default=0.0, index=True)
+
+class FsmState(Base):
+    """Состояние диалога aiogram (см. core.storage)"""
+    __tablename__ = 'fsm_states'
+    key = Column(String, primary_key=True)
+    state = Column(String)
+    data = Column(Text, nullable=False, default='{}')
+    updated_at = Column(Float, nullable=False, index=True)
+
+class SchemaVersion(Base):
+    """Примененные миграции схемы (см. core.migrations)"""
+    __tablename__ = 'schema_version'
+    version = Column(Integer, primary_key=True)
+    applied_at = Column(String)
+
+async def get_session():
+    async with Session() as session:
+        yield session
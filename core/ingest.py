@@ -0,0 +1,164 @@
+"""Прием текста работы из .txt-файла.
+
+Файл скачивается потоком (по DOWNLOAD_CHUNK_SIZE байт), декодируется
+инкрементально и сразу пишется фрагментами в work_chunks, поэтому память
+на одну загрузку не зависит от размера файла. Кодировка определяется
+по первым не-ASCII байтам: BOM, затем UTF-8, иначе Windows-1251 (частая
+для русских текстов). Переводы строк приводятся к \\n.
+
+Фрагменты записываются короткими транзакциями, чтобы медленная загрузка
+не держала блокировку базы. Пока загрузка не завершена, у работы
+content_length = NULL: такие работы не попадают к модераторам и удаляются
+при ошибке или при следующем запуске бота.
+"""
+import codecs
+import logging
+import re
+from typing import AsyncGenerator
+
+import aiofiles
+from aiogram import Bot
+from sqlalchemy import delete, select
+
+from core.config import DOWNLOAD_CHUNK_SIZE, MAX_UPLOAD_SIZE, MAX_WORK_LENGTH
+from core.content import ChunkWriter, delete_content
+from core.database import Session, Work
+
+logger = logging.getLogger(__name__)
+
+DETECT_SIZE = 4096  # байт для определения кодировки
+_NON_ASCII = re.compile(rb'[\x80-\xff]')
+_BOMS = ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+
+
+class IngestError(Exception):
+    """Файл нельзя принять; текст исключения показывается автору"""
+
+
+def _too_large() -> IngestError:
+    return IngestError(f"Файл слишком большой. Максимальный размер - {MAX_UPLOAD_SIZE // 2 ** 20} МБ.")
+
+
+def _too_long() -> IngestError:
+    return IngestError(f"Текст работы слишком длинный.\nМаксимальная длина - {MAX_WORK_LENGTH} символов.")
+
+
+def detect_encoding(head: bytes) -> str:
+    """Кодировка по первым байтам файла"""
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    try:
+        # final=False: многобайтный символ может быть разрезан концом блока
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1251'
+
+
+class TextDecoder:
+    """Инкрементальное декодирование с нормализацией переводов строк"""
+
+    def __init__(self):
+        self.encoding = None
+        self._decoder = None
+        self._head = b''
+        self._pending_cr = False
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        text = ''
+        if self._decoder is None:
+            # ASCII одинаков во всех поддерживаемых кодировках: кодировка определяется
+            # по DETECT_SIZE байтам от первого не-ASCII байта, чтобы латинский
+            # титульный лист не выбрал UTF-8 для текста в Windows-1251
+            self._head += data
+            first = _NON_ASCII.search(self._head)
+            ascii_end = first.start() if first else len(self._head)
+            text = self._head[:ascii_end].decode('ascii')
+            self._head = self._head[ascii_end:]
+            if not final and (first is None or len(self._head) < DETECT_SIZE):
+                return self._normalize(text, final)
+            data, self._head = self._head, b''
+            self.encoding = detect_encoding(data) if data else 'utf-8'
+            # в cp1251 не определен только байт 0x98 - заменяем, а не отвергаем файл
+            errors = 'replace' if self.encoding == 'cp1251' else 'strict'
+            self._decoder = codecs.getincrementaldecoder(self.encoding)(errors)
+        try:
+            text += self._decoder.decode(data, final)
+        except UnicodeDecodeError:
+            raise IngestError("Не удалось прочитать файл: сохраните его в кодировке UTF-8 или Windows-1251.")
+        return self._normalize(text, final)
+
+    def _normalize(self, text: str, final: bool) -> str:
+        if self._pending_cr:
+            text = '\r' + text
+            self._pending_cr = False
+        # \r в конце блока может оказаться началом \r\n
+        if not final and text.endswith('\r'):
+            text = text[:-1]
+            self._pending_cr = True
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+async def stream_file(bot: Bot, file_path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                      timeout: int = 30) -> AsyncGenerator[bytes, None]:
+    """Содержимое файла Telegram блоками, без сохранения целиком"""
+    if bot.session.api.is_local:
+        async with aiofiles.open(bot.session.api.wrap_local_file.to_local(file_path), 'rb') as f:
+            while chunk := await f.read(chunk_size):
+                yield chunk
+        return
+    url = bot.session.api.file_url(bot.token, file_path)
+    async for chunk in bot.session.stream_content(url=url, timeout=timeout, chunk_size=chunk_size,
+                                                  raise_for_status=True):
+        yield chunk
+
+
+async def ingest_file(bot: Bot, file_id: str, work_id: int) -> int:
+    """Загрузка файла в текст работы work_id; возвращает длину текста в символах.
+
+    content_length не заполняется - это делает вызывающий вместе с остальными
+    изменениями; при ошибке записанные фрагменты остаются (см. discard_upload).
+    """
+    file = await bot.get_file(file_id)
+    if file.file_size is not None and file.file_size > MAX_UPLOAD_SIZE:
+        raise _too_large()
+
+    decoder = TextDecoder()
+    received = 0
+    async with Session() as session:
+        writer = ChunkWriter(session, work_id)
+        async for data in stream_file(bot, file.file_path):
+            received += len(data)
+            if received > MAX_UPLOAD_SIZE:
+                raise _too_large()
+            await writer.write(decoder.decode(data))
+            if writer.length > MAX_WORK_LENGTH:
+                raise _too_long()
+            # каждый записанный фрагмент - отдельная короткая транзакция
+            await session.commit()
+        await writer.write(decoder.decode(b'', final=True))
+        length = await writer.close()
+        if length > MAX_WORK_LENGTH:
+            raise _too_long()
+        await session.commit()
+    logger.debug(f"Work {work_id}: {received} bytes in {decoder.encoding}, {length} characters")
+    return length
+
+
+async def discard_upload(work_id: int):
+    """Удаление незавершенной загрузки"""
+    async with Session() as session:
+        await delete_content(session, work_id)
+        await session.execute(delete(Work).where(Work.id == work_id))
+        await session.commit()
+
+
+async def purge_incomplete_uploads():
+    """Удаление работ, загрузка которых прервалась (остановка бота во время загрузки)"""
+    async with Session() as session:
+        work_ids = (await session.scalars(select(Work.id).where(Work.content_length.is_(None)))).all()
+    for work_id in work_ids:
+        await discard_upload(work_id)
+    if work_ids:
+        logger.info(f"Removed {len(work_ids)} incomplete uploads")
@@ -0,0 +1,220 @@
+"""Метрики обработки обновлений и запросов к Telegram API.
+
+UpdateMetricsMiddleware (outer, dp.update) считает обновления, ошибки
+и обновления в обработке; HandlerMetricsMiddleware (inner, message и
+callback_query) - гистограммы задержек по каждому обработчику;
+ApiMetricsMiddleware (bot.session) - запросы к API по методам.
+Данные отдаются в формате Prometheus по HTTP (/metrics) и кратко - командой /stats.
+"""
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject, Update
+from aiohttp import web
+
+from core.config import METRICS_HOST, METRICS_PORT
+from core.render_cache import renders
+
+logger = logging.getLogger(__name__)
+
+# границы корзин гистограммы, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.updates: Counter = Counter()          # по типу обновления
+        self.unhandled: Counter = Counter()
+        self.update_errors: Counter = Counter()
+        self.in_flight = 0
+        self.handler_latency: dict[str, Histogram] = defaultdict(Histogram)
+        self.handler_errors: Counter = Counter()
+        self.api_calls: Counter = Counter()        # по методу API
+        self.api_errors: Counter = Counter()
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        metric('bot_updates_total', 'counter', "Received updates",
+               [({'type': kind}, count) for kind, count in sorted(self.updates.items())])
+        metric('bot_updates_unhandled_total', 'counter', "Updates without a matching handler",
+               [({'type': kind}, count) for kind, count in sorted(self.unhandled.items())])
+        metric('bot_update_errors_total', 'counter', "Updates failed with an exception",
+               [({'type': kind}, count) for kind, count in sorted(self.update_errors.items())])
+        metric('bot_updates_in_flight', 'gauge', "Updates being processed", [({}, self.in_flight)])
+
+        lines.append("# HELP bot_handler_duration_seconds Handler latency")
+        lines.append("# TYPE bot_handler_duration_seconds histogram")
+        for handler, histogram in sorted(self.handler_latency.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'bot_handler_duration_seconds_bucket{{handler="{handler}",le="{bound}"}} {cumulative}')
+            lines.append(f'bot_handler_duration_seconds_sum{{handler="{handler}"}} {histogram.sum}')
+            lines.append(f'bot_handler_duration_seconds_count{{handler="{handler}"}} {histogram.count}')
+
+        metric('bot_handler_errors_total', 'counter', "Handler exceptions",
+               [({'handler': handler}, count) for handler, count in sorted(self.handler_errors.items())])
+        metric('bot_api_requests_total', 'counter', "Telegram API requests",
+               [({'method': method}, count) for method, count in sorted(self.api_calls.items())])
+        metric('bot_api_errors_total', 'counter', "Failed Telegram API requests",
+               [({'method': method}, count) for method, count in sorted(self.api_errors.items())])
+        metric('bot_render_cache_hits_total', 'counter', "List pages served from the render cache",
+               [({}, renders.hits)])
+        metric('bot_render_cache_misses_total', 'counter', "List pages built from the database",
+               [({}, renders.misses)])
+        metric('bot_render_cache_bytes', 'gauge', "Estimated render cache size", [({}, renders.size)])
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """Краткая сводка для /stats"""
+        uptime = int(time.time() - self.started_at)
+        text = (
+            f"📈 Статистика (работает {uptime // 3600} ч {uptime % 3600 // 60} мин)\n\n"
+            f"Обновлений: {sum(self.updates.values())}, в обработке: {self.in_flight}\n"
+            f"Ошибок: {sum(self.update_errors.values())}, без обработчика: {sum(self.unhandled.values())}\n"
+            f"Запросов к API: {sum(self.api_calls.values())}, ошибок API: {sum(self.api_errors.values())}\n"
+            f"Кэш страниц: {renders.hits} попаданий, {renders.misses} промахов, "
+            f"{len(renders)} страниц, ~{renders.size // 1024} КБ\n"
+        )
+        if self.handler_latency:
+            text += "\nОбработчик: вызовов, среднее / p95, мс\n"
+            slowest = sorted(self.handler_latency.items(), key=lambda item: item[1].quantile(0.95), reverse=True)
+            for handler, histogram in slowest:
+                errors = self.handler_errors[handler]
+                text += (
+                    f"• {handler}: {histogram.count}, "
+                    f"{histogram.sum / histogram.count * 1000:.0f} / ≤{histogram.quantile(0.95) * 1000:.0f}"
+                    + (f", ошибок: {errors}" if errors else "") + "\n"
+                )
+        return text
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Счетчики обновлений; подключается как outer middleware к dp.update"""
+
+    def __init__(self, registry: Optional[Metrics] = None):
+        self.metrics = registry or metrics
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        kind = event.event_type if isinstance(event, Update) else type(event).__name__
+        self.metrics.updates[kind] += 1
+        self.metrics.in_flight += 1
+        try:
+            result = await handler(event, data)
+        except Exception:
+            self.metrics.update_errors[kind] += 1
+            raise
+        finally:
+            self.metrics.in_flight -= 1
+        if result is UNHANDLED:
+            self.metrics.unhandled[kind] += 1
+        return result
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Задержка и ошибки конкретного обработчика (inner middleware)"""
+
+    def __init__(self, registry: Optional[Metrics] = None):
+        self.metrics = registry or metrics
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        callback = data['handler'].callback
+        name = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.metrics.handler_errors[name] += 1
+            raise
+        finally:
+            self.metrics.handler_latency[name].observe(time.perf_counter() - started)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Счетчики исходящих запросов к Telegram (middleware для bot.session)"""
+
+    def __init__(self, registry: Optional[Metrics] = None):
+        self.metrics = registry or metrics
+
+    async def __call__(self, make_request, bot: Bot, method):
+        name = type(method).__name__
+        self.metrics.api_calls[name] += 1
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            self.metrics.api_errors[name] += 1
+            raise
+
+
+def build_metrics_app(registry: Optional[Metrics] = None) -> web.Application:
+    registry = registry or metrics
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    return app
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    """Запуск /metrics; остановка - runner.cleanup()"""
+    if not port:
+        return None
+    runner = web.AppRunner(build_metrics_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics available at http://{host}:{port}/metrics")
+    return runner
+
+
+metrics = Metrics()
@@ -0,0 +1,46 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from core.commands import sync_commands_once
+from core.profiles import profiles
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileMiddleware(BaseMiddleware):
+    """Обновляет кэш профилей по from_user каждого входящего события"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = getattr(event, 'from_user', None)
+        if user is not None:
+            try:
+                await profiles.remember(user)
+            except Exception as e:
+                logger.warning(f"Failed to remember profile {user.id}: {e}")
+        return await handler(event, data)
+
+
+class CommandSyncMiddleware(BaseMiddleware):
+    """Обновляет меню команд пользователя при первом обращении после запуска бота"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = getattr(event, 'from_user', None)
+        if user is not None:
+            try:
+                await sync_commands_once(data['bot'], user.id)
+            except Exception as e:
+                logger.warning(f"Failed to sync commands for {user.id}: {e}")
+        return await handler(event, data)
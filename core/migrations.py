@@ -0,0 +1,219 @@
+"""Версионные миграции схемы базы.
+
+Новые таблицы и индексы, объявленные в моделях, создает create_all.
+Изменения уже существующих таблиц (колонки, индексы, перенос данных)
+описываются здесь функциями миграций с возрастающими номерами; номера
+примененных миграций хранятся в таблице schema_version.
+"""
+import logging
+import zlib
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from core import database
+from core.content import split_chunks
+from core.config import READ_PAGE_LENGTH
+from core.database import Base, SchemaVersion, WorkChunk, WorkPage, WorkRanking
+from core.profiles import search_key
+from core.rankings import bayesian_score, normalize_category
+from core.search import CREATE_FTS
+from core.utils import page_bounds
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn, table: str) -> set[str]:
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+def _move_content_to_chunks(conn):
+    """Перенос текстов из старой колонки works.content в work_chunks"""
+    columns = _columns(conn, 'works')
+    if 'content_length' not in columns:
+        conn.execute(text("ALTER TABLE works ADD COLUMN content_length INTEGER"))
+    if 'content' not in columns:
+        return
+
+    rows = conn.execute(text("SELECT id, content FROM works WHERE content IS NOT NULL")).all()
+    for work_id, content in rows:
+        conn.execute(WorkChunk.__table__.insert(), [
+            {'work_id': work_id, 'seq': seq, 'data': data} for seq, data in split_chunks(content)
+        ])
+        conn.execute(
+            text("UPDATE works SET content_length = :length WHERE id = :id"),
+            {'length': len(content), 'id': work_id},
+        )
+    conn.execute(text("ALTER TABLE works DROP COLUMN content"))
+
+
+def _add_query_indexes(conn):
+    """Индексы под фильтры read_work / start_rating / process_rating / show_reviews"""
+    # до уникального индекса оставляем по одной (последней) оценке на пользователя
+    conn.execute(text(
+        "DELETE FROM reviews WHERE id NOT IN "
+        "(SELECT MAX(id) FROM reviews GROUP BY work_id, user_id)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_works_is_approved ON works (is_approved)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_works_author_id ON works (author_id)"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_reviews_work_user ON reviews (work_id, user_id)"
+    ))
+
+
+def _add_commands_hash(conn):
+    """Колонка для синхронизации меню команд по требованию"""
+    if 'commands_hash' not in _columns(conn, 'users'):
+        conn.execute(text("ALTER TABLE users ADD COLUMN commands_hash VARCHAR"))
+
+
+def _read_content(conn, work_id: int) -> str:
+    chunks = conn.execute(
+        text("SELECT data FROM work_chunks WHERE work_id = :id ORDER BY seq"), {'id': work_id}
+    ).scalars()
+    return ''.join(zlib.decompress(data).decode('utf-8') for data in chunks)
+
+
+def _create_search_index(conn):
+    """FTS5-индекс для /search по уже одобренным работам"""
+    if conn.dialect.name != 'sqlite':
+        return
+    conn.execute(text(CREATE_FTS))
+    works = conn.execute(text("SELECT id, title FROM works WHERE is_approved")).all()
+    for work_id, title in works:
+        content = _read_content(conn, work_id)
+        conn.execute(
+            text("INSERT INTO works_fts (rowid, title, content) VALUES (:id, :title, :content)"),
+            {'id': work_id, 'title': title, 'content': content},
+        )
+
+
+def _add_rating_sum(conn):
+    """Целочисленная сумма оценок вместо пересчета среднего в Python"""
+    if 'rating_sum' not in _columns(conn, 'works'):
+        conn.execute(text("ALTER TABLE works ADD COLUMN rating_sum INTEGER NOT NULL DEFAULT 0"))
+    # оценки без отзыва раньше не сохранялись - сумма восстанавливается из среднего
+    conn.execute(text(
+        "UPDATE works SET rating_sum = CAST(ROUND(COALESCE(rating, 0) * COALESCE(ratings_count, 0)) AS INTEGER)"
+    ))
+    conn.execute(text(
+        "UPDATE works SET rating = CASE WHEN ratings_count > 0 "
+        "THEN CAST(rating_sum AS FLOAT) / ratings_count ELSE 0 END"
+    ))
+
+
+def _fill_rankings(conn):
+    """Рейтинг /top для уже одобренных работ (таблицу создает create_all)"""
+    works = conn.execute(text(
+        "SELECT id, genre, theme, rating_sum, ratings_count FROM works WHERE is_approved"
+    )).all()
+    if works:
+        conn.execute(WorkRanking.__table__.insert(), [
+            {'work_id': work_id, 'genre': normalize_category(genre), 'theme': normalize_category(theme),
+             'score': bayesian_score(rating_sum or 0, ratings_count or 0)}
+            for work_id, genre, theme, rating_sum, ratings_count in works
+        ])
+
+
+def _add_work_pages(conn):
+    """Разметка одобренных работ на страницы для /read_work (таблицу создает create_all)"""
+    if 'pages_count' not in _columns(conn, 'works'):
+        conn.execute(text("ALTER TABLE works ADD COLUMN pages_count INTEGER"))
+    for work_id in conn.execute(text("SELECT id FROM works WHERE is_approved")).scalars().all():
+        bounds = page_bounds(_read_content(conn, work_id), READ_PAGE_LENGTH) or [(0, 0)]
+        conn.execute(WorkPage.__table__.insert(), [
+            {'work_id': work_id, 'page': page, 'start_offset': start, 'end_offset': end}
+            for page, (start, end) in enumerate(bounds)
+        ])
+        conn.execute(
+            text("UPDATE works SET pages_count = :count WHERE id = :id"), {'count': len(bounds), 'id': work_id}
+        )
+
+
+def _fill_content_length(conn):
+    """content_length = NULL теперь означает незавершенную загрузку файла"""
+    conn.execute(text("UPDATE works SET content_length = 0 WHERE content_length IS NULL"))
+
+
+def _add_review_lease(conn):
+    """Колонки аренды для очереди проверки"""
+    columns = _columns(conn, 'works')
+    if 'claimed_by' not in columns:
+        column_type = 'BIGINT' if conn.dialect.name == 'postgresql' else 'INTEGER'
+        conn.execute(text(f"ALTER TABLE works ADD COLUMN claimed_by {column_type}"))
+    if 'claimed_until' not in columns:
+        conn.execute(text("ALTER TABLE works ADD COLUMN claimed_until FLOAT NOT NULL DEFAULT 0"))
+
+
+def _add_rating_histogram(conn):
+    """Гистограмма оценок в works и индекс для страниц отзывов.
+
+    Считается по строкам reviews; старые оценки без отзыва не сохранялись
+    и в гистограмму не попадают.
+    """
+    columns = _columns(conn, 'works')
+    for stars in range(1, 6):
+        if f'stars_{stars}' not in columns:
+            conn.execute(text(f"ALTER TABLE works ADD COLUMN stars_{stars} INTEGER NOT NULL DEFAULT 0"))
+    for work_id, rating, count in conn.execute(text(
+        "SELECT work_id, rating, COUNT(*) FROM reviews WHERE rating BETWEEN 1 AND 5 GROUP BY work_id, rating"
+    )).all():
+        conn.execute(text(f"UPDATE works SET stars_{rating} = :count WHERE id = :id"), {'count': count, 'id': work_id})
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_reviews_work_id ON reviews (work_id, id)"))
+
+
+def _add_user_directory_indexes(conn):
+    """Поиск и фильтры /users: ключи профилей и индексы"""
+    columns = _columns(conn, 'profiles')
+    for column in ('username_key', 'name_key'):
+        if column not in columns:
+            conn.execute(text(f"ALTER TABLE profiles ADD COLUMN {column} VARCHAR"))
+    # lower() в SQLite меняет регистр только латиницы - ключи считаются в Python
+    rows = conn.execute(text("SELECT user_id, username, full_name FROM profiles")).all()
+    for user_id, username, full_name in rows:
+        conn.execute(
+            text("UPDATE profiles SET username_key = :username, name_key = :name WHERE user_id = :id"),
+            {'username': search_key(username), 'name': search_key(full_name), 'id': user_id},
+        )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_profiles_username_key ON profiles (username_key)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_profiles_name_key ON profiles (name_key)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_role_id ON users (role, id)"))
+
+
+MIGRATIONS = [
+    (1, _move_content_to_chunks),
+    (2, _add_query_indexes),
+    (3, _add_commands_hash),
+    (4, _create_search_index),
+    (5, _add_rating_sum),
+    (6, _fill_rankings),
+    (7, _add_work_pages),
+    (8, _fill_content_length),
+    (9, _add_review_lease),
+    (10, _add_rating_histogram),
+    (11, _add_user_directory_indexes),
+]
+
+
+def upgrade(conn):
+    """Приведение схемы к последней версии (синхронно, внутри одной транзакции)"""
+    is_new = not inspect(conn).has_table('works')
+    Base.metadata.create_all(conn)
+
+    applied = set(conn.execute(text("SELECT version FROM schema_version")).scalars())
+    for version, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        # свежая база уже создана по текущим моделям - миграции только отмечаются
+        if not is_new:
+            logger.info(f"Applying migration {version}: {migration.__name__}")
+            migration(conn)
+        conn.execute(SchemaVersion.__table__.insert().values(
+            version=version, applied_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ))
+
+
+async def init_db(engine=None):
+    """Создание и обновление схемы при запуске бота"""
+    async with (engine or database.engine).begin() as conn:
+        await conn.run_sync(upgrade)
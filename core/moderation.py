@@ -0,0 +1,87 @@
+"""Очередь работ на проверку с арендой.
+
+Модератор получает следующую работу вместе с арендой на REVIEW_LEASE_TTL
+секунд (works.claimed_by / claimed_until): другие модераторы ее пропускают,
+а по истечении срока она снова доступна всем. Захват - один UPDATE с
+проверкой условия, поэтому двое модераторов не получат одну работу.
+
+Поиск следующей работы идет по индексу ix_works_is_approved: для
+is_approved = false строки в нем упорядочены по id, пропускаются только
+арендованные другими и незагруженные работы.
+"""
+import time
+from typing import Optional
+
+from sqlalchemy import and_, func, or_, select, update
+
+from core.config import REVIEW_LEASE_TTL
+from core.database import Work
+
+
+def _pending():
+    # content_length = NULL - файл еще загружается (см. core.ingest)
+    return and_(Work.is_approved == False, Work.content_length.is_not(None))
+
+
+def _available(moderator_id: int, now: float):
+    """Работа свободна или уже арендована этим модератором"""
+    return or_(Work.claimed_until < now, Work.claimed_by == moderator_id)
+
+
+async def _claim_after(session, moderator_id: int, after: Optional[int], skip: Optional[int]):
+    now = time.time()
+    candidate = select(Work.id).where(_pending(), _available(moderator_id, now))
+    if after is not None:
+        candidate = candidate.where(Work.id > after)
+    if skip is not None:
+        candidate = candidate.where(Work.id != skip)
+    candidate = candidate.order_by(Work.id).limit(1).scalar_subquery()
+    # условие повторяется во внешнем UPDATE: в PostgreSQL оно перепроверяется после блокировки строки
+    return (await session.execute(
+        update(Work)
+        .where(Work.id == candidate, _available(moderator_id, now))
+        .values(claimed_by=moderator_id, claimed_until=now + REVIEW_LEASE_TTL)
+        .returning(Work.id, Work.title, Work.content_length)
+        .execution_options(synchronize_session=False)
+    )).first()
+
+
+async def claim_next(session, moderator_id: int, after: Optional[int] = None):
+    """Аренда следующей работы после after (по кругу); (id, title, content_length) или None"""
+    for _ in range(3):
+        work = await _claim_after(session, moderator_id, after, after)
+        if work is None and after is not None:
+            # дошли до конца очереди - начинаем сначала, пропуская текущую работу
+            work = await _claim_after(session, moderator_id, None, after)
+        if work is not None:
+            return work
+        # кандидата перехватил другой модератор между выбором и UPDATE
+        if not await session.scalar(select(Work.id).where(_pending(), Work.claimed_until < time.time()).limit(1)):
+            return None
+    return None
+
+
+async def take_work(session, work_id: int, moderator_id: int) -> bool:
+    """Захват работы для решения: False, если она уже проверена или ее проверяет другой"""
+    now = time.time()
+    result = await session.execute(
+        update(Work)
+        .where(Work.id == work_id, _pending(), _available(moderator_id, now))
+        .values(claimed_by=moderator_id, claimed_until=now + REVIEW_LEASE_TTL)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def release(session, work_id: int, moderator_id: int):
+    """Возврат работы в очередь"""
+    await session.execute(
+        update(Work)
+        .where(Work.id == work_id, Work.claimed_by == moderator_id)
+        .values(claimed_by=None, claimed_until=0)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def pending_count(session) -> int:
+    return await session.scalar(select(func.count()).select_from(Work).where(_pending()))
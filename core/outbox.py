@@ -0,0 +1,132 @@
+"""Transactional outbox для уведомлений.
+
+Обработчик добавляет уведомление в таблицу outbox той же сессией, в которой
+меняет данные, и после commit будит воркер. OutboxWorker пачками отправляет
+сообщения с приоритетом уведомлений и повторяет неудачные попытки
+с экспоненциальной задержкой.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import select, delete, insert, update
+
+from core.config import OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY
+from core.database import Session, OutboxMessage
+from core.sender import send_priority, PRIORITY_NOTIFICATION
+
+logger = logging.getLogger(__name__)
+
+_worker: Optional['OutboxWorker'] = None
+
+
+def enqueue(session, chat_id: int, text: str):
+    """Уведомление будет отправлено после commit сессии"""
+    session.add(OutboxMessage(chat_id=chat_id, text=text, attempts=0, next_attempt_at=0.0))
+
+
+async def enqueue_many(session, messages: list[tuple[int, str]]):
+    """Пачка уведомлений (chat_id, text) одним INSERT вместо объекта на каждое"""
+    if messages:
+        await session.execute(insert(OutboxMessage), [
+            {'chat_id': chat_id, 'text': text, 'attempts': 0, 'next_attempt_at': 0.0}
+            for chat_id, text in messages
+        ])
+
+
+def wake():
+    """Сообщить воркеру о новых уведомлениях (вызывается после commit)"""
+    if _worker is not None:
+        _worker.wakeup.set()
+
+
+class OutboxWorker:
+    def __init__(self, bot: Bot, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 retry_delay: float = OUTBOX_RETRY_DELAY):
+        self.bot = bot
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.wakeup = asyncio.Event()
+        self._stopping = False
+
+    async def _deliver(self, message: OutboxMessage) -> Optional[bool]:
+        """True - доставлено, None - доставить невозможно, False - повторить позже"""
+        try:
+            with send_priority(PRIORITY_NOTIFICATION):
+                await self.bot.send_message(message.chat_id, message.text)
+            return True
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # бот заблокирован пользователем или чата не существует
+            logger.info(f"Outbox message {message.id} to {message.chat_id} dropped: {e}")
+            return None
+        except Exception as e:
+            logger.warning(f"Outbox message {message.id} to {message.chat_id} failed: {e}")
+            return False
+
+    async def process_batch(self) -> int:
+        """Отправка одной пачки; возвращает число обработанных уведомлений"""
+        now = time.time()
+        async with Session() as session:
+            messages = (await session.scalars(
+                select(OutboxMessage)
+                .where(OutboxMessage.next_attempt_at <= now)
+                .order_by(OutboxMessage.id)
+                .limit(self.batch_size)
+            )).all()
+        if not messages:
+            return 0
+
+        results = await asyncio.gather(*(self._deliver(message) for message in messages))
+
+        done = []
+        async with Session() as session:
+            for message, result in zip(messages, results):
+                attempts = message.attempts + 1
+                if result is False and attempts < self.max_attempts:
+                    await session.execute(
+                        update(OutboxMessage)
+                        .where(OutboxMessage.id == message.id)
+                        .values(attempts=attempts,
+                                next_attempt_at=now + self.retry_delay * 2 ** message.attempts)
+                    )
+                else:
+                    if result is False:
+                        logger.error(f"Outbox message {message.id} to {message.chat_id} given up")
+                    done.append(message.id)
+            if done:
+                await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(done)))
+            await session.commit()
+        return len(messages)
+
+    async def run(self):
+        """Основной цикл; запускается задачей из main()"""
+        global _worker
+        _worker = self
+        try:
+            while not self._stopping:
+                self.wakeup.clear()
+                try:
+                    processed = await self.process_batch()
+                except Exception as e:
+                    logger.exception(f"Outbox batch failed: {e}")
+                    processed = 0
+                if processed >= self.batch_size:
+                    continue
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if _worker is self:
+                _worker = None
+
+    async def stop(self):
+        """Остановка после текущей пачки; недоставленное остается в таблице"""
+        self._stopping = True
+        self.wakeup.set()
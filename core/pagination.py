@@ -0,0 +1,84 @@
+import hashlib
+import json
+from typing import Any, Optional
+
+from aiogram import types
+
+from core.config import PAGE_SIZE, PAGED_FILTERS_KEPT
+
+
+async def keyset_page(session, stmt, key, after: Optional[int] = None, before: Optional[int] = None,
+                      limit: int = PAGE_SIZE, descending: bool = False):
+    """Страница строк по ключу key (keyset-пагинация, без OFFSET).
+
+    after - показать строки, следующие за этим ключом; before - предшествующие ему.
+    descending - порядок показа (например, новые отзывы первыми).
+    Возвращает (rows, has_prev, has_next).
+    """
+    forward_order, backward_order = (key.desc(), key.asc()) if descending else (key.asc(), key.desc())
+    follows = (lambda value: key < value) if descending else (lambda value: key > value)
+    precedes = (lambda value: key > value) if descending else (lambda value: key < value)
+
+    if before is not None:
+        rows = (await session.execute(
+            stmt.where(precedes(before)).order_by(backward_order).limit(limit + 1)
+        )).all()
+        has_prev = len(rows) > limit
+        return list(reversed(rows[:limit])), has_prev, True
+
+    if after is not None:
+        stmt = stmt.where(follows(after))
+    rows = (await session.execute(stmt.order_by(forward_order).limit(limit + 1))).all()
+    has_next = len(rows) > limit
+    return rows[:limit], after is not None, has_next
+
+
+def parse_page_callback(data: str) -> dict:
+    """'<prefix>_<next|prev>_<key>' -> {'after': key} или {'before': key}"""
+    _, direction, key = data.rsplit('_', 2)
+    return {'after': int(key)} if direction == 'next' else {'before': int(key)}
+
+
+def parse_page_number(data: str) -> int:
+    """Номер страницы из кнопки, где pager_keyboard получил номера страниц вместо ключей"""
+    return int(data.rsplit('_', 1)[1])
+
+
+def filter_token(value: Any) -> str:
+    """Короткий отпечаток фильтра для callback_data"""
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:8]
+
+
+async def remember_filter(state, name: str, value: Any):
+    """Сохранение фильтра листания (/search, /users) в данных FSM.
+
+    Сам фильтр может не поместиться в 64 байта callback_data, поэтому в кнопки
+    пишется только его токен ('<prefix>_<токен>_<next|prev>_<ключ>'). Хранятся
+    PAGED_FILTERS_KEPT последних фильтров: кнопки старого сообщения листают
+    свой запрос, а не последний.
+    """
+    token = filter_token(value)
+    filters = dict((await state.get_data()).get(name) or {})
+    filters.pop(token, None)
+    filters[token] = value
+    await state.update_data(**{name: dict(list(filters.items())[-PAGED_FILTERS_KEPT:])})
+
+
+async def recall_filter(state, name: str, data: str) -> Optional[Any]:
+    """Фильтр по токену из callback_data; None, если он уже вытеснен более новыми"""
+    token = data.split('_')[1]
+    return ((await state.get_data()).get(name) or {}).get(token)
+
+
+def pager_keyboard(prefix: str, first_key: int, last_key: int,
+                   has_prev: bool, has_next: bool) -> Optional[types.InlineKeyboardMarkup]:
+    """Кнопки «назад/вперед» для keyset-страницы"""
+    buttons = []
+    if has_prev:
+        buttons.append(types.InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}_prev_{first_key}"))
+    if has_next:
+        buttons.append(types.InlineKeyboardButton(text="Вперед ➡️", callback_data=f"{prefix}_next_{last_key}"))
+    if not buttons:
+        return None
+    return types.InlineKeyboardMarkup(inline_keyboard=[buttons])
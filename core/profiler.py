@@ -0,0 +1,148 @@
+"""Профилирование SQL-запросов.
+
+instrument(engine) подключает обработчики событий движка (вызывается из
+create_engine_from_url). Запросы, выполненные внутри profile_queries(),
+учитываются в QueryStats: число, время, одинаковые по форме запросы.
+Запрос дольше SLOW_QUERY_THRESHOLD логируется вместе с планом выполнения.
+QueryProfilerMiddleware профилирует каждое обновление и предупреждает
+о повторяющихся запросах (N+1); assert_query_budget - помощник для тестов.
+"""
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from sqlalchemy import event
+
+from core.config import SLOW_QUERY_THRESHOLD, REPEATED_QUERY_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+_stats = contextvars.ContextVar('query_stats', default=None)
+
+# IN (?, ?, ?) и VALUES (...), (...) разной длины считаются одной формой
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|\$\d+)\s*,)+\s*(?:\?|%\(\w+\)s|\$\d+)\s*\)')
+_EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+
+def statement_shape(statement: str) -> str:
+    return _PLACEHOLDER_LIST.sub('(?...)', ' '.join(statement.split()))
+
+
+class QueryStats:
+    def __init__(self):
+        self.statements: list[tuple[str, float]] = []
+        self.shapes: Counter = Counter()
+        self.total_time = 0.0
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def record(self, statement: str, duration: float):
+        self.statements.append((statement, duration))
+        self.shapes[statement_shape(statement)] += 1
+        self.total_time += duration
+
+    def repeated(self, threshold: int = REPEATED_QUERY_THRESHOLD) -> list[tuple[str, int]]:
+        """Формы запросов, выполненных не меньше threshold раз"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def report(self) -> str:
+        lines = [f"{self.count} queries, {self.total_time * 1000:.1f} ms"]
+        lines.extend(f"  {duration * 1000:7.1f} ms  {statement_shape(statement)}"
+                     for statement, duration in self.statements)
+        return '\n'.join(lines)
+
+
+@contextmanager
+def profile_queries():
+    """Учет запросов, выполненных внутри блока (в том числе во вложенных задачах)"""
+    stats = QueryStats()
+    token = _stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _stats.reset(token)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int):
+    """Тестовый помощник: блок должен уложиться в max_queries запросов"""
+    with profile_queries() as stats:
+        yield stats
+    if stats.count > max_queries:
+        raise AssertionError(f"Query budget exceeded: {stats.count} > {max_queries}\n{stats.report()}")
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return '\n'.join('  ' + ' | '.join(str(value) for value in row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_start'].pop()
+    stats = _stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+
+    if duration >= SLOW_QUERY_THRESHOLD:
+        plan = ''
+        if not executemany and statement.lstrip().upper().startswith(_EXPLAINABLE):
+            try:
+                plan = '\n' + _explain(conn, statement, parameters)
+            except Exception as e:
+                plan = f"\n  (EXPLAIN failed: {e})"
+        logger.warning(f"Slow query ({duration * 1000:.1f} ms): {statement_shape(statement)}{plan}")
+
+
+def instrument(engine):
+    """Подключение профилирования к AsyncEngine"""
+    event.listen(engine.sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine.sync_engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _describe(update: TelegramObject) -> str:
+    if isinstance(update, Update):
+        if update.message is not None and update.message.text:
+            return f"message {update.message.text.split()[0]!r}"
+        if update.callback_query is not None:
+            return f"callback {update.callback_query.data!r}"
+        return update.event_type
+    return type(update).__name__
+
+
+class QueryProfilerMiddleware(BaseMiddleware):
+    """Профилирование запросов каждого обновления (outer middleware для dp.update)"""
+
+    def __init__(self, repeated_threshold: int = REPEATED_QUERY_THRESHOLD):
+        self.repeated_threshold = repeated_threshold
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        with profile_queries() as stats:
+            try:
+                return await handler(event, data)
+            finally:
+                for shape, count in stats.repeated(self.repeated_threshold):
+                    logger.warning(f"Possible N+1 in {_describe(event)}: {count}x {shape}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Queries for {_describe(event)}: {stats.report()}")
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from aiogram import Bot, types
+from sqlalchemy import select
+
+from core.config import PROFILE_CACHE_SIZE, PROFILE_TTL, PROFILE_FETCH_CONCURRENCY
+from core.database import Session, Profile, insert
+
+logger = logging.getLogger(__name__)
+
+
+def search_key(value: Optional[str]) -> Optional[str]:
+    """Строка для поиска по префиксу без учета регистра"""
+    return value.lower() if value else None
+
+
+class CachedProfile(NamedTuple):
+    username: Optional[str]
+    full_name: Optional[str]
+    updated_at: float
+
+    def mention(self, user_id: int) -> str:
+        return f"@{self.username}" if self.username else f"id{user_id}"
+
+
+class ProfileCache:
+    """LRU-кэш профилей Telegram с TTL.
+
+    Порядок поиска: память -> таблица profiles -> bot.get_chat (не более
+    fetch_concurrency запросов одновременно). Устаревшие записи отдаются
+    сразу, а обновляются в фоне.
+    """
+
+    def __init__(self, maxsize: int = PROFILE_CACHE_SIZE, ttl: float = PROFILE_TTL,
+                 fetch_concurrency: int = PROFILE_FETCH_CONCURRENCY):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[int, CachedProfile] = OrderedDict()
+        self._semaphore = asyncio.Semaphore(fetch_concurrency)
+        self._refreshing: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    def _get(self, user_id: int) -> Optional[CachedProfile]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+        return entry
+
+    def _put(self, user_id: int, entry: CachedProfile):
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _is_stale(self, entry: CachedProfile) -> bool:
+        return time.time() - entry.updated_at > self.ttl
+
+    async def _store(self, entries: dict[int, CachedProfile]):
+        """Сохранение профилей одним upsert-запросом"""
+        if not entries:
+            return
+        stmt = insert(Profile)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Profile.user_id],
+            set_={
+                'username': stmt.excluded.username,
+                'full_name': stmt.excluded.full_name,
+                'updated_at': stmt.excluded.updated_at,
+                'username_key': stmt.excluded.username_key,
+                'name_key': stmt.excluded.name_key,
+            },
+        )
+        rows = [
+            {'user_id': user_id, 'username': entry.username,
+             'full_name': entry.full_name, 'updated_at': entry.updated_at,
+             'username_key': search_key(entry.username), 'name_key': search_key(entry.full_name)}
+            for user_id, entry in entries.items()
+        ]
+        async with Session() as session:
+            await session.execute(stmt, rows)
+            await session.commit()
+
+    async def remember(self, user: types.User):
+        """Обновление профиля по from_user входящего сообщения"""
+        entry = self._get(user.id)
+        if (entry and entry.username == user.username and entry.full_name == user.full_name
+                and not self._is_stale(entry)):
+            return
+        entry = CachedProfile(user.username, user.full_name, time.time())
+        self._put(user.id, entry)
+        await self._store({user.id: entry})
+
+    async def _fetch(self, bot: Bot, user_id: int) -> tuple[CachedProfile, bool]:
+        """Запрос профиля у Telegram; второй элемент - удалось ли его получить"""
+        async with self._semaphore:
+            try:
+                chat = await bot.get_chat(user_id)
+            except Exception as e:
+                # запоминаем промах, чтобы не спрашивать Telegram на каждом запросе
+                logger.debug(f"get_chat failed for {user_id}: {e}")
+                entry = CachedProfile(None, None, time.time())
+                self._put(user_id, entry)
+                return entry, False
+        entry = CachedProfile(chat.username, chat.full_name, time.time())
+        self._put(user_id, entry)
+        return entry, True
+
+    def _schedule_refresh(self, bot: Bot, user_id: int):
+        if user_id in self._refreshing:
+            return
+        self._refreshing.add(user_id)
+
+        async def refresh():
+            try:
+                entry, found = await self._fetch(bot, user_id)
+                if found:
+                    await self._store({user_id: entry})
+            finally:
+                self._refreshing.discard(user_id)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def resolve(self, bot: Bot, user_ids) -> dict[int, CachedProfile]:
+        """Профили для набора Telegram ID"""
+        result = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            entry = self._get(user_id)
+            if entry is None:
+                missing.append(user_id)
+                continue
+            result[user_id] = entry
+            if self._is_stale(entry):
+                self._schedule_refresh(bot, user_id)
+
+        if missing:
+            async with Session() as session:
+                rows = (await session.scalars(select(Profile).where(Profile.user_id.in_(missing)))).all()
+            for row in rows:
+                entry = CachedProfile(row.username, row.full_name, row.updated_at or 0.0)
+                self._put(row.user_id, entry)
+                result[row.user_id] = entry
+                if self._is_stale(entry):
+                    self._schedule_refresh(bot, row.user_id)
+
+            unknown = [user_id for user_id in missing if user_id not in result]
+            fetched = await asyncio.gather(*(self._fetch(bot, user_id) for user_id in unknown))
+            result.update((user_id, entry) for user_id, (entry, _) in zip(unknown, fetched))
+            await self._store({
+                user_id: entry for user_id, (entry, found) in zip(unknown, fetched) if found
+            })
+
+        return result
+
+    async def mentions(self, bot: Bot, user_ids) -> dict[int, str]:
+        """@username (или id<ID>) для набора Telegram ID"""
+        profiles = await self.resolve(bot, user_ids)
+        return {user_id: profile.mention(user_id) for user_id, profile in profiles.items()}
+
+    async def find_by_username(self, username: str) -> Optional[int]:
+        """Telegram ID по username из сохраненных профилей (без учета регистра, как в Telegram)"""
+        async with Session() as session:
+            return await session.scalar(
+                select(Profile.user_id).where(Profile.username_key == search_key(username)).limit(1)
+            )
+
+
+profiles = ProfileCache()
@@ -0,0 +1,58 @@
+"""Рейтинг работ для /top.
+
+Оценка работы - байесовское среднее: к ее оценкам добавляются
+RANKING_PRIOR_WEIGHT воображаемых оценок RANKING_PRIOR_MEAN, поэтому одна
+пятерка не поднимает работу выше сотен хороших оценок. Априорные параметры
+фиксированы, и строку work_rankings можно пересчитать по одной работе
+(при оценке или одобрении), не трогая остальные.
+"""
+from typing import Optional
+
+from sqlalchemy import select, delete
+
+from core.config import RANKING_PRIOR_MEAN, RANKING_PRIOR_WEIGHT, PAGE_SIZE
+from core.database import Work, WorkRanking, insert
+
+
+def normalize_category(value: Optional[str]) -> Optional[str]:
+    """Жанр/тема в виде для сравнения по индексу"""
+    return value.strip().lower() if value else None
+
+
+def bayesian_score(rating_sum: int, ratings_count: int) -> float:
+    return (RANKING_PRIOR_MEAN * RANKING_PRIOR_WEIGHT + rating_sum) / (RANKING_PRIOR_WEIGHT + ratings_count)
+
+
+async def update_ranking(session, work_id: int, rating_sum: int, ratings_count: int,
+                         genre: Optional[str] = None, theme: Optional[str] = None):
+    """Добавление или пересчет строки рейтинга одной работы"""
+    stmt = insert(WorkRanking).values(
+        work_id=work_id, genre=normalize_category(genre), theme=normalize_category(theme),
+        score=bayesian_score(rating_sum, ratings_count),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[WorkRanking.work_id],
+        set_={'score': stmt.excluded.score, 'genre': stmt.excluded.genre, 'theme': stmt.excluded.theme},
+    )
+    await session.execute(stmt)
+
+
+async def remove_ranking(session, work_id: int):
+    await session.execute(delete(WorkRanking).where(WorkRanking.work_id == work_id))
+
+
+async def top_works(session, genre: Optional[str] = None, theme: Optional[str] = None, limit: int = PAGE_SIZE):
+    """Лучшие работы (чтение по индексу score)"""
+    stmt = (
+        select(Work.id, Work.title, Work.rating, Work.ratings_count, WorkRanking.score)
+        .select_from(WorkRanking)
+        .join(Work, Work.id == WorkRanking.work_id)
+        .where(Work.is_approved == True)
+        .order_by(WorkRanking.score.desc(), WorkRanking.work_id.desc())
+        .limit(limit)
+    )
+    if genre is not None:
+        stmt = stmt.where(WorkRanking.genre == normalize_category(genre))
+    if theme is not None:
+        stmt = stmt.where(WorkRanking.theme == normalize_category(theme))
+    return (await session.execute(stmt)).all()
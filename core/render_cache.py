@@ -0,0 +1,99 @@
+"""Кэш готовых страниц списков (/works_list, /read, отзывы).
+
+Страница хранится по ключу (представление, параметры страницы) вместе
+с версиями сущностей, из которых она построена. Обработчики, меняющие
+данные (одобрение, отклонение, удаление, оценка), увеличивают версию
+через bump(), и страницы со старой версией перестраиваются при следующем
+запросе. Объем кэша ограничен примерной оценкой занимаемой памяти,
+вытесняются давно не использованные страницы.
+
+Кэш живет в памяти процесса: бот с несколькими процессами увидит изменения
+другого процесса только после вытеснения страницы.
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple
+
+from core.config import RENDER_CACHE_MAX_BYTES
+
+# версия каталога одобренных работ: названия, рейтинги, состав списка
+CATALOGUE = 'works'
+
+
+def reviews_of(work_id: int) -> str:
+    """Сущность «отзывы к работе»"""
+    return f'reviews:{work_id}'
+
+
+def _estimate_size(value: Any) -> int:
+    """Грубая оценка памяти под значение, байт"""
+    if isinstance(value, str):
+        return 49 + len(value.encode('utf-8'))
+    if isinstance(value, (tuple, list)):
+        return 56 + 8 * len(value) + sum(_estimate_size(item) for item in value)
+    if value is None or isinstance(value, (int, float, bool)):
+        return 0
+    return 64 + len(repr(value))
+
+
+class _Entry(NamedTuple):
+    versions: tuple
+    value: Any
+    size: int
+
+
+class RenderCache:
+    def __init__(self, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._versions: dict[str, int] = {}
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def bump(self, *entities: str):
+        """Данные сущностей изменились: построенные из них страницы устарели"""
+        for entity in entities:
+            self._versions[entity] = self._versions.get(entity, 0) + 1
+
+    def _snapshot(self, entities: tuple) -> tuple:
+        return tuple(self._versions.get(entity, 0) for entity in entities)
+
+    def _put(self, key: Hashable, entry: _Entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old.size
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+
+    async def get_or_render(self, key: Hashable, entities: tuple, render: Callable[[], Awaitable[Any]]) -> Any:
+        """Страница из кэша или результат render(), который сохраняется в кэш.
+
+        Версии берутся до построения: если данные изменились, пока страница
+        строилась, она сохранится со старой версией и будет перестроена.
+        """
+        versions = self._snapshot(entities)
+        entry = self._entries.get(key)
+        if entry is not None and entry.versions == versions:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+        self.misses += 1
+        value = await render()
+        self._put(key, _Entry(versions, value, _estimate_size(key) + _estimate_size(value)))
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+renders = RenderCache()
@@ -0,0 +1,155 @@
+"""Массовая смена ролей (/setroles).
+
+Назначения приходят текстом команды или CSV-файлом. Строка - это
+идентификатор (ID или @username) и роль либо роль и несколько
+идентификаторов; разделители - пробелы, запятые или точки с запятой.
+
+Все изменения применяются одной транзакцией: текущие роли читаются пачками
+по ID, изменившиеся строки пишутся пачками INSERT ... ON CONFLICT DO UPDATE,
+уведомления добавляются в outbox той же транзакцией. Меню команд
+обновляются после commit в фоне (core.commands.schedule_sync).
+"""
+import re
+from typing import NamedTuple, Union
+
+from aiogram import Bot
+from sqlalchemy import select
+
+from core.config import ROLES, MAX_ROLES_FILE_SIZE
+from core.database import User, Profile, insert
+from core.ingest import IngestError, TextDecoder, stream_file
+from core.outbox import enqueue_many
+from core.profiles import search_key
+
+# роль можно указать ключом (author) или названием (автор)
+ROLE_ALIASES = {**{key: key for key in ROLES}, **{name: key for key, name in ROLES.items()}}
+# строк в одном INSERT / IN: с запасом ниже лимита параметров SQLite
+BATCH_SIZE = 400
+MAX_TELEGRAM_ID = 2 ** 52  # ID пользователей Telegram занимают до 52 бит
+
+_SEPARATORS = re.compile(r'[\s,;"]+')
+_HEADER = {'role', 'роль'}
+
+
+def role_notification(role: str) -> str:
+    """Уведомление того, кому назначили роль"""
+    if role == 'banned':
+        return "⛔️ Вы были заблокированы в системе."
+    return f"🔄 Ваша роль была изменена на: {ROLES[role]}"
+
+
+def _identifier(token: str) -> Union[int, str, None]:
+    """ID или ключ username ('@name' -> 'name'); None, если не похоже ни на то, ни на другое"""
+    if token.isascii() and token.isdigit():
+        value = int(token)
+        return value if 0 < value < MAX_TELEGRAM_ID else None
+    if token.startswith('@') and len(token) > 1:
+        return search_key(token[1:])
+    return None
+
+
+def parse_assignments(lines: list[str]) -> tuple[dict, list[str]]:
+    """Строки назначений -> ({ID или username: роль}, ошибки).
+
+    Повторное упоминание пользователя заменяет предыдущее.
+    """
+    assignments = {}
+    errors = []
+    for number, line in enumerate(lines, 1):
+        tokens = [token for token in _SEPARATORS.split(line.strip()) if token]
+        if not tokens or tokens[0].startswith('#'):
+            continue
+        if tokens[0].lower() in ROLE_ALIASES:
+            role, targets = ROLE_ALIASES[tokens[0].lower()], tokens[1:]
+        elif tokens[-1].lower() in ROLE_ALIASES:
+            role, targets = ROLE_ALIASES[tokens[-1].lower()], tokens[:-1]
+        elif tokens[-1].lower() in _HEADER:
+            # заголовок CSV
+            continue
+        else:
+            errors.append(f"строка {number}: не указана роль")
+            continue
+
+        if role == 'owner':
+            errors.append(f"строка {number}: роль владельца назначается только через /setrole")
+            continue
+        if not targets:
+            errors.append(f"строка {number}: не указаны пользователи")
+        for token in targets:
+            identifier = _identifier(token)
+            if identifier is None:
+                errors.append(f"строка {number}: неверный пользователь «{token}»")
+            else:
+                assignments[identifier] = role
+    return assignments, errors
+
+
+def _batches(items: list) -> list:
+    return [items[start:start + BATCH_SIZE] for start in range(0, len(items), BATCH_SIZE)]
+
+
+async def resolve_usernames(session, assignments: dict) -> tuple[dict[int, str], list[str]]:
+    """Замена username на ID по сохраненным профилям; (назначения по ID, ненайденные)"""
+    by_id = {key: role for key, role in assignments.items() if isinstance(key, int)}
+    names = [key for key in assignments if isinstance(key, str)]
+    found = {}
+    for batch in _batches(names):
+        found.update((await session.execute(
+            select(Profile.username_key, Profile.user_id).where(Profile.username_key.in_(batch))
+        )).all())
+    for name in names:
+        if name in found:
+            by_id[found[name]] = assignments[name]
+    return by_id, [f"@{name}" for name in names if name not in found]
+
+
+class RolesResult(NamedTuple):
+    changed: list[tuple[int, str]]  # (Telegram ID, новая роль)
+    created: int  # из них новых пользователей
+    unchanged: int
+    protected: list[int]  # владельцы, роль которых не меняется
+
+
+async def apply_roles(session, assignments: dict[int, str]) -> RolesResult:
+    """Назначение ролей и уведомления в текущей транзакции; commit делает вызывающий"""
+    current = {}
+    for batch in _batches(list(assignments)):
+        current.update((await session.execute(
+            select(User.user_id, User.role).where(User.user_id.in_(batch))
+        )).all())
+
+    protected = [user_id for user_id in assignments if current.get(user_id) == 'owner']
+    changed = [
+        (user_id, role) for user_id, role in assignments.items()
+        if current.get(user_id) not in (role, 'owner')
+    ]
+    for batch in _batches(changed):
+        stmt = insert(User).values([{'user_id': user_id, 'role': role} for user_id, role in batch])
+        stmt = stmt.on_conflict_do_update(index_elements=[User.user_id], set_={'role': stmt.excluded.role})
+        await session.execute(stmt)
+    await enqueue_many(session, [(user_id, role_notification(role)) for user_id, role in changed])
+
+    return RolesResult(
+        changed=changed,
+        created=sum(1 for user_id, _ in changed if user_id not in current),
+        unchanged=len(assignments) - len(changed) - len(protected),
+        protected=protected,
+    )
+
+
+async def read_roles_file(bot: Bot, file_id: str, file_size: int = None) -> list[str]:
+    """Строки CSV-файла; кодировка определяется так же, как у текстов работ"""
+    too_large = IngestError(f"Файл слишком большой. Максимальный размер - {MAX_ROLES_FILE_SIZE // 1024} КБ.")
+    if file_size is not None and file_size > MAX_ROLES_FILE_SIZE:
+        raise too_large
+    file = await bot.get_file(file_id)
+    decoder = TextDecoder()
+    parts = []
+    received = 0
+    async for data in stream_file(bot, file.file_path):
+        received += len(data)
+        if received > MAX_ROLES_FILE_SIZE:
+            raise too_large
+        parts.append(decoder.decode(data))
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts).split('\n')
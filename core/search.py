@@ -0,0 +1,99 @@
+"""Полнотекстовый поиск по одобренным работам.
+
+В SQLite используется FTS5-таблица works_fts (rowid = works.id) по названию
+и тексту; она заполняется при одобрении работы и очищается при удалении.
+Результаты ранжируются bm25 (совпадение в названии весит больше), фрагменты
+текста с найденными словами строит snippet(). В других СУБД - поиск по
+названию через ILIKE без фрагментов.
+"""
+import html
+import re
+from typing import NamedTuple, Optional
+
+from sqlalchemy import DDL, event, null, select, text
+
+from core.config import PAGE_SIZE
+from core.database import Work
+
+# маркеры подсветки в snippet(); в HTML заменяются на <b></b> после экранирования
+_MARK_START, _MARK_END = '\x02', '\x03'
+_WORD = re.compile(r'\w+')
+TITLE_WEIGHT = 5.0
+MIN_PREFIX_LENGTH = 3
+
+CREATE_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS works_fts "
+    "USING fts5(title, content, tokenize='unicode61 remove_diacritics 2')"
+)
+
+# таблица создается вместе с works (свежая база) и миграцией для существующих баз
+event.listen(Work.__table__, 'after_create', DDL(CREATE_FTS).execute_if(dialect='sqlite'))
+
+
+class SearchHit(NamedTuple):
+    id: int
+    title: str
+    snippet: Optional[str]
+
+    def snippet_html(self) -> Optional[str]:
+        if self.snippet is None:
+            return None
+        return html.escape(self.snippet).replace(_MARK_START, '<b>').replace(_MARK_END, '</b>')
+
+
+def _is_sqlite(session) -> bool:
+    return session.get_bind().dialect.name == 'sqlite'
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """Запрос пользователя -> выражение MATCH: все слова, с поиском по префиксу.
+
+    Короткие слова ищутся целиком: префикс из 1-2 букв совпадает почти со всем корпусом.
+    """
+    words = _WORD.findall(query.lower())
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' if len(word) >= MIN_PREFIX_LENGTH else f'"{word}"' for word in words)
+
+
+async def index_work(session, work_id: int, title: str, content: str):
+    """Добавление (или переиндексация после изменения) работы"""
+    if not _is_sqlite(session):
+        return
+    await session.execute(text("DELETE FROM works_fts WHERE rowid = :id"), {'id': work_id})
+    await session.execute(
+        text("INSERT INTO works_fts (rowid, title, content) VALUES (:id, :title, :content)"),
+        {'id': work_id, 'title': title, 'content': content},
+    )
+
+
+async def unindex_work(session, work_id: int):
+    if _is_sqlite(session):
+        await session.execute(text("DELETE FROM works_fts WHERE rowid = :id"), {'id': work_id})
+
+
+async def search_works(session, query: str, page: int = 0, limit: int = PAGE_SIZE) -> tuple[list[SearchHit], bool]:
+    """Страница результатов: (найденное, есть ли следующая страница)"""
+    if _is_sqlite(session):
+        match = build_match_query(query)
+        if match is None:
+            return [], False
+        # в индексе только одобренные работы, поэтому join с works не нужен;
+        # ORDER BY rank выполняет сам FTS5, и snippet() считается только для строк страницы
+        rows = (await session.execute(
+            text(
+                "SELECT rowid, title, "
+                f"snippet(works_fts, 1, '{_MARK_START}', '{_MARK_END}', '…', 16) "
+                "FROM works_fts "
+                f"WHERE works_fts MATCH :match AND rank MATCH 'bm25({TITLE_WEIGHT}, 1.0)' "
+                "ORDER BY rank LIMIT :limit OFFSET :offset"
+            ),
+            {'match': match, 'limit': limit + 1, 'offset': page * limit},
+        )).all()
+    else:
+        rows = (await session.execute(
+            select(Work.id, Work.title, null())
+            .where(Work.is_approved == True, Work.title.ilike(f"%{query}%"))
+            .order_by(Work.id).limit(limit + 1).offset(page * limit)
+        )).all()
+    return [SearchHit(*row) for row in rows[:limit]], len(rows) > limit
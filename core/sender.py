@@ -0,0 +1,180 @@
+"""Единая очередь исходящих запросов к Telegram.
+
+Все запросы бота проходят через ThrottlingRequestMiddleware (подключается
+к bot.session). Отправка сообщений ограничивается общим и по-чатовым
+token bucket, ожидающие запросы выдаются по приоритету: прямые ответы
+пользователю раньше уведомлений. TelegramRetryAfter приостанавливает чат
+(или всего бота) на указанное время и повторяет запрос.
+"""
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from core.config import (
+    OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_REPLY = 0
+PRIORITY_NOTIFICATION = 1
+
+_priority = contextvars.ContextVar('outbound_priority', default=PRIORITY_REPLY)
+
+# методы, на которые распространяются лимиты Telegram на отправку
+LIMITED_METHOD_PREFIXES = ('Send', 'Edit', 'Copy', 'Forward')
+
+
+@contextmanager
+def send_priority(priority: int):
+    """Приоритет запросов, отправленных внутри блока"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен"""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class OutboundScheduler:
+    """Выдача разрешений на отправку с учетом лимитов и приоритетов"""
+
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_rate: float = OUTBOUND_CHAT_RATE,
+                 chat_burst: float = OUTBOUND_CHAT_BURST, max_chat_buckets: int = 10000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chat_buckets = max_chat_buckets
+        self._chats: dict[int, TokenBucket] = {}
+        self._waiters: list[tuple[int, int, Optional[int], asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pump_task: Optional[asyncio.Task] = None
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chat_buckets:
+                now = time.monotonic()
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    @property
+    def pending(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, chat_id: Optional[int], priority: int = PRIORITY_REPLY):
+        """Ожидание разрешения на отправку в chat_id"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((priority, next(self._seq), chat_id, future))
+        if self._pump_task is None or self._pump_task.done():
+            self._wakeup = asyncio.Event()
+            self._pump_task = asyncio.create_task(self._pump())
+        self._wakeup.set()
+        await future
+
+    def back_off(self, chat_id: Optional[int], seconds: float):
+        """Пауза после TelegramRetryAfter: для чата или (без chat_id) для всего бота"""
+        bucket = self._chat_bucket(chat_id) if chat_id is not None else self.global_bucket
+        bucket.block(seconds)
+
+    async def _pump(self):
+        while self._waiters:
+            self._wakeup.clear()
+            self._waiters = [waiter for waiter in self._waiters if not waiter[3].done()]
+            if not self._waiters:
+                break
+
+            now = time.monotonic()
+            wait = self.global_bucket.delay(now)
+            if wait == 0:
+                best, wait = None, float('inf')
+                for waiter in self._waiters:
+                    chat_id = waiter[2]
+                    delay = self._chat_bucket(chat_id).delay(now) if chat_id is not None else 0.0
+                    if delay == 0:
+                        if best is None or waiter[:2] < best[:2]:
+                            best = waiter
+                    else:
+                        wait = min(wait, delay)
+                if best is not None:
+                    self._waiters.remove(best)
+                    self.global_bucket.take(now)
+                    if best[2] is not None:
+                        self._chat_bucket(best[2]).take(now)
+                    best[3].set_result(None)
+                    continue
+
+            try:
+                # новый запрос может оказаться в свободном чате - ждем его или истечения паузы
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+
+class ThrottlingRequestMiddleware(BaseRequestMiddleware):
+    """Пропускает исходящие запросы бота через OutboundScheduler"""
+
+    def __init__(self, scheduler: OutboundScheduler, max_retries: int = OUTBOUND_MAX_RETRIES):
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+
+    async def __call__(self, make_request, bot: Bot, method):
+        if not type(method).__name__.startswith(LIMITED_METHOD_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, 'chat_id', None)
+        if not isinstance(chat_id, int):
+            chat_id = None  # @channel_username или inline-сообщение
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.acquire(chat_id, _priority.get())
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Flood control for chat {chat_id}: retry in {e.retry_after}s")
+                self.scheduler.back_off(chat_id, e.retry_after)
+
+
+outbound = OutboundScheduler()
@@ -0,0 +1,166 @@
+"""Хранилище FSM aiogram в базе данных.
+
+Состояния читаются из таблицы fsm_states и кэшируются в памяти (LRU,
+не больше FSM_CACHE_SIZE записей). Изменения накапливаются и раз
+в FSM_FLUSH_INTERVAL секунд сохраняются одной транзакцией. Диалог,
+не менявшийся дольше FSM_TTL, считается брошенным и удаляется.
+
+Кэш локален для процесса: при запуске нескольких процессов обновления
+одного пользователя должны попадать в один и тот же процесс.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StorageKey
+from sqlalchemy import select, delete
+
+from core.config import FSM_CACHE_SIZE, FSM_TTL, FSM_FLUSH_INTERVAL
+from core.database import Session, FsmState, insert
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('state', 'data', 'updated_at')
+
+    def __init__(self, state: Optional[str], data: dict, updated_at: float):
+        self.state = state
+        self.data = data
+        self.updated_at = updated_at
+
+    @property
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class DatabaseStorage(BaseStorage):
+    def __init__(self, max_size: int = FSM_CACHE_SIZE, ttl: float = FSM_TTL,
+                 flush_interval: float = FSM_FLUSH_INTERVAL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True,
+                                             with_destiny=True)
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _is_expired(self, entry: _Entry, now: float) -> bool:
+        return now - entry.updated_at > self.ttl
+
+    async def _load(self, key: StorageKey) -> _Entry:
+        """Запись из кэша или базы; брошенный диалог возвращается пустым"""
+        db_key = self.key_builder.build(key)
+        now = time.time()
+        entry = self._entries.get(db_key)
+        if entry is None:
+            async with Session() as session:
+                row = await session.scalar(select(FsmState).filter_by(key=db_key))
+            # пока шел запрос, запись могла загрузить другая задача
+            entry = self._entries.get(db_key)
+            if entry is None:
+                if row is None:
+                    entry = _Entry(None, {}, now)
+                else:
+                    entry = _Entry(row.state, json.loads(row.data), row.updated_at)
+                self._entries[db_key] = entry
+                self._trim()
+        else:
+            self._entries.move_to_end(db_key)
+        if self._is_expired(entry, now):
+            entry.state, entry.data, entry.updated_at = None, {}, now
+        return entry
+
+    def _changed(self, key: StorageKey, entry: _Entry):
+        entry.updated_at = time.time()
+        self._dirty.add(self.key_builder.build(key))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    def _trim(self):
+        """Вытеснение давно не использованных записей, кроме несохраненных"""
+        excess = len(self._entries) - self.max_size
+        if excess <= 0:
+            return
+        for db_key in [db_key for db_key in self._entries if db_key not in self._dirty][:excess]:
+            del self._entries[db_key]
+
+    async def _flush_later(self):
+        # изменения, сделанные во время сброса, попадут в следующий
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception(f"FSM flush failed: {e}")
+            if not self._dirty:
+                return
+
+    async def flush(self):
+        """Сохранение накопленных изменений и удаление брошенных диалогов"""
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            now = time.time()
+            rows, cleared = [], []
+            for db_key in dirty:
+                entry = self._entries.get(db_key)
+                if entry is None or entry.is_empty or self._is_expired(entry, now):
+                    cleared.append(db_key)
+                else:
+                    rows.append({'key': db_key, 'state': entry.state,
+                                 'data': json.dumps(entry.data, ensure_ascii=False),
+                                 'updated_at': entry.updated_at})
+            try:
+                async with Session() as session:
+                    if rows:
+                        stmt = insert(FsmState)
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=[FsmState.key],
+                            set_={
+                                'state': stmt.excluded.state,
+                                'data': stmt.excluded.data,
+                                'updated_at': stmt.excluded.updated_at,
+                            },
+                        )
+                        await session.execute(stmt, rows)
+                    if cleared:
+                        await session.execute(delete(FsmState).where(FsmState.key.in_(cleared)))
+                    await session.execute(delete(FsmState).where(FsmState.updated_at < now - self.ttl))
+                    await session.commit()
+            except BaseException:
+                self._dirty |= dirty
+                raise
+
+            for db_key in [db_key for db_key, entry in self._entries.items()
+                           if db_key not in self._dirty and self._is_expired(entry, now)]:
+                del self._entries[db_key]
+            self._trim()
+
+    async def set_state(self, key: StorageKey, state: str | State | None = None) -> None:
+        entry = await self._load(key)
+        entry.state = state.state if isinstance(state, State) else state
+        self._changed(key, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = await self._load(key)
+        entry.data = dict(data)
+        self._changed(key, entry)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._load(key)).data)
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
@@ -1,29 +1,77 @@
+import re
+
+from sqlalchemy import select
+from core.config import MAX_MESSAGE_LENGTH
 from core.database import Session, User
 
+# конец предложения: знак препинания, закрывающие кавычки/скобки и пробел
+_SENTENCE_END = re.compile(r'[.!?…]+["»”)]*\s')
+
 async def check_role(user_id: int, required_role: str) -> bool:
     """Проверка роли пользователя"""
-    session = Session()
-    try:
-        user = session.query(User).filter_by(user_id=user_id).first()
-        if not user:
+    async with Session() as session:
+        role = await session.scalar(select(User.role).where(User.user_id == user_id))
+        if not role:
             return False
-        if user.role == 'banned':
+        if role == 'banned':
             return False
-        if user.role == 'owner':
+        if role == 'owner':
             return True
-        return user.role == required_role
-    finally:
-        session.close()
+        return role == required_role
 
 async def get_owner_info():
     """Получение информации о владельце"""
-    session = Session()
-    try:
-        owner = session.query(User).filter_by(role='owner').first()
-        return f"id{owner.user_id}" if owner else None
-    finally:
-        session.close()
-
-def split_text(text: str, max_length: int = 4096):
-    """Разделение длинного текста на части"""
-    return [text[i:i + max_length] for i in range(0, len(text), max_length)]
\ No newline at end of file
+    async with Session() as session:
+        owner_id = await session.scalar(select(User.user_id).where(User.role == 'owner').limit(1))
+        return f"id{owner_id}" if owner_id else None
+
+def utf16_length(text: str) -> int:
+    """Длина в единицах UTF-16 - так Telegram считает лимит сообщения"""
+    return len(text.encode('utf-16-le')) // 2
+
+def truncate_utf16(text: str, limit: int) -> str:
+    """text не длиннее limit единиц UTF-16; обрезанный текст заканчивается «…»"""
+    if utf16_length(text) <= limit:
+        return text
+    # 'ignore' отбрасывает половину суррогатной пары на месте разреза
+    return text.encode('utf-16-le')[:2 * (limit - 1)].decode('utf-16-le', errors='ignore') + "…"
+
+def _break_point(text: str, start: int, end: int) -> int:
+    """Место разрыва в text[start:end]: конец абзаца, строки, предложения или слова"""
+    # часть не короче половины лимита, иначе страницы получаются слишком мелкими
+    floor = start + (end - start) // 2
+    for separator in ('\n\n', '\n'):
+        pos = text.rfind(separator, floor, end)
+        if pos != -1:
+            return pos + len(separator)
+    sentence = None
+    for sentence in _SENTENCE_END.finditer(text, floor, end):
+        pass
+    if sentence is not None:
+        return sentence.end()
+    pos = text.rfind(' ', floor, end)
+    return pos + 1 if pos != -1 else end
+
+def page_bounds(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list[tuple[int, int]]:
+    """Границы частей [(start, end)] не длиннее limit единиц UTF-16 с разрывом по смыслу"""
+    bounds = []
+    start = 0
+    while start < len(text):
+        # пробелы и переводы строк на границе частей не переносятся
+        while start < len(text) and text[start].isspace():
+            start += 1
+        if start == len(text):
+            break
+        end = min(len(text), start + limit)
+        # символ вне BMP занимает две единицы UTF-16: отступаем не больше, чем нужно
+        while (excess := utf16_length(text[start:end]) - limit) > 0:
+            end -= (excess + 1) // 2
+        if end < len(text):
+            end = _break_point(text, start, end)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+def split_text(text: str, max_length: int = MAX_MESSAGE_LENGTH):
+    """Разделение длинного текста на части по абзацам, предложениям или словам"""
+    return [text[start:end] for start, end in page_bounds(text, max_length)]
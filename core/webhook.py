@@ -0,0 +1,105 @@
+"""Режим webhook: aiohttp-сервер, принимающий обновления от Telegram.
+
+Обновление подтверждается сразу, а обрабатывается в фоновой задаче
+(не более UPDATE_CONCURRENCY одновременно). Заголовок
+X-Telegram-Bot-Api-Secret-Token сверяется с WEBHOOK_SECRET (если он не
+задан - со случайным токеном, сгенерированным при запуске). При остановке
+сервер перестает принимать запросы и дожидается начатых обработчиков.
+"""
+import asyncio
+import logging
+import secrets
+import signal
+from typing import Any, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from core.config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    UPDATE_CONCURRENCY, SHUTDOWN_DRAIN_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler с ограничением параллельности и ожиданием задач при остановке"""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str] = None,
+                 concurrency: int = UPDATE_CONCURRENCY, drain_timeout: float = SHUTDOWN_DRAIN_TIMEOUT,
+                 **data: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.drain_timeout = drain_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _background_feed_update(self, bot: Bot, update: dict[str, Any]) -> None:
+        async with self._semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def close(self) -> None:
+        """Ожидание начатых обработчиков; сессию бота закрывает main()"""
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info(f"Waiting for {len(tasks)} updates in progress...")
+        done, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        if pending:
+            logger.warning(f"{len(pending)} updates cancelled after {self.drain_timeout}s")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def build_app(dispatcher: Dispatcher, bot: Bot, secret_token: str, path: str = WEBHOOK_PATH,
+              **kwargs) -> web.Application:
+    if not secret_token:
+        # без токена любой, кто достучится до сервера, подделает обновление от имени владельца
+        raise ValueError("Webhook requires a secret token")
+    app = web.Application()
+    DrainingRequestHandler(dispatcher, bot, secret_token=secret_token, **kwargs).register(app, path=path)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+def _stop_on_signals(stop: asyncio.Event) -> list:
+    """SIGTERM/SIGINT завершают run_webhook штатно, как aiogram делает при polling"""
+    loop = asyncio.get_running_loop()
+    installed = []
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows или не главный поток: остается KeyboardInterrupt
+            continue
+        installed.append(sig)
+    return installed
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, stop: Optional[asyncio.Event] = None):
+    """Запуск сервера и регистрация webhook; работает до SIGTERM/SIGINT или stop.set()"""
+    stop = stop or asyncio.Event()
+    signals = _stop_on_signals(stop)
+    # без WEBHOOK_SECRET токен генерируется заново при каждом запуске и передается в set_webhook
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    app = build_app(dispatcher, bot, secret_token)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        await bot.set_webhook(
+            f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=secret_token,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        await stop.wait()
+        logger.info("Stopping webhook server...")
+    finally:
+        # остановка приема запросов, затем on_shutdown -> DrainingRequestHandler.close;
+        # хранилище FSM и outbox останавливает main() после возврата
+        await runner.cleanup()
+        loop = asyncio.get_running_loop()
+        for sig in signals:
+            loop.remove_signal_handler(sig)
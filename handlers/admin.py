@@ -1,124 +1,246 @@
 from aiogram import types
 from aiogram.filters import Command
-from core.database import Session, User
-from core.config import ROLES
+from aiogram.fsm.context import FSMContext
+from sqlalchemy import and_, false, func, or_, select
+from core.database import Session, User, Profile
+from core.commands import sync_commands, schedule_sync
+from core.config import ROLES, MAX_BULK_ROLES
+from core.ingest import IngestError
+from core.metrics import metrics
+from core.pagination import keyset_page, pager_keyboard, parse_page_callback, filter_token, remember_filter, recall_filter
+from core.profiles import profiles, search_key
+from core.outbox import enqueue, wake
+from core.roles import ROLE_ALIASES, role_notification, parse_assignments, resolve_usernames, apply_roles, read_roles_file
 from core.utils import check_role, split_text, get_owner_info
+from handlers.reader import show_page
 
 async def init_owner(message: types.Message):
-    session = Session()
-    try:
-        owner = session.query(User).filter_by(role='owner').first()
+    async with Session() as session:
+        owner = await session.scalar(select(User).filter_by(role='owner').limit(1))
         if owner:
             await message.reply("Владелец бота уже назначен.")
             return
-        
+
         user = User(user_id=message.from_user.id, role='owner')
         session.add(user)
-        session.commit()
-        await message.reply("Вы назначены владельцем бота.")
-    finally:
-        session.close()
+        await session.commit()
+    await message.reply("Вы назначены владельцем бота.")
+    await sync_commands(message.bot, message.from_user.id)
+
+MAX_TELEGRAM_ID_DIGITS = 16  # ID Telegram занимают до 52 бит
+
+def parse_users_filter(args: list[str]) -> dict:
+    """'/users [роль] [префикс]' -> {'role': ..., 'prefix': ...}"""
+    role = None
+    if args and args[0].lower() in ROLE_ALIASES:
+        role = ROLE_ALIASES[args.pop(0).lower()]
+    return {'role': role, 'prefix': ' '.join(args) or None}
+
+def id_prefix_condition(digits: str):
+    """ID, начинающиеся с digits, - несколько диапазонов по индексу вместо LIKE по тексту"""
+    if len(digits) > MAX_TELEGRAM_ID_DIGITS or digits.startswith('0'):
+        # с такого префикса не начинается ни один ID
+        return false()
+    value = int(digits)
+    return or_(*(
+        User.user_id.between(value * 10 ** shift, (value + 1) * 10 ** shift - 1)
+        for shift in range(max(MAX_TELEGRAM_ID_DIGITS - len(digits), 0) + 1)
+    ))
+
+def key_prefix_condition(column, prefix: str):
+    # диапазон [prefix, prefix + максимальный символ) использует индекс, в отличие от LIKE
+    return and_(column >= prefix, column < prefix + '\U0010ffff')
+
+async def render_users(role: str = None, prefix: str = None, after: int = None, before: int = None):
+    """Страница /users: (текст, клавиатура) или (None, None), если никого нет.
 
-async def list_users(message: types.Message):
+    Имена берутся только из сохраненных профилей, без запросов к Telegram.
+    """
+    stmt = (
+        select(User.id, User.user_id, User.role, Profile.username, Profile.full_name)
+        .outerjoin(Profile, Profile.user_id == User.user_id)
+    )
+    if role:
+        stmt = stmt.where(User.role == role)
+    if prefix and prefix.isascii() and prefix.isdigit():
+        stmt = stmt.where(id_prefix_condition(prefix))
+    elif prefix:
+        key = search_key(prefix.lstrip('@'))
+        # пустой ключ (один '@') - фильтра по имени нет
+        if key:
+            stmt = stmt.where(or_(key_prefix_condition(Profile.username_key, key),
+                                  key_prefix_condition(Profile.name_key, key)))
+
+    async with Session() as session:
+        rows, has_prev, has_next = await keyset_page(session, stmt, User.id, after=after, before=before)
+        if not rows:
+            return None, None
+        # подсчет по индексу ix_users_role_id, без чтения строк таблицы
+        counts = dict((await session.execute(select(User.role, func.count()).group_by(User.role))).all())
+
+    text = "👥 Пользователи"
+    if role:
+        text += f" с ролью «{ROLES.get(role, role)}»"
+    if prefix:
+        text += f" по запросу «{prefix}»"
+    text += (
+        f"\nВсего: {sum(counts.values())} ("
+        + ", ".join(f"{ROLES.get(key, key)}: {count}" for key, count in sorted(counts.items(), key=str))
+        + ")\n\n"
+    )
+    for row in rows:
+        mention = f"@{row.username}" if row.username else f"id{row.user_id}"
+        text += (
+            f"• {row.full_name or 'Неизвестно'} ({mention})\n"
+            f"  Роль: {ROLES.get(row.role, row.role)}, ID: {row.user_id}\n"
+        )
+    text += (
+        "\nДля выдачи роли: /setrole <ID> <роль>\n"
+        "Фильтры: /users [роль] [начало имени, @username или ID]"
+    )
+    token = filter_token({'role': role, 'prefix': prefix})
+    return text, pager_keyboard(f'users_{token}', rows[0].id, rows[-1].id, has_prev, has_next)
+
+async def list_users(message: types.Message, state: FSMContext):
     if not await check_role(message.from_user.id, 'owner'):
         await message.reply("У вас нет прав для просмотра списка пользователей.")
         return
-    
-    session = Session()
-    try:
-        users = session.query(User).all()
-        if not users:
-            await message.reply("В базе данных нет зарегистрированных пользователей.")
-            return
-        
-        text = "👥 Список пользователей:\n\n"
-        for user in users:
-            try:
-                user_info = await message.bot.get_chat(user.user_id)
-                username = f"@{user_info.username}" if user_info.username else f"id{user.user_id}"
-                name = user_info.full_name
-            except:
-                username = f"id{user.user_id}"
-                name = "Неизвестно"
-            
-            text += (
-                f"• {name} ({username})\n"
-                f"  Роль: {ROLES.get(user.role, user.role)}\n"
-                f"  ID: {user.user_id}\n"
-                f"  Для выдачи роли: /setrole {user.user_id} <роль>\n\n"
-            )
-        
-        text += (
-            "📝 Доступные роли:\n"
-            "• reader - читатель\n"
-            "• author - автор\n"
-            "• moderator - модератор\n"
-            "• banned - заблокированный\n\n"
-            "Пример: /setrole 123456789 author"
-        )
-        
-        for part in split_text(text):
-            await message.answer(part)
-            
-    finally:
-        session.close()
+
+    users_filter = parse_users_filter(message.text.split()[1:])
+    text, keyboard = await render_users(**users_filter)
+    if text is None:
+        await message.reply("Пользователи не найдены.")
+        return
+    await remember_filter(state, 'users_filters', users_filter)
+    await message.answer(text, reply_markup=keyboard)
+
+async def list_users_page(callback: types.CallbackQuery, state: FSMContext):
+    """'users_<токен фильтра>_<prev|next>_<id>'"""
+    if not await check_role(callback.from_user.id, 'owner'):
+        await callback.answer("У вас нет прав для просмотра списка пользователей.", show_alert=True)
+        return
+    users_filter = await recall_filter(state, 'users_filters', callback.data)
+    if users_filter is None:
+        await callback.answer("Список устарел, повторите /users.", show_alert=True)
+        return
+    text, keyboard = await render_users(**users_filter, **parse_page_callback(callback.data))
+    await show_page(callback, text, keyboard)
 
 async def set_user_role(message: types.Message):
     if not await check_role(message.from_user.id, 'owner'):
         await message.reply("У вас нет прав на выполнение этой команды.")
         return
-    
+
     try:
         parts = message.text.split()
         if len(parts) != 3:
             await message.reply("Неверный формат команды. Используйте: /setrole <user_id/username> <role>")
             return
-        
+
         _, user_identifier, role = parts
-        
+
         if role not in ROLES:
             await message.reply(f"Недопустимая роль. Доступные роли: {', '.join(ROLES.keys())}")
             return
-            
-        session = Session()
-        try:
-            if user_identifier.startswith('@'):
-                username = user_identifier[1:]
+
+        if user_identifier.startswith('@'):
+            username = user_identifier[1:]
+            user_id = await profiles.find_by_username(username)
+            if user_id is None:
                 try:
-                    user_info = await message.bot.get_chat(username)
+                    user_info = await message.bot.get_chat(user_identifier)
                     user_id = user_info.id
                 except:
                     await message.reply("Пользователь не найден.")
                     return
-            else:
-                try:
-                    user_id = int(user_identifier)
-                except ValueError:
-                    await message.reply("Неверный формат ID пользователя.")
-                    return
-            
-            user = session.query(User).filter_by(user_id=user_id).first()
+        else:
+            try:
+                user_id = int(user_identifier)
+            except ValueError:
+                await message.reply("Неверный формат ID пользователя.")
+                return
+
+        async with Session() as session:
+            user = await session.scalar(select(User).filter_by(user_id=user_id))
             if not user:
                 user = User(user_id=user_id, role=role)
                 session.add(user)
             else:
                 user.role = role
-            session.commit()
-            
-            await message.reply(f"Роль {ROLES[role]} успешно установлена.")
-            
-            # уведомление того, кому назначили роль
-            try:
-                if role == 'banned':
-                    notification = f"⛔️ Вы были заблокированы в системе."
-                else:
-                    notification = f"🔄 Ваша роль была изменена на: {ROLES[role]}"
-                await message.bot.send_message(user_id, notification)
-            except:
-                pass
-            
-        finally:
-            session.close()
-            
+            enqueue(session, user_id, role_notification(role))
+            await session.commit()
+        wake()
+        await sync_commands(message.bot, user_id)
+
+        await message.reply(f"Роль {ROLES[role]} успешно установлена.")
+
     except Exception as e:
-        await message.reply(f"Произошла ошибка: {str(e)}")
\ No newline at end of file
+        await message.reply(f"Произошла ошибка: {str(e)}")
+
+MAX_ERRORS_SHOWN = 20
+
+def bulk_roles_summary(result, errors: list[str]) -> str:
+    counts = {}
+    for _, role in result.changed:
+        counts[role] = counts.get(role, 0) + 1
+    text = f"✅ Роли изменены: {len(result.changed)}\n"
+    for role, count in sorted(counts.items()):
+        text += f"  {ROLES[role]}: {count}\n"
+    if result.created:
+        text += f"Новых пользователей: {result.created}\n"
+    if result.unchanged:
+        text += f"Без изменений: {result.unchanged}\n"
+    if result.protected:
+        text += f"Пропущены владельцы: {', '.join(map(str, result.protected))}\n"
+    if errors:
+        text += f"\n⚠️ Ошибки ({len(errors)}):\n" + "\n".join(errors[:MAX_ERRORS_SHOWN])
+        if len(errors) > MAX_ERRORS_SHOWN:
+            text += f"\n... и еще {len(errors) - MAX_ERRORS_SHOWN}"
+    return text
+
+async def set_roles(message: types.Message):
+    """/setroles: много назначений одной транзакцией (строки после команды или CSV-файл)"""
+    if not await check_role(message.from_user.id, 'owner'):
+        await message.reply("У вас нет прав на выполнение этой команды.")
+        return
+
+    command = (message.text or message.caption or '').split(maxsplit=1)
+    lines = command[1].split('\n') if len(command) > 1 else []
+    if message.document:
+        try:
+            lines += await read_roles_file(message.bot, message.document.file_id, message.document.file_size)
+        except IngestError as e:
+            await message.reply(str(e))
+            return
+    if not lines:
+        await message.reply(
+            "Используйте: /setroles, а со следующих строк - назначения:\n"
+            "<user_id/@username> <role> или <role> <user_id> <user_id> ...\n"
+            "Можно приложить CSV-файл со столбцами user_id,role и подписью /setroles"
+        )
+        return
+
+    assignments, errors = parse_assignments(lines)
+    if len(assignments) > MAX_BULK_ROLES:
+        await message.reply(f"Слишком много пользователей. Максимум - {MAX_BULK_ROLES} за раз.")
+        return
+
+    async with Session() as session:
+        assignments, unknown = await resolve_usernames(session, assignments)
+        result = await apply_roles(session, assignments)
+        await session.commit()
+    wake()
+    # меню обновляются в фоне с ограниченной частотой, не задерживая ответ
+    schedule_sync(message.bot, [user_id for user_id, _ in result.changed])
+
+    errors += [f"{name}: пользователь не найден" for name in unknown]
+    for part in split_text(bulk_roles_summary(result, errors)):
+        await message.answer(part)
+
+async def show_stats(message: types.Message):
+    if not await check_role(message.from_user.id, 'owner'):
+        await message.reply("У вас нет прав для просмотра статистики.")
+        return
+
+    for part in split_text(metrics.summary()):
+        await message.answer(part)
@@ -1,13 +1,18 @@
+import logging
+
 from aiogram import Bot, types
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
+from sqlalchemy import select, update
+from core.content import write_content
+from core.ingest import IngestError, discard_upload, ingest_file
 from core.database import Session, Work, User
+from core.outbox import enqueue, wake
 from core.utils import check_role, get_owner_info
 from states.states import AuthorStates
-from core.config import MAX_WORK_LENGTH
+from core.config import MAX_WORK_LENGTH, MAX_UPLOAD_SIZE
 
-# Изменим константу на более безопасное значение
-MAX_WORK_LENGTH = 3500  # Можно вынести в config.py
+logger = logging.getLogger(__name__)
 
 async def submit_work(message: types.Message, state: FSMContext):
     if not await check_role(message.from_user.id, 'author'):
@@ -43,80 +48,88 @@ async def process_title(message: types.Message, state: FSMContext):
     await state.set_state(AuthorStates.waiting_for_content)
 
 async def process_work_content(message: types.Message, state: FSMContext):
-    content = ""
-    
+    data = await state.get_data()
+    title = data['title']
+
     # Обработка текстового сообщения
     if message.text:
         content = message.text
-    
+        if len(content) > MAX_WORK_LENGTH:
+            await message.reply(
+                f"Текст работы слишком длинный.\n"
+                f"Максимальная длина - {MAX_WORK_LENGTH} символов.\n"
+                f"Ваш текст: {len(content)} символов."
+            )
+            return
+
+        async with Session() as session:
+            user = await session.scalar(select(User).filter_by(user_id=message.from_user.id))
+            work = Work(author_id=user.id, title=title, content_length=len(content), is_approved=False)
+            session.add(work)
+            await session.flush()
+            await write_content(session, work.id, content)
+            length = len(content)
+            await notify_moderators(session, message, title, length)
+            await session.commit()
+
     # Обработка файла
     elif message.document:
-        try:
-            # Проверяем расширение файла
-            if not message.document.file_name.lower().endswith('.txt'):
-                await message.reply(
-                    "Пожалуйста, отправьте текстовый файл в формате .txt"
-                )
-                return
-                
-            # Скачиваем файл
-            file = await message.bot.get_file(message.document.file_id)
-            file_path = file.file_path
-            downloaded_file = await message.bot.download_file(file_path)
-            
-            # Читаем содержимое файла
-            content = downloaded_file.read().decode('utf-8')
-        except Exception as e:
+        # Проверяем расширение файла
+        if not (message.document.file_name or '').lower().endswith('.txt'):
             await message.reply(
-                "Произошла ошибка при чтении файла. "
-                "Убедитесь, что файл в формате UTF-8 и попробуйте снова."
+                "Пожалуйста, отправьте текстовый файл в формате .txt"
             )
             return
+        # размер известен заранее - большой файл отклоняется без скачивания
+        if (message.document.file_size or 0) > MAX_UPLOAD_SIZE:
+            await message.reply(f"Файл слишком большой. Максимальный размер - {MAX_UPLOAD_SIZE // 2 ** 20} МБ.")
+            return
+
+        # работа без content_length не видна модераторам, пока текст не загружен
+        async with Session() as session:
+            user = await session.scalar(select(User).filter_by(user_id=message.from_user.id))
+            work = Work(author_id=user.id, title=title, content_length=None, is_approved=False)
+            session.add(work)
+            await session.commit()
+            work_id = work.id
+
+        try:
+            length = await ingest_file(message.bot, message.document.file_id, work_id)
+        except IngestError as e:
+            await discard_upload(work_id)
+            await message.reply(str(e))
+            return
+        except Exception:
+            logger.exception(f"Upload of work {work_id} failed")
+            await discard_upload(work_id)
+            await message.reply("Произошла ошибка при чтении файла. Попробуйте отправить его снова.")
+            return
+
+        async with Session() as session:
+            await session.execute(update(Work).where(Work.id == work_id).values(content_length=length))
+            await notify_moderators(session, message, title, length)
+            await session.commit()
     else:
         await message.reply(
             "Пожалуйста, отправьте текст работы или текстовый файл (.txt)"
         )
         return
+    wake()
 
-    # Проверка длины контента
-    if len(content) > MAX_WORK_LENGTH:
-        await message.reply(
-            f"Текст работы слишком длинный.\n"
-            f"Максимальная длина - {MAX_WORK_LENGTH} символов.\n"
-            f"Ваш текст: {len(content)} символов."
-        )
-        return
-        
-    session = Session()
-    try:
-        data = await state.get_data()
-        title = data['title']
-        
-        user = session.query(User).filter_by(user_id=message.from_user.id).first()
-        work = Work(author_id=user.id, title=title, content=content, is_approved=False)
-        session.add(work)
-        session.commit()
-        
-        await state.clear()
-        await message.reply(
-            "Ваша работа отправлена на проверку модератору.\n"
-            f"Длина текста: {len(content)} символов."
-        )
-        
-        # уведомление модераторов
-        moderators = session.query(User).filter_by(role='moderator').all()
-        notification = (
-            f"📝 Новая работа на проверку!\n"
-            f"Название: {title}\n"
-            f"Автор: @{message.from_user.username or message.from_user.id}\n"
-            f"Длина текста: {len(content)} символов"
-        )
-        
-        for moderator in moderators:
-            try:
-                await message.bot.send_message(moderator.user_id, notification)
-            except:
-                continue
-                
-    finally:
-        session.close()
\ No newline at end of file
+    await state.clear()
+    await message.reply(
+        "Ваша работа отправлена на проверку модератору.\n"
+        f"Длина текста: {length} символов."
+    )
+
+async def notify_moderators(session, message: types.Message, title: str, length: int):
+    """Уведомление модераторов о новой работе (в транзакции сохранения работы)"""
+    notification = (
+        f"📝 Новая работа на проверку!\n"
+        f"Название: {title}\n"
+        f"Автор: @{message.from_user.username or message.from_user.id}\n"
+        f"Длина текста: {length} символов"
+    )
+    moderators = (await session.scalars(select(User.user_id).filter_by(role='moderator'))).all()
+    for moderator_id in moderators:
+        enqueue(session, moderator_id, notification)
@@ -1,10 +1,41 @@
 from aiogram import Bot, types
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from core.database import Session, Work, User
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from core.content import build_pages, read_content, read_previews, delete_content
+from core.config import REVIEW_LEASE_TTL, REVIEW_PREVIEW_LENGTH
+from core.database import Session, Work
+from core.moderation import claim_next, pending_count, release, take_work
+from core.outbox import enqueue, wake
+from core.rankings import update_ranking, remove_ranking
+from core.render_cache import CATALOGUE, renders, reviews_of
+from core.search import index_work, unindex_work
 from core.utils import check_role, get_owner_info
+from handlers.reader import show_page
 from datetime import datetime
 
+async def render_review_card(session, work):
+    """Карточка арендованной работы: (текст, клавиатура)"""
+    preview = (await read_previews(session, [work.id], REVIEW_PREVIEW_LENGTH)).get(work.id, "")
+    if (work.content_length or 0) > REVIEW_PREVIEW_LENGTH:
+        preview += "...\n[Текст слишком длинный. Показана только часть]"
+    remaining = await pending_count(session)
+
+    buttons = [
+        [
+            types.InlineKeyboardButton(text="Одобрено", callback_data=f"approve_{work.id}"),
+            types.InlineKeyboardButton(text="Отказано", callback_data=f"reject_{work.id}")
+        ],
+        [types.InlineKeyboardButton(text="Следующая ➡️", callback_data=f"review_next_{work.id}")]
+    ]
+    text = (
+        f"Работа: {work.title} (ID: {work.id})\n"
+        f"В очереди: {remaining}, закреплена за вами на {REVIEW_LEASE_TTL // 60} мин.\n\n"
+        f"{preview}"
+    )
+    return text, types.InlineKeyboardMarkup(inline_keyboard=buttons)
+
 async def review_works(message: types.Message):
     if not await check_role(message.from_user.id, 'moderator'):
         owner_info = await get_owner_info()
@@ -13,93 +44,97 @@ async def review_works(message: types.Message):
         else:
             await message.reply("Система еще не настроена. Владелец не назначен.")
         return
-    
-    session = Session()
-    try:
-        works = session.query(Work).filter_by(is_approved=False).all()
-        if not works:
-            await message.reply("Нет работ для проверки.")
-            return
-            
-        for work in works:
-            buttons = [
-                [
-                    types.InlineKeyboardButton(text="Одобрено", callback_data=f"approve_{work.id}"),
-                    types.InlineKeyboardButton(text="Отказано", callback_data=f"reject_{work.id}")
-                ]
-            ]
-            keyboard = types.InlineKeyboardMarkup(inline_keyboard=buttons)
-            
-            # Ограничиваем длину контента
-            max_content_length = 3500  # Оставляем запас для заголовка и форматирования
-            content = work.content
-            if len(content) > max_content_length:
-                content = content[:max_content_length] + "...\n[Текст слишком длинный. Показана только часть]"
-            
-            try:
-                await message.reply(
-                    f"Работа: {work.title}\n\n{content}", 
-                    reply_markup=keyboard
-                )
-            except Exception as e:
-                await message.reply(
-                    f"Ошибка при отправке работы '{work.title}' (ID: {work.id}). "
-                    f"Возможно, сообщение слишком длинное."
-                )
-    finally:
-        session.close()
+
+    async with Session() as session:
+        work = await claim_next(session, message.from_user.id)
+        if work:
+            text, keyboard = await render_review_card(session, work)
+        await session.commit()
+    if not work:
+        await message.reply("Нет работ для проверки.")
+        return
+    await message.reply(text, reply_markup=keyboard)
+
+async def review_next(callback: types.CallbackQuery):
+    """Следующая работа в очереди; текущая возвращается в очередь"""
+    if not await check_role(callback.from_user.id, 'moderator'):
+        await callback.answer("У вас нет прав для проверки работ.", show_alert=True)
+        return
+    current_id = int(callback.data.rsplit('_', 1)[1])
+
+    async with Session() as session:
+        work = await claim_next(session, callback.from_user.id, after=current_id)
+        if work:
+            await release(session, current_id, callback.from_user.id)
+            text, keyboard = await render_review_card(session, work)
+        await session.commit()
+    if not work:
+        await callback.answer("Других работ в очереди нет.", show_alert=True)
+        return
+    await show_page(callback, text, keyboard)
+
+def next_work_keyboard(work_id: int) -> types.InlineKeyboardMarkup:
+    return types.InlineKeyboardMarkup(inline_keyboard=[
+        [types.InlineKeyboardButton(text="Следующая работа ➡️", callback_data=f"review_next_{work_id}")]
+    ])
 
 async def approve_work(callback: types.CallbackQuery):
-    session = Session()
-    try:
-        work_id = int(callback.data.split('_')[1])
-        work = session.query(Work).filter_by(id=work_id).first()
+    if not await check_role(callback.from_user.id, 'moderator'):
+        await callback.answer("У вас нет прав для проверки работ.", show_alert=True)
+        return
+    work_id = int(callback.data.split('_')[1])
+    async with Session() as session:
+        # захват работы не дает двум модераторам принять решение одновременно
+        if not await take_work(session, work_id, callback.from_user.id):
+            await callback.answer("Работа уже проверена или ее проверяет другой модератор.", show_alert=True)
+            return
+        work = await session.scalar(select(Work).options(joinedload(Work.author)).filter_by(id=work_id))
         if work:
             work.is_approved = True
-            session.commit()
-            await callback.message.answer(f"Работа '{work.title}' одобрена.")
-            
-            # уведомление автора
-            author = session.query(User).filter_by(id=work.author_id).first()
-            if author:
-                try:
-                    await callback.bot.send_message(
-                        author.user_id,
-                        f"✅ Ваша работа '{work.title}' была одобрена модератором!"
-                    )
-                except:
-                    pass
-                    
-        await callback.answer()
-    finally:
-        session.close()
+            work.claimed_by, work.claimed_until = None, 0
+            content = await read_content(session, work.id)
+            await index_work(session, work.id, work.title, content)
+            await build_pages(session, work.id, content)
+            await update_ranking(session, work.id, work.rating_sum or 0, work.ratings_count or 0,
+                                 work.genre, work.theme)
+            # уведомление автора уходит через outbox в той же транзакции
+            if work.author:
+                enqueue(session, work.author.user_id, f"✅ Ваша работа '{work.title}' была одобрена модератором!")
+            await session.commit()
+
+    if work:
+        renders.bump(CATALOGUE)
+        wake()
+        await callback.message.answer(f"Работа '{work.title}' одобрена.", reply_markup=next_work_keyboard(work_id))
+
+    await callback.answer()
 
 async def reject_work(callback: types.CallbackQuery):
-    session = Session()
-    try:
-        work_id = int(callback.data.split('_')[1])
-        work = session.query(Work).filter_by(id=work_id).first()
+    if not await check_role(callback.from_user.id, 'moderator'):
+        await callback.answer("У вас нет прав для проверки работ.", show_alert=True)
+        return
+    work_id = int(callback.data.split('_')[1])
+    async with Session() as session:
+        if not await take_work(session, work_id, callback.from_user.id):
+            await callback.answer("Работа уже проверена или ее проверяет другой модератор.", show_alert=True)
+            return
+        work = await session.scalar(select(Work).options(joinedload(Work.author)).filter_by(id=work_id))
         if work:
             title = work.title
-            author_id = work.author_id
-            session.delete(work)
-            session.commit()
-            await callback.message.answer(f"Работа '{title}' отклонена.")
-            
-            # уведомление автора
-            author = session.query(User).filter_by(id=author_id).first()
-            if author:
-                try:
-                    await callback.bot.send_message(
-                        author.user_id,
-                        f"❌ Ваша работа '{title}' была отклонена модератором."
-                    )
-                except:
-                    pass
-                    
-        await callback.answer()
-    finally:
-        session.close()
+            if work.author:
+                enqueue(session, work.author.user_id, f"❌ Ваша работа '{title}' была отклонена модератором.")
+            await delete_content(session, work_id)
+            await unindex_work(session, work_id)
+            await remove_ranking(session, work_id)
+            await session.delete(work)
+            await session.commit()
+
+    if work:
+        renders.bump(CATALOGUE, reviews_of(work_id))
+        wake()
+        await callback.message.answer(f"Работа '{title}' отклонена.", reply_markup=next_work_keyboard(work_id))
+
+    await callback.answer()
 
 async def delete_work(message: types.Message):
     if not await check_role(message.from_user.id, 'moderator'):
@@ -109,25 +144,26 @@ async def delete_work(message: types.Message):
         else:
             await message.reply("Система еще не настроена. Владелец не назначен.")
         return
-    
+
     try:
         _, work_id = message.text.split()
         work_id = int(work_id)
     except (ValueError, IndexError):
         await message.reply("Используйте формат: /delete_work <id работы>")
         return
-    
-    session = Session()
-    try:
-        work = session.query(Work).filter_by(id=work_id).first()
+
+    async with Session() as session:
+        work = await session.scalar(select(Work).filter_by(id=work_id))
         if not work:
             await message.reply("Работа с указанным ID не найдена.")
             return
-        
+
         title = work.title
-        session.delete(work)
-        session.commit()
-        
-        await message.reply(f"Работа '{title}' (ID: {work_id}) успешно удалена.")
-    finally:
-        session.close()
\ No newline at end of file
+        await delete_content(session, work_id)
+        await unindex_work(session, work_id)
+        await remove_ranking(session, work_id)
+        await session.delete(work)
+        await session.commit()
+
+    renders.bump(CATALOGUE, reviews_of(work_id))
+    await message.reply(f"Работа '{title}' (ID: {work_id}) успешно удалена.")
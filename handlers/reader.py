@@ -1,39 +1,98 @@
 from aiogram import Bot, types
 from aiogram.filters import Command, StateFilter
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
+from sqlalchemy import Float, cast, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from core.config import MAX_TITLE_DISPLAY, REVIEWS_PAGE_SIZE, REVIEW_TEXT_DISPLAY
+from core.content import build_pages, read_page
 from core.database import Session, Work, User, Review
-from core.utils import split_text
+from core.pagination import (
+    keyset_page, pager_keyboard, parse_page_callback, parse_page_number, filter_token, remember_filter, recall_filter,
+)
+from core.profiles import profiles
+from core.rankings import top_works, update_ranking
+from core.render_cache import CATALOGUE, renders, reviews_of
+from core.search import search_works
+from core.utils import truncate_utf16
+from core.outbox import enqueue, wake
 from states.states import RatingStates
 from datetime import datetime
+import asyncio
+import html
+import logging
+
+logger = logging.getLogger(__name__)
+
+STARS_COLUMNS = (Work.stars_1, Work.stars_2, Work.stars_3, Work.stars_4, Work.stars_5)
+
+async def has_rated(session, work_id: int, telegram_id: int) -> bool:
+    """Оценивал ли пользователь работу (один запрос с join по users)"""
+    review_id = await session.scalar(
+        select(Review.id)
+        .join(User, Review.user_id == User.id)
+        .where(Review.work_id == work_id, User.user_id == telegram_id)
+        .limit(1)
+    )
+    return review_id is not None
+
+async def read_works_rows(after: int = None, before: int = None):
+    """Строки страницы /read: (rows, has_prev, has_next); кэшируются до изменения каталога"""
+    async def query():
+        async with Session() as session:
+            return await keyset_page(
+                session,
+                select(Work.id, Work.title, Work.rating, Work.ratings_count, User.user_id)
+                .join(User, Work.author_id == User.id)
+                .where(Work.is_approved == True),
+                Work.id, after=after, before=before,
+            )
+
+    return await renders.get_or_render(('read', after, before), (CATALOGUE,), query)
+
+async def render_read_works(bot: Bot, after: int = None, before: int = None):
+    """Страница /read: (текст, клавиатура) или (None, None), если работ нет"""
+    rows, has_prev, has_next = await read_works_rows(after, before)
+    if not rows:
+        return None, None
+
+    # упоминания не кэшируются вместе со страницей: профили обновляются отдельно
+    mentions = await profiles.mentions(bot, [row.user_id for row in rows])
+
+    text = "📚 Доступные работы:\n\n"
+    for row in rows:
+        author_mention = mentions[row.user_id]
+        rating_display = f"⭐{row.rating:.1f}" if row.ratings_count > 0 else "Нет оценок"
+        text += (f"ID: {row.id}\n"
+                f"📖 Название: {row.title}\n"
+                f"✍️ Автор: {author_mention}\n"
+                f"📊 Рейтинг: {rating_display} ({row.ratings_count} оценок)\n\n")
+
+    return text, pager_keyboard('read', rows[0].id, rows[-1].id, has_prev, has_next)
 
 async def read_works(message: types.Message):
-    session = Session()
+    text, keyboard = await render_read_works(message.bot)
+    if text is None:
+        await message.reply("Нет доступных работ для чтения.")
+        return
+    await message.answer(text, reply_markup=keyboard)
+
+async def read_works_page(callback: types.CallbackQuery):
+    text, keyboard = await render_read_works(callback.bot, **parse_page_callback(callback.data))
+    await show_page(callback, text, keyboard)
+
+async def show_page(callback: types.CallbackQuery, text: str, keyboard, parse_mode: str = None):
+    """Замена текущей страницы списка на новую в том же сообщении"""
+    if text is None:
+        await callback.answer("Здесь больше ничего нет.", show_alert=True)
+        return
     try:
-        works = session.query(Work).filter_by(is_approved=True).all()
-        if not works:
-            await message.reply("Нет доступных работ для чтения.")
-            return
-        
-        text = "📚 Доступные работы:\n\n"
-        for work in works:
-            author = session.query(User).filter_by(id=work.author_id).first()
-            try:
-                author_info = await message.bot.get_chat(author.user_id)
-                author_mention = f"@{author_info.username}" if author_info.username else f"id{author.user_id}"
-            except:
-                author_mention = f"id{author.user_id}"
-            
-            rating_display = f"⭐{work.rating:.1f}" if work.ratings_count > 0 else "Нет оценок"
-            text += (f"ID: {work.id}\n"
-                    f"📖 Название: {work.title}\n"
-                    f"✍️ Автор: {author_mention}\n"
-                    f"📊 Рейтинг: {rating_display} ({work.ratings_count} оценок)\n\n")
-        
-        for part in split_text(text):
-            await message.answer(part)
-                
-    finally:
-        session.close()
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode=parse_mode)
+    except TelegramBadRequest:
+        # страница не изменилась (например, двойное нажатие)
+        pass
+    await callback.answer()
 
 async def rate_work(message: types.Message, state: FSMContext):
     try:
@@ -41,116 +100,259 @@ async def rate_work(message: types.Message, state: FSMContext):
     except (IndexError, ValueError):
         await message.reply("Используйте формат: /rate_work <id работы>")
         return
-    
-    session = Session()
-    try:
-        work = session.query(Work).filter_by(id=work_id, is_approved=True).first()
-        if not work:
-            await message.reply("Работа не найдена или не одобрена модератором.")
-            return
-        
-        await state.update_data(work_id=work_id)
-        
-        buttons = [
-            [types.InlineKeyboardButton(text=f"{'⭐' * i}", callback_data=f"rate_{i}")]
-            for i in range(1, 6)
-        ]
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=buttons)
-        
-        await message.reply("Оцените работу от 1 до 5 звезд:", reply_markup=keyboard)
-        await state.set_state(RatingStates.waiting_for_rating)
-        
-    finally:
-        session.close()
+
+    async with Session() as session:
+        work = await session.scalar(select(Work).filter_by(id=work_id, is_approved=True))
+    if not work:
+        await message.reply("Работа не найдена или не одобрена модератором.")
+        return
+
+    await state.update_data(work_id=work_id)
+
+    buttons = [
+        [types.InlineKeyboardButton(text=f"{'⭐' * i}", callback_data=f"rate_{i}")]
+        for i in range(1, 6)
+    ]
+    keyboard = types.InlineKeyboardMarkup(inline_keyboard=buttons)
+
+    await message.reply("Оцените работу от 1 до 5 звезд:", reply_markup=keyboard)
+    await state.set_state(RatingStates.waiting_for_rating)
 
 async def process_rating(callback: types.CallbackQuery, state: FSMContext):
     rating = int(callback.data.split('_')[1])
-    
+
     data = await state.get_data()
     work_id = data.get('work_id')
-    
+
     await state.update_data(rating=rating, work_id=work_id)
-    
+
     await callback.message.answer("Напишите свой отзыв о работе (или отправьте 'пропустить'):")
     await state.set_state(RatingStates.waiting_for_review)
     await callback.answer()
 
 async def process_review(message: types.Message, state: FSMContext):
-    session = Session()
-    try:
-        data = await state.get_data()
-        work_id = data.get('work_id')
-        rating = data.get('rating')
-        
-        if not work_id or not rating:
-            await message.reply("Произошла ошибка. Пожалуйста, начните оценку заново.")
-            await state.clear()
-            return
-            
-        review_text = message.text if message.text.lower() != 'пропустить' else None
-        
-        work = session.query(Work).filter_by(id=work_id).first()
-        user = session.query(User).filter_by(user_id=message.from_user.id).first()
-        
+    data = await state.get_data()
+    work_id = data.get('work_id')
+    rating = data.get('rating')
+
+    if not work_id or not rating:
+        await message.reply("Произошла ошибка. Пожалуйста, начните оценку заново.")
+        await state.clear()
+        return
+
+    review_text = message.text if message.text.lower() != 'пропустить' else None
+
+    async with Session() as session:
+        work = await session.scalar(select(Work).options(joinedload(Work.author)).filter_by(id=work_id))
+        user = await session.scalar(select(User).filter_by(user_id=message.from_user.id))
+
         if work and user:
-            if review_text:
-                review = Review(
-                    work_id=work_id,
-                    user_id=user.id,
-                    rating=rating,
-                    review_text=review_text,
-                    created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # каждая оценка - строка reviews; уникальный индекс не дает оценить дважды
+            session.add(Review(
+                work_id=work_id,
+                user_id=user.id,
+                rating=rating,
+                review_text=review_text,
+                created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            ))
+            try:
+                await session.flush()
+            except IntegrityError:
+                await session.rollback()
+                await message.reply("Вы уже оценивали эту работу!")
+                await state.clear()
+                return
+
+            # агрегаты считаются в базе одним UPDATE из целых суммы и количества,
+            # поэтому параллельные оценки не затирают друг друга
+            new_rating, rating_sum, ratings_count = (await session.execute(
+                update(Work)
+                .where(Work.id == work_id)
+                .values(
+                    rating_sum=Work.rating_sum + rating,
+                    ratings_count=Work.ratings_count + 1,
+                    rating=cast(Work.rating_sum + rating, Float) / (Work.ratings_count + 1),
+                    **{f'stars_{rating}': getattr(Work, f'stars_{rating}') + 1},
                 )
-                session.add(review)
-            
-            new_rating = (work.rating * work.ratings_count + rating) / (work.ratings_count + 1)
-            work.rating = round(new_rating, 2)
-            work.ratings_count += 1
-            session.commit()
-            
-            response = f"Спасибо за вашу оценку! Текущий рейтинг работы: {work.rating}⭐ ({work.ratings_count} оценок)"
-            if review_text:
-                response += f"\nВаш отзыв сохранен: {review_text}"
-            
-            await message.reply(response)
-            
+                .returning(Work.rating, Work.rating_sum, Work.ratings_count)
+                .execution_options(synchronize_session=False)
+            )).one()
+            # неодобренная работа попадет в рейтинг при одобрении
+            if work.is_approved:
+                await update_ranking(session, work_id, rating_sum, ratings_count, work.genre, work.theme)
+
             # уведомление автора
-            author = session.query(User).filter_by(id=work.author_id).first()
-            if author:
+            if work.author:
                 notification = (
                     f"📊 Ваша работа '{work.title}' получила новую оценку: {rating}⭐\n"
-                    f"Текущий рейтинг: {work.rating}⭐ ({work.ratings_count} оценок)"
+                    f"Текущий рейтинг: {new_rating:.2f}⭐ ({ratings_count} оценок)"
                 )
                 if review_text:
                     notification += f"\nОтзыв: {review_text}"
-                try:
-                    await message.bot.send_message(author.user_id, notification)
-                except:
-                    pass
-        
-        await state.clear()
-        
-    finally:
-        session.close()
+                enqueue(session, work.author.user_id, notification)
+            await session.commit()
+
+    if work and user:
+        renders.bump(CATALOGUE, reviews_of(work_id))
+        wake()
+        response = f"Спасибо за вашу оценку! Текущий рейтинг работы: {new_rating:.2f}⭐ ({ratings_count} оценок)"
+        if review_text:
+            response += f"\nВаш отзыв сохранен: {review_text}"
+
+        await message.reply(response)
+
+    await state.clear()
+
+async def render_works_list(after: int = None, before: int = None):
+    """Страница /works_list: (текст, клавиатура) или (None, None), если работ нет"""
+    return await renders.get_or_render(
+        ('list', after, before), (CATALOGUE,), lambda: build_works_list(after, before)
+    )
+
+async def build_works_list(after: int = None, before: int = None):
+    async with Session() as session:
+        rows, has_prev, has_next = await keyset_page(
+            session,
+            select(Work.id, Work.title, Work.rating, Work.ratings_count).where(Work.is_approved == True),
+            Work.id, after=after, before=before,
+        )
+    if not rows:
+        return None, None
+
+    text = "📚 Список доступных работ:\n\n"
+    for row in rows:
+        rating_display = f"⭐{row.rating:.1f}" if row.ratings_count > 0 else "Нет оценок"
+        text += f"ID: {row.id} - {row.title} ({rating_display}, {row.ratings_count} оценок)\n"
+
+    text += "\nДля чтения конкретной работы используйте команду /read_work <id работы>"
+    return text, pager_keyboard('list', rows[0].id, rows[-1].id, has_prev, has_next)
 
 async def works_list(message: types.Message):
-    session = Session()
-    try:
-        works = session.query(Work).filter_by(is_approved=True).all()
-        if not works:
-            await message.reply("Нет доступных работ для чтения.")
+    text, keyboard = await render_works_list()
+    if text is None:
+        await message.reply("Нет доступных работ для чтения.")
+        return
+    await message.answer(text, reply_markup=keyboard)
+
+async def works_list_page(callback: types.CallbackQuery):
+    text, keyboard = await render_works_list(**parse_page_callback(callback.data))
+    await show_page(callback, text, keyboard)
+
+async def render_search(query: str, page: int = 0):
+    """Страница результатов /search (HTML): (текст, клавиатура) или (None, None)"""
+    async with Session() as session:
+        hits, has_next = await search_works(session, query, page)
+    if not hits:
+        return None, None
+
+    text = f"🔎 Результаты поиска «{html.escape(query)}»:\n\n"
+    for hit in hits:
+        text += f"ID: {hit.id} - <b>{html.escape(hit.title)}</b>\n"
+        snippet = hit.snippet_html()
+        if snippet:
+            text += f"{snippet}\n"
+        text += "\n"
+    text += "Для чтения используйте команду /read_work <id работы>"
+    # ключ в кнопках - номер страницы, на которую она ведет
+    return text, pager_keyboard(f'search_{filter_token(query)}', page - 1, page + 1, page > 0, has_next)
+
+async def search(message: types.Message, state: FSMContext):
+    query = message.text.partition(' ')[2].strip()
+    if not query:
+        await message.reply("Используйте формат: /search <слова для поиска>")
+        return
+
+    text, keyboard = await render_search(query)
+    if text is None:
+        await message.reply("По вашему запросу ничего не найдено.")
+        return
+    await remember_filter(state, 'search_queries', query)
+    await message.answer(text, reply_markup=keyboard, parse_mode='HTML')
+
+async def search_page(callback: types.CallbackQuery, state: FSMContext):
+    """'search_<токен запроса>_<prev|next>_<страница>'"""
+    query = await recall_filter(state, 'search_queries', callback.data)
+    if query is None:
+        await callback.answer("Поиск устарел, повторите /search.", show_alert=True)
+        return
+    text, keyboard = await render_search(query, parse_page_number(callback.data))
+    await show_page(callback, text, keyboard, parse_mode='HTML')
+
+async def top(message: types.Message):
+    """/top, /top genre <жанр>, /top theme <тема>"""
+    parts = message.text.split(maxsplit=2)
+    filters = {}
+    if len(parts) > 1:
+        if len(parts) < 3 or parts[1] not in ('genre', 'theme'):
+            await message.reply("Используйте формат: /top, /top genre <жанр> или /top theme <тема>")
             return
-        
-        text = "📚 Список доступных работ:\n\n"
-        for work in works:
-            rating_display = f"⭐{work.rating:.1f}" if work.ratings_count > 0 else "Нет оценок"
-            text += f"ID: {work.id} - {work.title} ({rating_display}, {work.ratings_count} оценок)\n"
-        
-        text += "\nДля чтения конкретной работы используйте команду /read_work <id работы>"
-        await message.answer(text)
-        
+        filters[parts[1]] = parts[2]
+
+    async with Session() as session:
+        rows = await top_works(session, **filters)
+    if not rows:
+        await message.reply("Пока нет работ для рейтинга.")
+        return
+
+    category = {'genre': "жанра «{}»", 'theme': "темы «{}»"}
+    title = "🏆 Лучшие работы"
+    for key, value in filters.items():
+        title += " " + category[key].format(value)
+    text = title + ":\n\n"
+    for place, row in enumerate(rows, 1):
+        rating_display = f"⭐{row.rating:.1f}" if row.ratings_count > 0 else "Нет оценок"
+        text += f"{place}. ID: {row.id} - {row.title} ({rating_display}, {row.ratings_count} оценок)\n"
+    text += "\nДля чтения используйте команду /read_work <id работы>"
+    await message.answer(text)
+
+# разметка, начатая другим обработчиком: work_id -> Lock
+_page_builds: dict[int, asyncio.Lock] = {}
+
+async def build_missing_pages(session, work_id: int) -> int:
+    """Запасной путь для работ без разметки (страницы строятся при одобрении и миграцией)"""
+    logger.warning(f"Work {work_id} has no pages, building them on read")
+    lock = _page_builds.setdefault(work_id, asyncio.Lock())
+    try:
+        async with lock:
+            # пока ждали, разметку мог закончить другой читатель
+            pages_count = await session.scalar(select(Work.pages_count).filter_by(id=work_id))
+            if pages_count is None:
+                pages_count = await build_pages(session, work_id)
+                await session.commit()
+            return pages_count
     finally:
-        session.close()
+        if not lock.locked():
+            _page_builds.pop(work_id, None)
+
+async def render_work_page(bot: Bot, work_id: int, page: int = 0):
+    """Страница текста работы: (текст, клавиатура) или (None, None), если страницы нет"""
+    async with Session() as session:
+        # работа вместе с автором одним запросом
+        work = await session.scalar(
+            select(Work).options(joinedload(Work.author)).filter_by(id=work_id, is_approved=True)
+        )
+        if not work:
+            return None, None
+        pages_count = work.pages_count
+        if pages_count is None:
+            pages_count = await build_missing_pages(session, work_id)
+        if not 0 <= page < pages_count:
+            return None, None
+        content = await read_page(session, work_id, page)
+
+    author_mention = (await profiles.mentions(bot, [work.author.user_id]))[work.author.user_id]
+
+    title = truncate_utf16(work.title, MAX_TITLE_DISPLAY)
+    text = (
+        f"📖 {title}\n"
+        f"✍️ Автор: {author_mention}\n"
+        f"⭐ Рейтинг: {work.rating:.1f} ({work.ratings_count} оценок)\n"
+        f"➖➖➖➖➖➖➖➖➖➖\n\n"
+        f"{content.strip()}\n\n"
+        f"📄 Страница {page + 1} из {pages_count}"
+    )
+    # ключ в кнопках - номер страницы, на которую она ведет
+    return text, pager_keyboard(f'page_{work_id}', page - 1, page + 1, page > 0, page + 1 < pages_count)
 
 async def read_work(message: types.Message):
     try:
@@ -158,55 +360,33 @@ async def read_work(message: types.Message):
     except (IndexError, ValueError):
         await message.reply("Используйте формат: /read_work <id работы>")
         return
-    
-    session = Session()
-    try:
-        work = session.query(Work).filter_by(id=work_id, is_approved=True).first()
-        if not work:
-            await message.reply("Работа не найдена или не одобрена модератором.")
-            return
-            
-        # инфа об авторе
-        author = session.query(User).filter_by(id=work.author_id).first()
-        try:
-            author_info = await message.bot.get_chat(author.user_id)
-            author_mention = f"@{author_info.username}" if author_info.username else f"id{author.user_id}"
-        except:
-            author_mention = f"id{author.user_id}"
-            
-        header = (
-            f"📖 {work.title}\n"
-            f"✍️ Автор: {author_mention}\n"
-            f"⭐ Рейтинг: {work.rating:.1f} ({work.ratings_count} оценок)\n"
-            f"➖➖➖➖➖➖➖➖➖➖\n\n"
-        )
-        
-        full_text = header + work.content
-        
-        # разбитие сообщения на части
-        for part in split_text(full_text):
-            await message.answer(part)
-        
+
+    text, keyboard = await render_work_page(message.bot, work_id)
+    if text is None:
+        await message.reply("Работа не найдена или не одобрена модератором.")
+        return
+    await message.answer(text, reply_markup=keyboard)
+
+    async with Session() as session:
         # проверка на оценку пользователем
-        user = session.query(User).filter_by(user_id=message.from_user.id).first()
-        existing_review = session.query(Review).filter_by(
-            work_id=work_id,
-            user_id=user.id
-        ).first()
-        
-        buttons = []
-        if not existing_review:
-            buttons.append([types.InlineKeyboardButton(text="Оценить работу", callback_data=f"start_rate_{work_id}")])
-        buttons.append([types.InlineKeyboardButton(text="Посмотреть отзывы", callback_data=f"reviews_{work_id}")])
-        
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=buttons)
-        await message.answer(
-            "Выберите действие:" if not existing_review else "Вы уже оценили эту работу. Можете посмотреть отзывы:",
-            reply_markup=keyboard
-        )
-        
-    finally:
-        session.close()
+        existing_review = await has_rated(session, work_id, message.from_user.id)
+
+    buttons = []
+    if not existing_review:
+        buttons.append([types.InlineKeyboardButton(text="Оценить работу", callback_data=f"start_rate_{work_id}")])
+    buttons.append([types.InlineKeyboardButton(text="Посмотреть отзывы", callback_data=f"reviews_{work_id}")])
+
+    keyboard = types.InlineKeyboardMarkup(inline_keyboard=buttons)
+    await message.answer(
+        "Выберите действие:" if not existing_review else "Вы уже оценили эту работу. Можете посмотреть отзывы:",
+        reply_markup=keyboard
+    )
+
+async def read_work_page(callback: types.CallbackQuery):
+    """Листание текста работы: 'page_<id работы>_<prev|next>_<страница>'"""
+    work_id = int(callback.data.split('_')[1])
+    text, keyboard = await render_work_page(callback.bot, work_id, parse_page_number(callback.data))
+    await show_page(callback, text, keyboard)
 
 async def start_rating(callback: types.CallbackQuery):
     try:
@@ -214,37 +394,29 @@ async def start_rating(callback: types.CallbackQuery):
         if len(parts) != 3:  # проверяем что формат "start_rate_ID"
             await callback.answer("Неверный формат данных", show_alert=True)
             return
-            
+
         work_id = int(parts[2])  # берем ID из третьей части
-        
-        session = Session()
-        try:
+
+        async with Session() as session:
             # Проверяем, не оценивал ли пользователь уже эту работу
-            user = session.query(User).filter_by(user_id=callback.from_user.id).first()
-            existing_review = session.query(Review).filter_by(
-                work_id=work_id,
-                user_id=user.id
-            ).first()
-            
-            if existing_review:
-                await callback.message.answer("Вы уже оценивали эту работу!")
-                await callback.answer()
-                return
-            
-            buttons = [
-                [types.InlineKeyboardButton(text="⭐", callback_data=f"rate_1_{work_id}"),
-                 types.InlineKeyboardButton(text="⭐⭐", callback_data=f"rate_2_{work_id}"),
-                 types.InlineKeyboardButton(text="⭐⭐⭐", callback_data=f"rate_3_{work_id}"),
-                 types.InlineKeyboardButton(text="⭐⭐⭐⭐", callback_data=f"rate_4_{work_id}"),
-                 types.InlineKeyboardButton(text="⭐⭐⭐⭐⭐", callback_data=f"rate_5_{work_id}")]
-            ]
-            keyboard = types.InlineKeyboardMarkup(inline_keyboard=buttons)
-            await callback.message.answer("Выберите оценку:", reply_markup=keyboard)
+            existing_review = await has_rated(session, work_id, callback.from_user.id)
+
+        if existing_review:
+            await callback.message.answer("Вы уже оценивали эту работу!")
             await callback.answer()
-            
-        finally:
-            session.close()
-            
+            return
+
+        buttons = [
+            [types.InlineKeyboardButton(text="⭐", callback_data=f"rate_1_{work_id}"),
+             types.InlineKeyboardButton(text="⭐⭐", callback_data=f"rate_2_{work_id}"),
+             types.InlineKeyboardButton(text="⭐⭐⭐", callback_data=f"rate_3_{work_id}"),
+             types.InlineKeyboardButton(text="⭐⭐⭐⭐", callback_data=f"rate_4_{work_id}"),
+             types.InlineKeyboardButton(text="⭐⭐⭐⭐⭐", callback_data=f"rate_5_{work_id}")]
+        ]
+        keyboard = types.InlineKeyboardMarkup(inline_keyboard=buttons)
+        await callback.message.answer("Выберите оценку:", reply_markup=keyboard)
+        await callback.answer()
+
     except ValueError:
         await callback.answer("Ошибка при обработке ID работы", show_alert=True)
         return
@@ -253,57 +425,87 @@ async def process_rating(callback: types.CallbackQuery, state: FSMContext):
     parts = callback.data.split('_')
     rating = int(parts[1])
     work_id = int(parts[2])
-    
-    session = Session()
-    try:
+
+    async with Session() as session:
         # Проверяем, не оценивал ли пользователь уже эту работу
-        user = session.query(User).filter_by(user_id=callback.from_user.id).first()
-        existing_review = session.query(Review).filter_by(
-            work_id=work_id,
-            user_id=user.id
-        ).first()
-        
-        if existing_review:
-            await callback.message.answer("Вы уже оценивали эту работу!")
-            await callback.answer()
-            return
-        
-        await state.update_data(rating=rating, work_id=work_id)
-        await callback.message.answer("Напишите свой отзыв о работе (или отправьте 'пропустить'):")
-        await state.set_state(RatingStates.waiting_for_review)
+        existing_review = await has_rated(session, work_id, callback.from_user.id)
+
+    if existing_review:
+        await callback.message.answer("Вы уже оценивали эту работу!")
         await callback.answer()
-        
-    finally:
-        session.close()
+        return
+
+    await state.update_data(rating=rating, work_id=work_id)
+    await callback.message.answer("Напишите свой отзыв о работе (или отправьте 'пропустить'):")
+    await state.set_state(RatingStates.waiting_for_review)
+    await callback.answer()
+
+async def reviews_page(work_id: int, after: int = None, before: int = None):
+    """Сводка и страница отзывов: (работа, rows, has_prev, has_next); кэшируются до новой оценки"""
+    async def query():
+        async with Session() as session:
+            # сводка читается из одной строки works, без агрегации по reviews
+            work = (await session.execute(
+                select(Work.title, Work.rating, Work.ratings_count, *STARS_COLUMNS)
+                .where(Work.id == work_id, Work.is_approved == True)
+            )).first()
+            if work is None:
+                return None, [], False, False
+            rows, has_prev, has_next = await keyset_page(
+                session,
+                select(Review.id, User.user_id, Review.rating, Review.created_at, Review.review_text)
+                .join(User, Review.user_id == User.id)
+                .where(Review.work_id == work_id, Review.review_text.is_not(None)),
+                Review.id, after=after, before=before, limit=REVIEWS_PAGE_SIZE, descending=True,
+            )
+            return work, rows, has_prev, has_next
+
+    return await renders.get_or_render(('reviews', work_id, after, before), (reviews_of(work_id),), query)
+
+def rating_summary(work) -> str:
+    """Средняя оценка и гистограмма 1-5 звезд"""
+    counts = [getattr(work, f'stars_{stars}') for stars in range(1, 6)]
+    widest = max(counts) or 1
+    text = f"⭐ {work.rating:.1f} ({work.ratings_count} оценок)\n"
+    for stars in range(5, 0, -1):
+        count = counts[stars - 1]
+        text += f"{stars}★ {'▇' * round(10 * count / widest) or '▏'} {count}\n"
+    return text
+
+async def render_reviews(bot: Bot, work_id: int, after: int = None, before: int = None):
+    """Страница отзывов: (текст, клавиатура) или (None, None), если работы нет"""
+    work, rows, has_prev, has_next = await reviews_page(work_id, after, before)
+    if work is None:
+        return None, None
+
+    text = f"📝 Отзывы к работе «{truncate_utf16(work.title, MAX_TITLE_DISPLAY)}»\n\n{rating_summary(work)}\n"
+    if not rows:
+        text += "К этой работе пока нет отзывов."
+        return text, None
+
+    # упоминания одним запросом на страницу, а не по одному на отзыв
+    mentions = await profiles.mentions(bot, [row.user_id for row in rows])
+    for row in rows:
+        # лимит в единицах UTF-16: пять отзывов из эмодзи должны уместиться в сообщение
+        review_text = truncate_utf16(row.review_text, REVIEW_TEXT_DISPLAY)
+        text += (f"От: {mentions[row.user_id]}\n"
+                 f"Оценка: {'⭐' * row.rating}\n"
+                 f"Дата: {row.created_at}\n"
+                 f"Отзыв: {review_text}\n\n")
+    return text, pager_keyboard(f'reviews_{work_id}', rows[0].id, rows[-1].id, has_prev, has_next)
 
 async def show_reviews(callback: types.CallbackQuery):
-    work_id = int(callback.data.split('_')[1])
-    session = Session()
-    try:
-        reviews = session.query(Review).filter_by(work_id=work_id).all()
-        if not reviews:
-            await callback.message.answer("К этой работе пока нет отзывов.")
-            await callback.answer()
-            return
-        
-        text = "📝 Отзывы к работе:\n\n"
-        for review in reviews:
-            user = session.query(User).filter_by(id=review.user_id).first()
-            try:
-                user_info = await callback.bot.get_chat(user.user_id)
-                user_mention = f"@{user_info.username}" if user_info.username else f"id{user.user_id}"
-            except:
-                user_mention = f"id{user.user_id}"
-            
-            text += (f"От: {user_mention}\n"
-                    f"Оценка: {'⭐' * review.rating}\n"
-                    f"Дата: {review.created_at}\n"
-                    f"Отзыв: {review.review_text}\n\n")
-        
-        for part in split_text(text):
-            await callback.message.answer(part)
-        
-        await callback.answer()
-        
-    finally:
-        session.close()
\ No newline at end of file
+    """'reviews_<id работы>' - новое сообщение со сводкой, 'reviews_<id>_<prev|next>_<id отзыва>' - листание"""
+    parts = callback.data.split('_')
+    work_id = int(parts[1])
+    if len(parts) > 2:
+        text, keyboard = await render_reviews(callback.bot, work_id, **parse_page_callback(callback.data))
+        await show_page(callback, text, keyboard)
+        return
+
+    text, keyboard = await render_reviews(callback.bot, work_id)
+    if text is None:
+        await callback.answer("Работа не найдена.", show_alert=True)
+        return
+    await callback.message.answer(text, reply_markup=keyboard)
+    await callback.answer()
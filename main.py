@@ -1,12 +1,19 @@
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import Command
-from aiogram.fsm.storage.memory import MemoryStorage
 import asyncio
 import logging
 
-from core.config import API_TOKEN
-from core.database import Base, engine
+from core.config import API_TOKEN, WEBHOOK_URL, UPDATE_CONCURRENCY
+from core.migrations import init_db
+from core.ingest import purge_incomplete_uploads
 from core.commands import setup_commands
+from core.metrics import UpdateMetricsMiddleware, HandlerMetricsMiddleware, ApiMetricsMiddleware, start_metrics_server
+from core.middlewares import ProfileMiddleware, CommandSyncMiddleware
+from core.profiler import QueryProfilerMiddleware
+from core.outbox import OutboxWorker
+from core.storage import DatabaseStorage
+from core.sender import ThrottlingRequestMiddleware, outbound
+from core.webhook import run_webhook
 
 from handlers import admin, moderator, author, reader, common
 from states.states import AuthorStates, RatingStates
@@ -16,23 +23,37 @@ logging.basicConfig(level=logging.INFO)
 
 # Инициализация бота и диспетчера
 bot = Bot(token=API_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
-
-Base.metadata.create_all(engine)
+# все исходящие запросы идут через общую очередь с лимитами Telegram
+bot.session.middleware(ThrottlingRequestMiddleware(outbound))
+bot.session.middleware(ApiMetricsMiddleware())
+dp = Dispatcher(storage=DatabaseStorage())
 
 def register_handlers():
     """Регистрация всех обработчиков"""
 
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.update.outer_middleware(QueryProfilerMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    dp.message.outer_middleware(ProfileMiddleware())
+    dp.callback_query.outer_middleware(ProfileMiddleware())
+    dp.message.outer_middleware(CommandSyncMiddleware())
+    dp.callback_query.outer_middleware(CommandSyncMiddleware())
+
     dp.message.register(common.start_command, Command('start'))
     
     dp.message.register(admin.init_owner, Command('init_owner'))
     dp.message.register(admin.list_users, Command('users'))
+    dp.callback_query.register(admin.list_users_page, F.data.startswith('users_'))
     dp.message.register(admin.set_user_role, Command('setrole'))
+    dp.message.register(admin.set_roles, Command('setroles'))
+    dp.message.register(admin.show_stats, Command('stats'))
     
     dp.message.register(moderator.review_works, Command('review'))
     dp.message.register(moderator.delete_work, Command('delete_work'))
     dp.callback_query.register(moderator.approve_work, F.data.startswith('approve_'))
     dp.callback_query.register(moderator.reject_work, F.data.startswith('reject_'))
+    dp.callback_query.register(moderator.review_next, F.data.startswith('review_next_'))
     
     dp.message.register(author.submit_work, Command('submit_work'))
     dp.message.register(author.process_title, AuthorStates.waiting_for_title)
@@ -41,6 +62,12 @@ def register_handlers():
     dp.message.register(reader.works_list, Command('works_list'))
     dp.message.register(reader.read_work, Command('read_work'))
     dp.message.register(reader.read_works, Command('read'))
+    dp.message.register(reader.search, Command('search'))
+    dp.message.register(reader.top, Command('top'))
+    dp.callback_query.register(reader.works_list_page, F.data.startswith('list_'))
+    dp.callback_query.register(reader.read_works_page, F.data.startswith('read_'))
+    dp.callback_query.register(reader.read_work_page, F.data.startswith('page_'))
+    dp.callback_query.register(reader.search_page, F.data.startswith('search_'))
     dp.callback_query.register(reader.start_rating, F.data.startswith('start_rate_'))
     dp.callback_query.register(reader.process_rating, F.data.startswith('rate_'))
     dp.callback_query.register(reader.show_reviews, F.data.startswith('reviews_'))
@@ -50,14 +77,32 @@ async def main():
     """Главная функция запуска бота"""
     register_handlers()
     
+    await init_db()
+    await purge_incomplete_uploads()
     await setup_commands(bot)
-    
+
+    metrics_runner = await start_metrics_server()
+
+    # фоновая отправка уведомлений из outbox
+    outbox_worker = OutboxWorker(bot)
+    outbox_task = asyncio.create_task(outbox_worker.run())
+
     logging.info("Starting bot...")
     try:
-        await dp.start_polling(bot)
+        if WEBHOOK_URL:
+            await run_webhook(dp, bot)
+        else:
+            # getUpdates не работает, пока у бота установлен webhook
+            await bot.delete_webhook()
+            await dp.start_polling(bot, close_bot_session=False, tasks_concurrency_limit=UPDATE_CONCURRENCY)
     except Exception as e:
         logging.error(f"Error occurred: {e}")
     finally:
+        await outbox_worker.stop()
+        await outbox_task
+        await dp.storage.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         await bot.session.close()
 
 if __name__ == '__main__':
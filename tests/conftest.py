@@ -0,0 +1,43 @@
+import sys
+import os
+import asyncio
+
+import pytest
+from sqlalchemy.pool import NullPool
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import database
+from core.content import write_content
+from core.database import Session, Work
+from core.migrations import init_db
+from core.profiles import profiles
+from core.render_cache import renders
+
+
+def use_database(path):
+    """Создает базу по пути path и переключает на нее Session"""
+    # NullPool: каждый тест запускается в своем event loop через asyncio.run
+    engine = database.create_engine_from_url(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    database.Session.configure(bind=engine)
+    profiles._entries.clear()
+    renders.clear()
+    asyncio.run(init_db(engine))
+    return engine
+
+
+async def submit(work_id: int, title: str, content: str):
+    """Работа автора с id=1, ожидающая проверки"""
+    async with Session() as session:
+        session.add(Work(id=work_id, author_id=1, title=title, content_length=len(content), is_approved=False))
+        await session.flush()
+        await write_content(session, work_id, content)
+        await session.commit()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Отдельная база на тест"""
+    yield use_database(tmp_path / 'test.db')
+    database.Session.configure(bind=database.engine)
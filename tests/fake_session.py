@@ -0,0 +1,89 @@
+"""Подделки для тестов без сети.
+
+FakeSession - сессия бота: запросы записываются, ответы формируются локально.
+FakeMessage, FakeCallback и FakeState заменяют объекты aiogram при прямом
+вызове обработчиков.
+"""
+import time
+from types import SimpleNamespace
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage, EditMessageText, GetChat
+from aiogram.types import Chat, Message
+
+
+class FakeSession(BaseSession):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = []
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        if isinstance(method, (SendMessage, EditMessageText)):
+            self._message_id += 1
+            return Message(
+                message_id=self._message_id,
+                date=int(time.time()),
+                chat=Chat(id=method.chat_id or 0, type='private'),
+                text=method.text,
+            )
+        if isinstance(method, GetChat):
+            return SimpleNamespace(id=method.chat_id, username=f"user{method.chat_id}",
+                                   full_name=f"User {method.chat_id}")
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+    def sent_texts(self, chat_id=None):
+        return [
+            method.text for method in self.requests
+            if isinstance(method, SendMessage) and chat_id in (None, method.chat_id)
+        ]
+
+
+class FakeMessage:
+    def __init__(self, user_id: int, text: str = ""):
+        self.text = text
+        self.from_user = SimpleNamespace(id=user_id)
+        self.bot = SimpleNamespace(get_chat=self._get_chat)
+        self.sent = []
+
+    async def _get_chat(self, chat_id):
+        return SimpleNamespace(username=f"user{chat_id}", full_name=f"User {chat_id}")
+
+    async def answer(self, text, **kwargs):
+        self.sent.append(text)
+
+    reply = answer
+
+
+class FakeCallback(FakeMessage):
+    def __init__(self, user_id: int, data: str):
+        super().__init__(user_id)
+        self.data = data
+        self.message = self
+
+    async def answer(self, text=None, **kwargs):
+        if text is not None:
+            self.sent.append(text)
+
+
+class FakeState:
+    """Данные FSM в памяти"""
+
+    def __init__(self, **data):
+        self.data = data
+
+    async def update_data(self, **kwargs):
+        self.data.update(kwargs)
+
+    async def get_data(self):
+        return dict(self.data)
+
+    async def clear(self):
+        self.data = {}
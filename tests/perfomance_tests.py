@@ -1,161 +1,232 @@
+"""Нагрузочный тест бота целиком, без сети.
+
+Синтетические Update подаются в настоящий Dispatcher с обработчиками
+из main.register_handlers. Бот работает через FakeSession (запросы к API
+записываются, ответы формируются локально), база - отдельный файл SQLite,
+заполненный заданным числом пользователей, работ и отзывов.
+
+Каждый виртуальный пользователь выполняет шаги последовательно (как живой
+человек), пользователи работают параллельно. Отчет: пропускная способность
+и p50/p95/p99 задержки обработки по каждой команде и callback.
+
+Запуск: python tests/perfomance_tests.py --users 200 --works 1000 --steps 20
+"""
 import sys
 import os
+import argparse
 import asyncio
-import time
-from statistics import mean
-import psutil
 import logging
-from datetime import datetime
-import aiohttp
 import random
-from aiogram import Bot, types
-from aiogram.types import Message
+import tempfile
+import time
+from collections import Counter, defaultdict
+from statistics import quantiles, mean
 
-# Добавляем корневую директорию проекта в PYTHONPATH
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram import Bot
+from aiogram.types import Update
 
-from core.config import API_TOKEN
-from core.database import Session, User, Work, Review
+from core import database
+from core.content import build_pages, write_content
+from core.database import User, Work, Review, Profile
+from core.migrations import init_db
+from core.render_cache import renders
+from fake_session import FakeSession
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class BotLoadTest:
-    def __init__(self):
-        self.metrics = {
-            'requests_total': 0,
-            'requests_success': 0,
-            'requests_failed': 0,
-            'response_times': [],
-            'requests_per_minute': [],
-            'concurrent_users': set()
+CONTENT = "Текст произведения для нагрузочного теста. " * 200
+
+# (метка, вес) - доля действия в общем потоке
+ACTIONS = [
+    ('/start', 1),
+    ('/works_list', 3),
+    ('list_next', 2),
+    ('/read', 3),
+    ('read_next', 2),
+    ('/read_work', 4),
+    ('reviews', 2),
+    ('rating', 1),
+]
+
+_handlers_registered = False
+
+
+async def seed(users: int, works: int, reviews_per_work: int):
+    async with database.Session() as session:
+        session.add_all([
+            User(id=i, user_id=1000 + i, role='author' if i % 10 == 0 else 'reader')
+            for i in range(1, users + 1)
+        ])
+        session.add_all([
+            Profile(user_id=1000 + i, username=f"user{i}", full_name=f"User {i}", updated_at=time.time(),
+                    username_key=f"user{i}", name_key=f"user {i}")
+            for i in range(1, users + 1)
+        ])
+        authors = [i for i in range(1, users + 1) if i % 10 == 0] or [1]
+        for work_id in range(1, works + 1):
+            session.add(Work(id=work_id, author_id=authors[work_id % len(authors)], title=f"Работа {work_id}",
+                             content_length=len(CONTENT), is_approved=True,
+                             rating=4.0, rating_sum=4 * reviews_per_work, ratings_count=reviews_per_work,
+                             stars_4=reviews_per_work))
+        await session.flush()
+        for work_id in range(1, works + 1):
+            await write_content(session, work_id, CONTENT)
+            # как при одобрении: чтение не должно размечать страницы
+            await build_pages(session, work_id, CONTENT)
+            session.add_all([
+                Review(work_id=work_id, user_id=1 + (work_id + j) % users, rating=4,
+                       review_text=f"Отзыв {j}", created_at="2024-01-01 00:00:00")
+                for j in range(min(reviews_per_work, users))
+            ])
+        await session.commit()
+
+
+class LoadRunner:
+    def __init__(self, dp, bot: Bot, works: int):
+        self.dp = dp
+        self.bot = bot
+        self.works = works
+        self.update_id = 0
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+
+    def _message(self, user_id: int, text: str) -> dict:
+        self.update_id += 1
+        return {
+            'message_id': self.update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+            'text': text,
         }
-        self.test_commands = [
-            '/start',
-            '/works_list',
-            '/read',
-            '/read_work',
-            '/submit_work'
-        ]
-        self.test_messages = [
-            "Привет, бот!",
-            "Как дела?",
-            "Хочу почитать",
-            "Покажи мои работы",
-            "Помощь"
-        ]
-
-    async def simulate_message(self, user_id: int):
-        """Симуляция отправки сообщения боту"""
-        message_text = random.choice(self.test_messages + self.test_commands)
-        
-        # Создаем объект сообщения
-        message = types.Message(
-            message_id=random.randint(1, 1000),
-            date=datetime.now(),
-            chat=types.Chat(
-                id=user_id,
-                type='private'
-            ),
-            from_user=types.User(
-                id=user_id,
-                is_bot=False,
-                first_name=f"Test User {user_id}"
-            ),
-            text=message_text,
-            bot=Bot(token=API_TOKEN)
-        )
-
-        return message
-
-    async def simulate_user_interaction(self, user_id: int):
-        """Симуляция взаимодействия пользователя с ботом"""
-        start_time = time.time()
-        try:
-            # Создаем тестовое сообщение
-            message = await self.simulate_message(user_id)
-            logger.info(f"User {user_id} sends: {message.text}")
-
-            # Имитируем обработку сообщения ботом
-            await asyncio.sleep(random.uniform(0.1, 0.5))  # Имитация времени обработки
 
-            self.metrics['requests_success'] += 1
-            self.metrics['response_times'].append(time.time() - start_time)
-            self.metrics['concurrent_users'].add(user_id)
-            
+    async def feed(self, label: str, user_id: int, text: str = None, data: str = None):
+        """Обработка одного обновления с замером времени"""
+        if data is None:
+            payload = {'message': self._message(user_id, text)}
+        else:
+            payload = {'callback_query': {
+                'id': str(self.update_id),
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+                'chat_instance': str(user_id),
+                'message': self._message(user_id, "..."),
+                'data': data,
+            }}
+        update = Update.model_validate({'update_id': self.update_id, **payload}, context={'bot': self.bot})
+
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
         except Exception as e:
-            logger.error(f"Interaction error for user {user_id}: {e}")
-            self.metrics['requests_failed'] += 1
-
-    async def run_load_test(self, num_users: int = 10, duration: int = 60):
-        """Запуск нагрузочного тестирования"""
-        logger.info(f"Starting load test with {num_users} users for {duration} seconds")
-        
-        start_time = time.time()
-        minute_requests = 0
-        last_minute = start_time
-
-        # Создаем пул тестовых пользователей
-        test_users = list(range(1, num_users + 1))
-
-        while time.time() - start_time < duration:
-            # Выбираем случайное количество активных пользователей
-            active_users = random.randint(1, min(5, num_users))
-            selected_users = random.sample(test_users, active_users)
-            
-            # Создаем задачи для каждого активного пользователя
-            tasks = [self.simulate_user_interaction(user_id) for user_id in selected_users]
-            await asyncio.gather(*tasks)
-            
-            minute_requests += len(tasks)
-
-            # Подсчет запросов в минуту
-            current_time = time.time()
-            if current_time - last_minute >= 60:
-                self.metrics['requests_per_minute'].append(minute_requests)
-                logger.info(f"Requests in last minute: {minute_requests}")
-                minute_requests = 0
-                last_minute = current_time
-
-            # Пауза между батчами запросов
-            await asyncio.sleep(0.5)
-
-        # Формируем результаты
-        total_time = time.time() - start_time
-        total_requests = self.metrics['requests_success'] + self.metrics['requests_failed']
-        
-        results = {
-            'test_duration': f"{total_time:.2f} seconds",
-            'total_requests': total_requests,
-            'successful_requests': self.metrics['requests_success'],
-            'failed_requests': self.metrics['requests_failed'],
-            'concurrent_users_max': len(self.metrics['concurrent_users']),
-            'requests_per_minute_avg': (total_requests / (total_time / 60)),
-            'success_rate': (self.metrics['requests_success'] / total_requests * 100) if total_requests > 0 else 0,
-            'average_response_time': mean(self.metrics['response_times']) if self.metrics['response_times'] else 0
+            logger.warning(f"{label} failed for {user_id}: {e!r}")
+            self.errors[label] += 1
+        self.latencies[label].append(time.perf_counter() - started)
+
+    async def step(self, user_id: int, action: str):
+        work_id = random.randint(1, self.works)
+        if action == 'list_next':
+            await self.feed(action, user_id, data=f"list_next_{work_id}")
+        elif action == 'read_next':
+            await self.feed(action, user_id, data=f"read_next_{work_id}")
+        elif action == '/read_work':
+            await self.feed(action, user_id, text=f"/read_work {work_id}")
+        elif action == 'reviews':
+            await self.feed(action, user_id, data=f"reviews_{work_id}")
+        elif action == 'rating':
+            await self.feed('start_rate', user_id, data=f"start_rate_{work_id}")
+            await self.feed('rate', user_id, data=f"rate_{random.randint(1, 5)}_{work_id}")
+            await self.feed('review_text', user_id, text=random.choice(["Понравилось!", "пропустить"]))
+        else:
+            await self.feed(action, user_id, text=action)
+
+    async def user_session(self, user_id: int, steps: int):
+        labels, weights = zip(*ACTIONS)
+        for action in random.choices(labels, weights, k=steps):
+            await self.step(user_id, action)
+
+
+def percentile(values: list[float], p: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return quantiles(values, n=100, method='inclusive')[p - 1]
+
+
+def build_report(runner: LoadRunner, elapsed: float) -> dict:
+    rows = {
+        label: {
+            'count': len(values),
+            'errors': runner.errors[label],
+            'mean': mean(values),
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
         }
-
-        # Выводим подробный отчет
-        logger.info("\nLoad Test Results:")
-        for key, value in results.items():
-            if isinstance(value, float):
-                logger.info(f"{key}: {value:.2f}")
-            else:
-                logger.info(f"{key}: {value}")
-
-        return results
-
-async def run_tests():
-    """Запуск всех тестов"""
-    test = BotLoadTest()
+        for label, values in sorted(runner.latencies.items())
+    }
+    total = sum(row['count'] for row in rows.values())
+    return {
+        'updates': total,
+        'errors': sum(runner.errors.values()),
+        'elapsed': elapsed,
+        'throughput': total / elapsed if elapsed else 0.0,
+        'api_calls': Counter(type(method).__name__ for method in runner.bot.session.requests),
+        'handlers': rows,
+    }
+
+
+def print_report(report: dict):
+    print(f"\nОбновлений: {report['updates']}, ошибок: {report['errors']}, "
+          f"время: {report['elapsed']:.2f} с, пропускная способность: {report['throughput']:.1f} upd/s")
+    print(f"\n{'команда':<14}{'N':>7}{'ошибки':>8}{'mean,ms':>10}{'p50,ms':>10}{'p95,ms':>10}{'p99,ms':>10}")
+    for label, row in report['handlers'].items():
+        print(f"{label:<14}{row['count']:>7}{row['errors']:>8}{row['mean'] * 1000:>10.1f}"
+              f"{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}{row['p99'] * 1000:>10.1f}")
+    print("\nЗапросы к Telegram API:", dict(report['api_calls']))
+
+
+async def run_load(users: int = 50, works: int = 200, reviews_per_work: int = 5, steps: int = 10,
+                   db_path: str = None, seed_value: int = 0) -> dict:
+    global _handlers_registered
+    import main
+
+    random.seed(seed_value)
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'load.db')
+    engine = database.create_engine_from_url(f"sqlite+aiosqlite:///{db_path}")
+    database.Session.configure(bind=engine)
     try:
-        # Тест с разным количеством пользователей
-        for num_users in [5, 10, 20]:
-            logger.info(f"\nTesting with {num_users} users...")
-            results = await test.run_load_test(num_users=num_users, duration=30)
-            
-    except Exception as e:
-        logger.error(f"Test error: {e}")
-
-if __name__ == "__main__":
-    asyncio.run(run_tests())
+        await init_db(engine)
+        await seed(users, works, reviews_per_work)
+        renders.clear()
+
+        if not _handlers_registered:
+            main.register_handlers()
+            _handlers_registered = True
+        bot = Bot(token='42:TEST', session=FakeSession())
+        runner = LoadRunner(main.dp, bot, works)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(runner.user_session(1000 + i, steps) for i in range(1, users + 1)))
+        elapsed = time.perf_counter() - started
+
+        await main.dp.storage.close()
+        return build_report(runner, elapsed)
+    finally:
+        database.Session.configure(bind=database.engine)
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200, help="виртуальных пользователей (параллельно)")
+    parser.add_argument('--works', type=int, default=1000, help="работ в базе")
+    parser.add_argument('--reviews', type=int, default=5, help="отзывов на работу")
+    parser.add_argument('--steps', type=int, default=20, help="действий на пользователя")
+    parser.add_argument('--db', help="путь к файлу базы (по умолчанию временный)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    print_report(asyncio.run(run_load(args.users, args.works, args.reviews, args.steps, args.db)))
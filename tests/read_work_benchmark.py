@@ -0,0 +1,189 @@
+"""Замер: сколько одновременных /read_work обрабатывается до и после перевода БД на aiosqlite.
+
+"До" - исходный обработчик на синхронной сессии SQLAlchemy (воспроизведен ниже),
+"после" - текущий handlers.reader.read_work на AsyncSession.
+Параллельно работает писатель, который периодически держит эксклюзивную
+блокировку базы (как долгий commit), и задача-пульс, измеряющая задержку event loop.
+
+Запуск: python tests/read_work_benchmark.py
+"""
+import sys
+import os
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from statistics import mean
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.content import split_chunks
+from core.config import READ_PAGE_LENGTH
+from core.database import Base, Session, User, Work, WorkChunk, WorkPage, Review
+from core.utils import page_bounds, split_text
+from handlers import reader
+
+WORKS = 50
+CONTENT = "Текст произведения. " * 500
+API_LATENCY = 0.05      # имитация сетевого вызова Telegram API
+LOCK_HOLD = 0.3         # сколько писатель держит блокировку
+LOCK_PERIOD = 1.0       # как часто писатель берет блокировку
+SLO = 2.0               # обновление считается обработанным, если уложилось в SLO
+
+
+class FakeBot:
+    async def get_chat(self, chat_id):
+        await asyncio.sleep(API_LATENCY)
+        return SimpleNamespace(username=f"user{chat_id}", full_name=f"User {chat_id}")
+
+
+class FakeMessage:
+    def __init__(self, user_id: int, work_id: int, bot: FakeBot):
+        self.text = f"/read_work {work_id}"
+        self.from_user = SimpleNamespace(id=user_id)
+        self.bot = bot
+
+    async def answer(self, text, **kwargs):
+        await asyncio.sleep(API_LATENCY)
+
+    async def reply(self, text, **kwargs):
+        await asyncio.sleep(API_LATENCY)
+
+
+def seed(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    pages = page_bounds(CONTENT, READ_PAGE_LENGTH)
+    with sessionmaker(bind=engine)() as session:
+        session.add_all([User(id=i, user_id=1000 + i, role='reader') for i in range(1, WORKS + 1)])
+        session.add_all([
+            Work(id=i, author_id=i, title=f"Работа {i}", content_length=len(CONTENT), is_approved=True,
+                 pages_count=len(pages))
+            for i in range(1, WORKS + 1)
+        ])
+        session.add_all([
+            WorkChunk(work_id=i, seq=seq, data=data)
+            for i in range(1, WORKS + 1) for seq, data in split_chunks(CONTENT)
+        ])
+        # страницы размечаются при одобрении - замер не должен включать разметку
+        session.add_all([
+            WorkPage(work_id=i, page=page, start_offset=start, end_offset=end)
+            for i in range(1, WORKS + 1) for page, (start, end) in enumerate(pages)
+        ])
+        session.commit()
+    engine.dispose()
+
+
+def make_sync_read_work(path: str):
+    """Исходный read_work: синхронные запросы прямо в event loop.
+
+    Сессия удерживает соединение на время сетевых вызовов, поэтому при числе
+    одновременных обновлений больше размера пула (5 + 10) checkout блокирует
+    event loop до pool_timeout - такие обновления считаются неуспешными.
+    """
+    SyncSession = sessionmaker(bind=create_engine(f"sqlite:///{path}", pool_timeout=0.5))
+
+    async def read_work(message):
+        work_id = int(message.text.split()[1])
+        session = SyncSession()
+        try:
+            work = session.query(Work).filter_by(id=work_id, is_approved=True).first()
+            author = session.query(User).filter_by(id=work.author_id).first()
+            author_info = await message.bot.get_chat(author.user_id)
+            header = f"📖 {work.title}\n✍️ Автор: @{author_info.username}\n\n"
+            content = ''.join(
+                zlib.decompress(chunk.data).decode('utf-8')
+                for chunk in session.query(WorkChunk).filter_by(work_id=work_id).order_by(WorkChunk.seq)
+            )
+            for part in split_text(header + content):
+                await message.answer(part)
+            user = session.query(User).filter_by(user_id=message.from_user.id).first()
+            session.query(Review).filter_by(work_id=work_id, user_id=user.id).first()
+            await message.answer("Выберите действие:")
+        finally:
+            session.close()
+
+    return read_work
+
+
+def lock_writer(path: str, stop: threading.Event):
+    """Писатель в отдельном потоке периодически держит эксклюзивную блокировку"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    while not stop.is_set():
+        conn.execute("BEGIN EXCLUSIVE")
+        time.sleep(LOCK_HOLD)
+        conn.execute("COMMIT")
+        stop.wait(LOCK_PERIOD - LOCK_HOLD)
+    conn.close()
+
+
+async def heartbeat(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+async def run(handler, concurrency: int, path: str):
+    bot = FakeBot()
+    lags = []
+    stop_beat = asyncio.Event()
+    stop_writer = threading.Event()
+    writer = threading.Thread(target=lock_writer, args=(path, stop_writer))
+    writer.start()
+    beat = asyncio.create_task(heartbeat(lags, stop_beat))
+
+    async def one(i):
+        started = time.perf_counter()
+        try:
+            await handler(FakeMessage(1000 + (i % WORKS) + 1, (i % WORKS) + 1, bot))
+        except Exception:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stop_beat.set()
+    await beat
+    stop_writer.set()
+    await asyncio.to_thread(writer.join)
+    latencies = sorted(lat for lat in results if lat is not None)
+    return {
+        'elapsed': elapsed,
+        'p95': latencies[max(int(len(latencies) * 0.95) - 1, 0)] if latencies else float('nan'),
+        'within_slo': sum(1 for lat in latencies if lat <= SLO),
+        'failed': len(results) - len(latencies),
+        'max_loop_lag': max(lags) if lags else 0.0,
+        'avg_loop_lag': mean(lags) if lags else 0.0,
+    }
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path)
+        sync_read_work = make_sync_read_work(path)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        Session.configure(bind=async_engine)
+
+        print(f"{'mode':<6} {'N':>5} {'elapsed,s':>10} {'p95,s':>7} {'<=SLO':>6} {'failed':>6} {'max lag,s':>10}")
+        for concurrency in (10, 15, 20, 50, 100, 200):
+            for mode, handler in (('sync', sync_read_work), ('async', reader.read_work)):
+                result = await run(handler, concurrency, path)
+                print(f"{mode:<6} {concurrency:>5} {result['elapsed']:>10.2f} {result['p95']:>7.2f} "
+                      f"{result['within_slo']:>6} {result['failed']:>6} {result['max_loop_lag']:>10.3f}")
+
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""Замер /search на синтетическом корпусе (по умолчанию 100 000 работ).
+
+Сравниваются:
+- FTS5: core.search.search_works (bm25 + snippet, первая страница);
+- полный перебор: распаковка всех фрагментов и поиск подстроки - то, что
+  пришлось бы делать LIKE '%...%' по тексту работ (совпадения внутри слов
+  тоже считаются, поэтому их больше, чем у FTS5);
+- LIKE по названию (запасной вариант для СУБД без FTS5).
+
+Запуск: python tests/search_benchmark.py [--works 100000] [--words 80]
+"""
+import sys
+import os
+import argparse
+import asyncio
+import logging
+import random
+import sqlite3
+import tempfile
+import time
+import zlib
+from statistics import median
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from core import database
+from core.database import Work
+from core.migrations import init_db
+from core.search import search_works
+
+SYLLABLES = ['ка', 'ро', 'ми', 'ла', 'то', 'не', 'ва', 'зо', 'ри', 'лу', 'пе', 'ся', 'да', 'ко', 'шу', 'гра']
+QUERIES = ['ракото', 'милане', 'зори', 'лупе вада', 'ко']
+REPEATS = 5
+
+
+def make_vocabulary(size: int = 5000) -> list[str]:
+    rng = random.Random(1)
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(path: str, works: int, words_per_work: int):
+    """Массовая вставка напрямую через sqlite3 - быстрее ORM на 100k строк"""
+    rng = random.Random(2)
+    vocabulary = make_vocabulary()
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users (id, user_id, role) VALUES (1, 1, 'author')")
+    batch = 5000
+    for start in range(1, works + 1, batch):
+        rows = []
+        for work_id in range(start, min(start + batch, works + 1)):
+            title = ' '.join(rng.choices(vocabulary, k=3)).capitalize()
+            content = ' '.join(rng.choices(vocabulary, k=words_per_work)) + '.'
+            rows.append((work_id, title, content))
+        conn.executemany(
+            "INSERT INTO works (id, author_id, title, content_length, is_approved, rating, ratings_count) "
+            "VALUES (?, 1, ?, ?, 1, 0, 0)",
+            [(work_id, title, len(content)) for work_id, title, content in rows],
+        )
+        conn.executemany(
+            "INSERT INTO work_chunks (work_id, seq, data) VALUES (?, 0, ?)",
+            [(work_id, zlib.compress(content.encode('utf-8'))) for work_id, _, content in rows],
+        )
+        conn.executemany("INSERT INTO works_fts (rowid, title, content) VALUES (?, ?, ?)", rows)
+        conn.commit()
+    conn.close()
+
+
+def full_scan(path: str, query: str) -> int:
+    conn = sqlite3.connect(path)
+    found = 0
+    for (data,) in conn.execute("SELECT data FROM work_chunks"):
+        if query in zlib.decompress(data).decode('utf-8'):
+            found += 1
+    conn.close()
+    return found
+
+
+async def title_like(query: str) -> int:
+    async with database.Session() as session:
+        rows = (await session.execute(
+            select(Work.id).where(Work.is_approved == True, Work.title.ilike(f"%{query}%"))
+            .order_by(Work.id).limit(11)
+        )).all()
+    return len(rows)
+
+
+async def fts(query: str) -> int:
+    async with database.Session() as session:
+        hits, _ = await search_works(session, query)
+    return len(hits)
+
+
+async def timed(func, *args) -> tuple[float, int]:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = func(*args)
+        if asyncio.iscoroutine(result):
+            result = await result
+        timings.append(time.perf_counter() - started)
+    return median(timings), result
+
+
+async def run(works: int, words_per_work: int):
+    path = os.path.join(tempfile.mkdtemp(), 'search.db')
+    engine = database.create_engine_from_url(f"sqlite+aiosqlite:///{path}")
+    database.Session.configure(bind=engine)
+    await init_db(engine)
+
+    started = time.perf_counter()
+    seed(path, works, words_per_work)
+    print(f"Корпус: {works} работ по {words_per_work} слов, заполнение {time.perf_counter() - started:.1f} с, "
+          f"файл {os.path.getsize(path) / 2 ** 20:.0f} МБ\n")
+
+    print(f"{'запрос':<14}{'FTS5, мс':>12}{'найдено':>9}{'LIKE title, мс':>16}{'перебор, мс':>14}{'совпадений':>12}")
+    for query in QUERIES:
+        fts_time, fts_found = await timed(fts, query)
+        like_time, _ = await timed(title_like, query)
+        scan_time, scan_found = await timed(full_scan, path, query)
+        print(f"{query:<14}{fts_time * 1000:>12.1f}{fts_found:>9}{like_time * 1000:>16.1f}"
+              f"{scan_time * 1000:>14.1f}{scan_found:>12}")
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--works', type=int, default=100_000)
+    parser.add_argument('--words', type=int, default=80, help="слов в тексте работы")
+    args = parser.parse_args()
+    # без отчетов профилировщика о медленных запросах - их и меряем
+    logging.getLogger('core.profiler').setLevel(logging.ERROR)
+    asyncio.run(run(args.works, args.words))
@@ -0,0 +1,72 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.methods import SetMyCommands
+from sqlalchemy import func, select
+
+from core import commands
+from core.database import OutboxMessage, Profile, Session, User
+from core.roles import parse_assignments
+from fake_session import FakeMessage, FakeSession
+from handlers import admin
+
+
+def test_assignments_are_parsed_from_text_and_csv():
+    assignments, errors = parse_assignments([
+        "user_id,role",
+        "101,author",
+        "@Reader1; reader",
+        "banned 102 103 @spam",
+        "автор 104",
+        "",
+        "# комментарий",
+        "105",
+        "owner 106",
+        "xyz moderator",
+        "99999999999999999999 author",
+    ])
+
+    assert assignments == {101: 'author', 'reader1': 'reader', 102: 'banned', 103: 'banned',
+                           'spam': 'banned', 104: 'author'}
+    assert len(errors) == 4
+    assert errors[0].startswith("строка 8")
+    assert errors[-1] == "строка 11: неверный пользователь «99999999999999999999»"
+
+
+def test_roles_are_applied_in_one_transaction(db, monkeypatch):
+    # без паузы между обновлениями меню
+    monkeypatch.setattr(admin, 'schedule_sync', lambda bot, user_ids: commands.schedule_sync(bot, user_ids, 10 ** 6))
+
+    async def scenario():
+        async with Session() as session:
+            session.add(User(user_id=1, role='owner'))
+            session.add_all([User(user_id=2000 + i, role='reader') for i in range(1, 601)])
+            session.add(Profile(user_id=2001, username="Writer", username_key="writer"))
+            await session.commit()
+
+        ids = " ".join(str(2000 + i) for i in range(1, 601))
+        message = FakeMessage(1, f"/setroles\nauthor {ids} 9999\n@writer moderator\n"
+                                 f"2002 reader\n1 banned\n@ghost banned")
+        message.bot = Bot(token='42:TEST', session=FakeSession())
+        message.document = None
+        commands._synced.clear()
+        await admin.set_roles(message)
+        await asyncio.gather(*commands._background)
+
+        async with Session() as session:
+            roles = dict((await session.execute(select(User.role, func.count()).group_by(User.role))).all())
+            outbox = await session.scalar(select(func.count()).select_from(OutboxMessage))
+        menus = [method for method in message.bot.session.requests if isinstance(method, SetMyCommands)]
+        return message.sent, roles, outbox, len(menus)
+
+    sent, roles, outbox, menus = asyncio.run(scenario())
+    # 2001 - модератор, 2002 остался читателем, 9999 - новый автор, владелец не тронут
+    assert roles == {'owner': 1, 'author': 599, 'moderator': 1, 'reader': 1}
+    assert outbox == 600
+    assert menus == 600
+    summary = sent[0]
+    assert "Роли изменены: 600" in summary
+    assert "Новых пользователей: 1" in summary
+    assert "Без изменений: 1" in summary
+    assert "Пропущены владельцы: 1" in summary
+    assert "@ghost: пользователь не найден" in summary
@@ -0,0 +1,61 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.methods import SetMyCommands
+from sqlalchemy import update
+
+from core import commands
+from core.commands import setup_commands, sync_commands, sync_commands_once
+from core.database import Session, User
+from fake_session import FakeSession
+
+
+def command_calls(bot):
+    return [method for method in bot.session.requests if isinstance(method, SetMyCommands)]
+
+
+def test_startup_sets_only_default_scope(db):
+    async def scenario():
+        async with Session() as session:
+            session.add_all([User(user_id=1000 + i, role='author') for i in range(50)])
+            await session.commit()
+        bot = Bot(token='42:TEST', session=FakeSession())
+        await setup_commands(bot)
+        return command_calls(bot)
+
+    calls = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert calls[0].scope is None
+
+
+def test_commands_are_pushed_once_per_change(db):
+    async def scenario():
+        async with Session() as session:
+            session.add_all([User(user_id=1, role='author'), User(user_id=2, role='reader')])
+            await session.commit()
+        bot = Bot(token='42:TEST', session=FakeSession())
+        commands._synced.clear()
+
+        await sync_commands_once(bot, 1)
+        await sync_commands_once(bot, 1)
+        await sync_commands_once(bot, 2)
+        first_start = len(command_calls(bot))
+
+        # перезапуск: хэш в базе совпадает, запроса нет
+        commands._synced.clear()
+        await sync_commands_once(bot, 1)
+        restarted = len(command_calls(bot))
+
+        async with Session() as session:
+            await session.execute(update(User).filter_by(user_id=1).values(role='moderator'))
+            await session.commit()
+        await sync_commands(bot, 1)
+        return first_start, restarted, command_calls(bot)
+
+    first_start, restarted, calls = asyncio.run(scenario())
+    # читателю со старым меню в чате новое отправляется один раз
+    assert first_start == 2
+    assert restarted == 2
+    assert len(calls) == 3
+    assert calls[-1].scope.chat_id == 1
+    assert 'review' in [command.command for command in calls[-1].commands]
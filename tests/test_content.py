@@ -0,0 +1,45 @@
+import asyncio
+
+from sqlalchemy import select
+
+from core.content import write_content, read_content, read_previews, delete_content
+from core.database import Session, Work, WorkChunk
+from core.utils import page_bounds, utf16_length
+
+TEXT = "".join(f"Глава {i}. Мороз и солнце; день чудесный!\n" for i in range(20000))
+
+
+def test_roundtrip_and_slices_across_chunk_boundaries(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(Work(id=1, title="Роман", content_length=len(TEXT)))
+            await write_content(session, 1, TEXT)
+            await session.commit()
+
+            assert await read_content(session, 1) == TEXT
+            for start, end in ((0, 10), (16380, 16400), (100000, 140000), (len(TEXT) - 5, len(TEXT))):
+                assert await read_content(session, 1, start, end) == TEXT[start:end]
+            assert (await read_previews(session, [1], 50))[1] == TEXT[:50]
+
+            stored = sum(len(data) for data in (await session.scalars(select(WorkChunk.data))).all())
+            assert stored < len(TEXT.encode('utf-8')) / 3
+
+            await delete_content(session, 1)
+            assert await read_content(session, 1) == ""
+
+    asyncio.run(scenario())
+
+
+def test_pages_break_on_boundaries_within_utf16_limit():
+    paragraph = "Первое предложение абзаца. Второе, подлиннее, с эмодзи 🙂! " * 30
+    text = "\n\n".join([paragraph] * 20) + " " + "😀" * 3000
+    bounds = page_bounds(text, 1000)
+
+    assert all(utf16_length(text[start:end]) <= 1000 for start, end in bounds)
+    # между страницами теряются только пробелы и переводы строк
+    assert ''.join(text[start:end] for start, end in bounds).replace(' ', '').replace('\n', '') == \
+        text.replace(' ', '').replace('\n', '')
+    tail = text.index("😀😀")
+    for start, end in bounds:
+        if end < tail:
+            assert text[end - 2:end] in ('\n\n', '! ', '. ')
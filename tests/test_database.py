@@ -0,0 +1,32 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+
+from core.database import create_engine_from_url
+
+
+def test_sqlite_connections_get_tuned_pragmas(tmp_path):
+    engine = create_engine_from_url(f"sqlite+aiosqlite:///{tmp_path / 'tuned.db'}")
+    assert engine.pool.size() == 10
+
+    async def scenario():
+        async with engine.connect() as conn:
+            pragmas = {
+                name: (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size')
+            }
+        await engine.dispose()
+        return pragmas
+
+    assert asyncio.run(scenario()) == {
+        'journal_mode': 'wal',
+        'synchronous': 1,  # NORMAL
+        'busy_timeout': 5000,
+        'cache_size': -64 * 1024,
+    }
+
+
+def test_pool_options_are_not_forced_on_memory_database():
+    engine = create_engine_from_url("sqlite+aiosqlite://", poolclass=StaticPool)
+    assert isinstance(engine.pool, StaticPool)
@@ -0,0 +1,132 @@
+import asyncio
+import tracemalloc
+from types import SimpleNamespace
+
+from aiogram import Bot
+from aiogram.methods import GetFile
+from aiogram.types import File
+from sqlalchemy import func, select
+
+from core.config import MAX_UPLOAD_SIZE
+from core.content import read_content
+from core.database import OutboxMessage, Session, User, Work, WorkChunk
+from core.ingest import TextDecoder
+from fake_session import FakeMessage, FakeSession, FakeState
+from handlers import author
+
+
+class UploadSession(FakeSession):
+    """Файл отдается блоками по 1000 байт, как при скачивании по сети"""
+
+    def __init__(self, data: bytes):
+        super().__init__()
+        self.data = data
+        self.streamed = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, GetFile):
+            self.requests.append(method)
+            return File(file_id=method.file_id, file_unique_id='u', file_size=len(self.data), file_path='doc.txt')
+        return await super().make_request(bot, method, timeout)
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        for start in range(0, len(self.data), 1000):
+            self.streamed += 1000
+            yield self.data[start:start + 1000]
+
+
+async def upload(data: bytes, file_size: int = None) -> tuple[list, UploadSession]:
+    session = UploadSession(data)
+    message = FakeMessage(1001)
+    message.text = None
+    message.bot = Bot(token='42:TEST', session=session)
+    message.from_user.username = 'writer'
+    message.document = SimpleNamespace(file_id='f', file_name='Роман.TXT',
+                                       file_size=len(data) if file_size is None else file_size)
+    await author.process_work_content(message, FakeState(title="Роман"))
+    return message.sent, session
+
+
+async def seed_users():
+    async with Session() as session:
+        session.add(User(id=1, user_id=1001, role='author'))
+        session.add(User(id=2, user_id=1002, role='moderator'))
+        await session.commit()
+
+
+def test_cp1251_file_is_streamed_into_chunks(db):
+    text = "Глава первая.\r\nМороз и солнце; день чудесный!\r\n" * 5000
+
+    async def scenario():
+        await seed_users()
+        sent, session = await upload(text.encode('cp1251'))
+        async with Session() as db_session:
+            work = await db_session.scalar(select(Work))
+            content = await read_content(db_session, work.id)
+            notified = await db_session.scalar(select(func.count()).select_from(OutboxMessage))
+        return sent, work, content, notified
+
+    sent, work, content, notified = asyncio.run(scenario())
+    assert content == text.replace('\r\n', '\n')
+    assert work.content_length == len(content)
+    assert notified == 1
+    assert f"Длина текста: {len(content)} символов." in sent[0]
+
+
+def test_decoder_handles_split_characters_and_line_breaks():
+    data = "Строка\r\nещё 🙂\r\n".encode('utf-8') * 2000
+    decoder = TextDecoder()
+    text = ''.join(decoder.decode(data[start:start + 7]) for start in range(0, len(data), 7))
+    text += decoder.decode(b'', final=True)
+    assert decoder.encoding == 'utf-8'
+    assert text == "Строка\nещё 🙂\n" * 2000
+
+
+def test_encoding_is_detected_after_ascii_title_page():
+    title = "THE NOVEL\r\nby Somebody\r\n" * 500
+    data = (title + "Глава первая\r\n" * 100).encode('cp1251')
+    decoder = TextDecoder()
+    text = ''.join(decoder.decode(data[start:start + 1000]) for start in range(0, len(data), 1000))
+    text += decoder.decode(b'', final=True)
+    assert decoder.encoding == 'cp1251'
+    assert text == (title + "Глава первая\r\n" * 100).replace('\r\n', '\n')
+
+
+def test_oversized_upload_is_rejected_before_download(db):
+    async def scenario():
+        await seed_users()
+        sent, session = await upload(b'x', file_size=MAX_UPLOAD_SIZE + 1)
+        async with Session() as db_session:
+            works = await db_session.scalar(select(func.count()).select_from(Work))
+        return sent, session.requests, works
+
+    sent, requests, works = asyncio.run(scenario())
+    assert "слишком большой" in sent[0]
+    assert requests == [] and works == 0
+
+
+def test_too_long_text_is_discarded_with_constant_memory(db, monkeypatch):
+    monkeypatch.setattr('core.ingest.MAX_WORK_LENGTH', 1_000_000)
+
+    async def scenario():
+        await seed_users()
+        data = ("Текст без конца. " * 200_000).encode('utf-8')
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            sent, session = await upload(data)
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
+        async with Session() as db_session:
+            works = await db_session.scalar(select(func.count()).select_from(Work))
+            chunks = await db_session.scalar(select(func.count()).select_from(WorkChunk))
+        return sent, session.streamed, len(data), peak, works, chunks
+
+    sent, streamed, size, peak, works, chunks = asyncio.run(scenario())
+    assert "слишком длинный" in sent[0]
+    # загрузка прервана на превышении, а не после скачивания всего файла
+    assert streamed < size * 0.4
+    assert peak < 2 * 2 ** 20
+    assert works == 0 and chunks == 0
@@ -0,0 +1,49 @@
+import asyncio
+
+from conftest import use_database
+from core.database import Session, User, Work, Review
+from core.profiler import profile_queries
+from core.profiles import profiles
+from handlers import reader
+from fake_session import FakeCallback, FakeMessage
+
+
+async def seed(works: int):
+    async with Session() as session:
+        session.add_all([User(id=i, user_id=1000 + i, role='author') for i in range(1, works + 1)])
+        session.add_all([
+            Work(id=i, author_id=i, title=f"Работа {i}", content_length=5, is_approved=True)
+            for i in range(1, works + 1)
+        ])
+        session.add_all([
+            Review(work_id=1, user_id=i, rating=5, review_text="отлично", created_at="2024-01-01")
+            for i in range(1, works + 1)
+        ])
+        await session.commit()
+
+
+def listing_statements(works: int) -> tuple[int, int]:
+    async def scenario():
+        await seed(works)
+        # холодный кэш профилей перед каждым замером
+        profiles._entries.clear()
+        with profile_queries() as read_stats:
+            await reader.read_works(FakeMessage(1001))
+        profiles._entries.clear()
+        with profile_queries() as review_stats:
+            await reader.show_reviews(FakeCallback(1001, "reviews_1"))
+        return read_stats.count, review_stats.count
+
+    return asyncio.run(scenario())
+
+
+def test_listing_statement_count_does_not_grow_with_rows(db, tmp_path):
+    small = listing_statements(3)
+    use_database(tmp_path / 'big.db')
+    big = listing_statements(60)
+
+    # работы + авторы одним join, профили одним IN-запросом и одним upsert,
+    # у отзывов еще сводка из строки works; число запросов не зависит от количества строк
+    for read_count, review_count in (small, big):
+        assert read_count <= 3
+        assert review_count <= 4
@@ -0,0 +1,15 @@
+import asyncio
+
+from perfomance_tests import run_load, ACTIONS
+
+
+def test_harness_drives_real_handlers(tmp_path):
+    report = asyncio.run(run_load(users=5, works=20, reviews_per_work=2, steps=12,
+                                  db_path=str(tmp_path / 'load.db')))
+
+    assert report['errors'] == 0
+    assert report['updates'] > 0
+    assert report['api_calls']['SendMessage'] > 0
+    assert set(report['handlers']) <= {label for label, _ in ACTIONS} | {'start_rate', 'rate', 'review_text'}
+    for row in report['handlers'].values():
+        assert row['p50'] <= row['p95'] <= row['p99']
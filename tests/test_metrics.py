@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.filters import Command
+from aiogram.types import Update
+from aiohttp.test_utils import TestClient, TestServer
+
+from core.metrics import (
+    Metrics, UpdateMetricsMiddleware, HandlerMetricsMiddleware, ApiMetricsMiddleware, build_metrics_app,
+)
+from fake_session import FakeSession
+
+
+def message_update(update_id: int, text: str) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': "User"},
+            'text': text,
+        },
+    }
+
+
+async def ping(message):
+    await message.answer("pong")
+
+
+async def fail(message):
+    raise RuntimeError("boom")
+
+
+def test_middlewares_record_handlers_errors_and_api_calls():
+    registry = Metrics()
+
+    async def scenario():
+        bot = Bot(token='42:TEST', session=FakeSession())
+        bot.session.middleware(ApiMetricsMiddleware(registry))
+        dp = Dispatcher()
+        dp.update.outer_middleware(UpdateMetricsMiddleware(registry))
+        dp.message.middleware(HandlerMetricsMiddleware(registry))
+        dp.message.register(ping, Command('ping'))
+        dp.message.register(fail, Command('fail'))
+
+        for update_id, text in enumerate(['/ping', '/ping', '/fail', 'просто текст']):
+            update = Update.model_validate(message_update(update_id, text), context={'bot': bot})
+            try:
+                await dp.feed_update(bot, update)
+            except RuntimeError:
+                pass
+
+    asyncio.run(scenario())
+    assert registry.updates['message'] == 4
+    assert registry.update_errors['message'] == 1
+    assert registry.unhandled['message'] == 1
+    assert registry.in_flight == 0
+    assert registry.handler_latency['test_metrics.ping'].count == 2
+    assert registry.handler_errors['test_metrics.fail'] == 1
+    assert registry.api_calls['SendMessage'] == 2
+
+    text = registry.render()
+    assert 'bot_updates_total{type="message"} 4' in text
+    assert 'bot_handler_duration_seconds_count{handler="test_metrics.ping"} 2' in text
+    assert 'bot_handler_duration_seconds_bucket{handler="test_metrics.ping",le="+Inf"} 2' in text
+    assert 'bot_api_requests_total{method="SendMessage"} 2' in text
+    assert "test_metrics.ping: 2" in registry.summary()
+
+
+def test_metrics_endpoint():
+    registry = Metrics()
+    registry.updates['message'] += 3
+
+    async def scenario():
+        async with TestClient(TestServer(build_metrics_app(registry))) as client:
+            response = await client.get('/metrics')
+            return response.status, response.content_type, await response.text()
+
+    status, content_type, body = asyncio.run(scenario())
+    assert status == 200
+    assert content_type == 'text/plain'
+    assert 'bot_updates_total{type="message"} 3' in body
@@ -0,0 +1,72 @@
+import asyncio
+import sqlite3
+
+from conftest import use_database
+from core import database
+from core.content import read_content, read_page
+from core.database import Session, Work
+from core.migrations import MIGRATIONS, init_db
+
+# схема bot_database.db до появления миграций
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER NOT NULL, user_id INTEGER, role VARCHAR, PRIMARY KEY (id), UNIQUE (user_id));
+CREATE TABLE works (id INTEGER NOT NULL, author_id INTEGER, title VARCHAR, content VARCHAR, theme VARCHAR,
+    genre VARCHAR, age_restriction INTEGER, is_approved BOOLEAN, rating FLOAT, ratings_count INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(author_id) REFERENCES users (id));
+CREATE TABLE reviews (id INTEGER NOT NULL, work_id INTEGER, user_id INTEGER, rating INTEGER,
+    review_text VARCHAR, created_at VARCHAR, PRIMARY KEY (id),
+    FOREIGN KEY(work_id) REFERENCES works (id), FOREIGN KEY(user_id) REFERENCES users (id));
+"""
+
+TEXT = "Старая работа, сохраненная до переноса в фрагменты.\n" * 1000
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path):
+    path = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO users (id, user_id, role) VALUES (1, 100, 'author')")
+    conn.execute("INSERT INTO works (id, author_id, title, content, is_approved) VALUES (1, 1, 'Старая', ?, 1)",
+                 (TEXT,))
+    conn.executemany("INSERT INTO reviews (id, work_id, user_id, rating) VALUES (?, 1, 1, ?)", [(1, 2), (2, 5)])
+    conn.commit()
+    conn.close()
+
+    engine = use_database(path)
+
+    async def scenario():
+        async with Session() as session:
+            work = await session.get(Work, 1)
+            assert work.content_length == len(TEXT)
+            assert await read_content(session, 1) == TEXT
+            assert (work.stars_2, work.stars_5) == (0, 1)
+            assert work.pages_count > 1
+            pages = [await read_page(session, 1, page) for page in range(work.pages_count)]
+            assert ''.join(pages) == TEXT
+        # повторный запуск ничего не меняет
+        await init_db(engine)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        database.Session.configure(bind=database.engine)
+
+    conn = sqlite3.connect(path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'ix_works_is_approved', 'ix_works_author_id', 'uq_reviews_work_user'} <= indexes
+    assert 'content' not in [row[1] for row in conn.execute("PRAGMA table_info(works)")]
+    assert conn.execute("SELECT id, rating FROM reviews").fetchall() == [(2, 5)]
+    assert conn.execute("SELECT rowid FROM works_fts WHERE works_fts MATCH 'фрагменты'").fetchall() == [(1,)]
+    assert [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")] == \
+        [version for version, _ in MIGRATIONS]
+
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM reviews WHERE work_id = 1 AND user_id = 1"
+    ).fetchall()
+    assert 'uq_reviews_work_user' in str(plan)
+
+
+def test_fresh_database_is_stamped(db):
+    conn = sqlite3.connect(db.url.database)
+    assert [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")] == \
+        [version for version, _ in MIGRATIONS]
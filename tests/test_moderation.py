@@ -0,0 +1,107 @@
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy import select, text, update
+
+from core.database import Session, User, Work
+from core.moderation import claim_next
+from core.profiler import profile_queries
+from handlers import moderator
+from fake_session import FakeCallback, FakeMessage
+
+PENDING = 3000
+
+
+async def seed():
+    async with Session() as session:
+        session.add(User(id=1, user_id=1001, role='author'))
+        session.add(User(id=2, user_id=2001, role='moderator'))
+        session.add(User(id=3, user_id=2002, role='moderator'))
+        session.add_all([
+            Work(id=i, author_id=1, title=f"Работа {i}", content_length=0, is_approved=False)
+            for i in range(1, PENDING + 1)
+        ])
+        # загрузка еще идет - в очередь не попадает
+        session.add(Work(id=PENDING + 1, author_id=1, title="Загружается", content_length=None, is_approved=False))
+        await session.commit()
+
+
+def test_moderators_get_different_works_one_at_a_time(db):
+    async def scenario():
+        await seed()
+        first, second = FakeMessage(2001, "/review"), FakeMessage(2002, "/review")
+        await asyncio.gather(moderator.review_works(first), moderator.review_works(second))
+
+        holder, other = (2001, 2002) if "(ID: 1)" in first.sent[0] else (2002, 2001)
+        again = FakeMessage(holder, "/review")
+        await moderator.review_works(again)
+
+        # второй модератор не может решить судьбу чужой работы
+        foreign = FakeCallback(other, "approve_1")
+        await moderator.approve_work(foreign)
+
+        pages = []
+        callback = FakeCallback(holder, "review_next_1")
+
+        async def edit_text(text, **kwargs):
+            pages.append(text)
+        callback.message = SimpleNamespace(edit_text=edit_text)
+        with profile_queries() as stats:
+            await moderator.review_next(callback)
+
+        async with Session() as session:
+            claims = dict((await session.execute(
+                select(Work.id, Work.claimed_by).where(Work.claimed_by.is_not(None))
+            )).all())
+        return first.sent, second.sent, again.sent, foreign.sent, pages, claims, stats, holder, other
+
+    first, second, again, foreign, pages, claims, stats, holder, other = asyncio.run(scenario())
+    assert len(first) == len(second) == 1
+    assert {first[0].split("\n")[0], second[0].split("\n")[0]} == {"Работа: Работа 1 (ID: 1)", "Работа: Работа 2 (ID: 2)"}
+    # повторный /review возвращает уже закрепленную работу
+    assert again[0].startswith("Работа: Работа 1 (ID: 1)")
+    assert "другой модератор" in foreign[0]
+    # «следующая» пропускает работу второго модератора и возвращает текущую в очередь
+    assert pages[0].startswith("Работа: Работа 3 (ID: 3)")
+    assert claims == {2: other, 3: holder}
+    assert stats.count <= 6
+
+
+def test_expired_lease_returns_to_queue_and_claim_uses_index(db):
+    async def scenario():
+        await seed()
+        async with Session() as session:
+            taken = await claim_next(session, 2001)
+            await session.execute(update(Work).where(Work.id == taken.id).values(claimed_until=1.0))
+            await session.commit()
+        async with Session() as session:
+            reclaimed = await claim_next(session, 2002)
+            await session.commit()
+            plan = (await session.execute(text(
+                "EXPLAIN QUERY PLAN SELECT id FROM works WHERE is_approved = 0 AND content_length IS NOT NULL "
+                "AND (claimed_until < 100 OR claimed_by = 1) ORDER BY id LIMIT 1"
+            ))).all()
+        return taken, reclaimed, plan
+
+    taken, reclaimed, plan = asyncio.run(scenario())
+    assert reclaimed.id == taken.id == 1
+    plan_text = ' '.join(str(row) for row in plan)
+    assert 'ix_works_is_approved' in plan_text and 'TEMP B-TREE' not in plan_text
+
+
+def test_non_moderator_cannot_decide_or_claim(db):
+    async def scenario():
+        await seed()
+        approve = FakeCallback(1001, "approve_1")
+        reject = FakeCallback(1001, "reject_2")
+        await moderator.approve_work(approve)
+        await moderator.reject_work(reject)
+        async with Session() as session:
+            works = (await session.execute(
+                select(Work.id, Work.is_approved, Work.claimed_by).where(Work.id.in_([1, 2])).order_by(Work.id)
+            )).all()
+        return approve.sent + reject.sent, works
+
+    sent, works = asyncio.run(scenario())
+    assert sent == ["У вас нет прав для проверки работ."] * 2
+    assert [tuple(work) for work in works] == [(1, False, None), (2, False, None)]
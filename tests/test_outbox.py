@@ -0,0 +1,86 @@
+import asyncio
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError
+from aiogram.methods import SendMessage
+from sqlalchemy import select
+
+from core.database import Session, User, Work, OutboxMessage
+from core.outbox import OutboxWorker, enqueue
+from handlers import moderator
+from fake_session import FakeCallback
+
+
+class FakeBot:
+    def __init__(self, blocked=(), flaky=()):
+        self.blocked = set(blocked)
+        self.flaky = set(flaky)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        method = SendMessage(chat_id=chat_id, text=text)
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method, "bot was blocked by the user")
+        if chat_id in self.flaky:
+            raise TelegramNetworkError(method, "timeout")
+        self.sent.append((chat_id, text))
+
+
+async def outbox_rows():
+    async with Session() as session:
+        return (await session.scalars(select(OutboxMessage).order_by(OutboxMessage.id))).all()
+
+
+def test_approve_writes_notification_in_same_transaction(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(User(id=1, user_id=1001, role='author'))
+            session.add(User(id=2, user_id=2002, role='moderator'))
+            session.add(Work(id=1, author_id=1, title="Работа", content_length=0, is_approved=False))
+            await session.commit()
+
+        callback = FakeCallback(2002, "approve_1")
+        await moderator.approve_work(callback)
+        return callback.sent, await outbox_rows()
+
+    sent, rows = asyncio.run(scenario())
+    assert sent == ["Работа 'Работа' одобрена."]
+    assert [(row.chat_id, row.attempts) for row in rows] == [(1001, 0)]
+
+
+def test_worker_delivers_retries_and_drops(db):
+    async def scenario():
+        async with Session() as session:
+            enqueue(session, 1, "ok")
+            enqueue(session, 2, "blocked")
+            enqueue(session, 3, "flaky")
+            await session.commit()
+
+        bot = FakeBot(blocked={2}, flaky={3})
+        worker = OutboxWorker(bot, retry_delay=0)
+        processed = await worker.process_batch()
+        after_first = await outbox_rows()
+
+        bot.flaky.clear()
+        await worker.process_batch()
+        return processed, after_first, bot.sent, await outbox_rows()
+
+    processed, after_first, sent, remaining = asyncio.run(scenario())
+    assert processed == 3
+    # доставленное и недоставляемое удалено, временная ошибка - повтор
+    assert [(row.chat_id, row.attempts) for row in after_first] == [(3, 1)]
+    assert sent == [(1, "ok"), (3, "flaky")]
+    assert remaining == []
+
+
+def test_worker_gives_up_after_max_attempts(db):
+    async def scenario():
+        async with Session() as session:
+            enqueue(session, 3, "flaky")
+            await session.commit()
+
+        worker = OutboxWorker(FakeBot(flaky={3}), max_attempts=2, retry_delay=0)
+        await worker.process_batch()
+        await worker.process_batch()
+        return await outbox_rows()
+
+    assert asyncio.run(scenario()) == []
@@ -0,0 +1,40 @@
+import asyncio
+
+from sqlalchemy import select
+
+from core.database import Session, Work
+from core.pagination import keyset_page, parse_page_callback
+
+
+def test_keyset_pages_forward_and_back(db):
+    async def scenario():
+        async with Session() as session:
+            session.add_all([Work(id=i, title=f"w{i}", is_approved=i % 5 != 0) for i in range(1, 31)])
+            await session.commit()
+
+            stmt = select(Work.id).where(Work.is_approved == True)
+            pages = []
+            rows, has_prev, has_next = await keyset_page(session, stmt, Work.id, limit=10)
+            pages.append([row.id for row in rows])
+            assert not has_prev and has_next
+            while has_next:
+                rows, has_prev, has_next = await keyset_page(session, stmt, Work.id, after=rows[-1].id, limit=10)
+                pages.append([row.id for row in rows])
+                assert has_prev
+
+            assert sum(pages, []) == [i for i in range(1, 31) if i % 5 != 0]
+            assert len(pages) == 3
+
+            rows, has_prev, has_next = await keyset_page(session, stmt, Work.id, before=pages[2][0], limit=10)
+            assert [row.id for row in rows] == pages[1]
+            assert has_prev and has_next
+
+            rows, _, _ = await keyset_page(session, stmt, Work.id, limit=10, descending=True)
+            assert rows[0].id == 29
+
+    asyncio.run(scenario())
+
+
+def test_parse_page_callback():
+    assert parse_page_callback("list_next_40") == {'after': 40}
+    assert parse_page_callback("read_prev_11") == {'before': 11}
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+
+import pytest
+from sqlalchemy import select
+
+from core import profiler
+from core.database import Session, User, Work
+from core.profiler import assert_query_budget, profile_queries, statement_shape
+
+
+async def seed():
+    async with Session() as session:
+        session.add_all([User(id=i, user_id=1000 + i, role='author') for i in range(1, 11)])
+        session.add_all([Work(id=i, author_id=i, title=f"Работа {i}", content_length=0, is_approved=True)
+                         for i in range(1, 11)])
+        await session.commit()
+
+
+async def n_plus_one():
+    """Автор каждой работы отдельным запросом"""
+    async with Session() as session:
+        works = (await session.scalars(select(Work))).all()
+        for work in works:
+            await session.scalar(select(User).filter_by(id=work.author_id))
+
+
+def test_repeated_statements_are_detected(db):
+    async def scenario():
+        await seed()
+        with profile_queries() as stats:
+            await n_plus_one()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats.count == 11
+    [(shape, count)] = stats.repeated(threshold=5)
+    assert count == 10
+    assert 'FROM users' in shape
+
+
+def test_query_budget_helper(db):
+    async def within_budget():
+        await seed()
+        with assert_query_budget(1):
+            async with Session() as session:
+                await session.scalars(select(Work))
+
+    async def over_budget():
+        with assert_query_budget(3):
+            await n_plus_one()
+
+    asyncio.run(within_budget())
+    with pytest.raises(AssertionError, match="Query budget exceeded: 11 > 3"):
+        asyncio.run(over_budget())
+
+
+def test_slow_queries_are_logged_with_plan(db, monkeypatch, caplog):
+    monkeypatch.setattr(profiler, 'SLOW_QUERY_THRESHOLD', 0.0)
+
+    async def scenario():
+        async with Session() as session:
+            await session.scalars(select(Work).filter_by(is_approved=True))
+
+    with caplog.at_level(logging.WARNING, logger='core.profiler'):
+        asyncio.run(scenario())
+    slow = [record.getMessage() for record in caplog.records if 'FROM works' in record.getMessage()]
+    assert slow and 'ix_works_is_approved' in slow[0]
+
+
+def test_placeholder_lists_share_a_shape():
+    assert statement_shape("SELECT * FROM t WHERE id IN (?, ?, ?)") == \
+        statement_shape("SELECT *\n FROM t WHERE id IN (?, ?)")
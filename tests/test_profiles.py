@@ -0,0 +1,66 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from core.profiles import ProfileCache, CachedProfile
+
+
+class FakeBot:
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = delay
+
+    async def get_chat(self, chat_id):
+        self.calls.append(chat_id)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        if chat_id < 0:
+            raise RuntimeError("chat not found")
+        return SimpleNamespace(username=f"user{chat_id}", full_name=f"User {chat_id}")
+
+
+def test_misses_are_fetched_with_bounded_concurrency_and_persisted(db):
+    async def scenario():
+        bot = FakeBot(delay=0.01)
+        cache = ProfileCache(fetch_concurrency=3)
+        mentions = await cache.mentions(bot, list(range(1, 21)) + [-1])
+        assert mentions[5] == "@user5"
+        assert mentions[-1] == "id-1"
+        assert bot.max_in_flight <= 3
+        assert len(bot.calls) == 21
+
+        # повтор берется из памяти, новый процесс - из таблицы profiles
+        await cache.mentions(bot, [5])
+        fresh = ProfileCache()
+        assert (await fresh.mentions(bot, [5]))[5] == "@user5"
+        assert len(bot.calls) == 21
+
+    asyncio.run(scenario())
+
+
+def test_remember_and_lru_eviction(db):
+    async def scenario():
+        cache = ProfileCache(maxsize=2)
+        for user_id in (1, 2, 3):
+            await cache.remember(SimpleNamespace(id=user_id, username=f"u{user_id}", full_name="X"))
+        assert list(cache._entries) == [2, 3]
+        assert await cache.find_by_username("u1") == 1
+        assert await cache.find_by_username("U2") == 2
+
+    asyncio.run(scenario())
+
+
+def test_stale_entry_is_served_and_refreshed_in_background(db):
+    async def scenario():
+        bot = FakeBot()
+        cache = ProfileCache(ttl=60)
+        cache._put(7, CachedProfile("old", "Old", time.time() - 120))
+        assert (await cache.mentions(bot, [7]))[7] == "@old"
+        await asyncio.gather(*cache._tasks)
+        assert (await cache.mentions(bot, [7]))[7] == "@user7"
+
+    asyncio.run(scenario())
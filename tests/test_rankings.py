@@ -0,0 +1,93 @@
+import asyncio
+
+from sqlalchemy import text
+
+from core.content import write_content
+from core.database import Session, User, Work, WorkRanking
+from core.rankings import top_works
+from handlers import moderator, reader
+from fake_session import FakeCallback, FakeMessage, FakeState
+
+
+async def submit(work_id: int, title: str, genre: str, approve: bool = True):
+    async with Session() as session:
+        session.add(Work(id=work_id, author_id=1, title=title, genre=genre, content_length=5, is_approved=False))
+        await session.flush()
+        await write_content(session, work_id, "Текст")
+        await session.commit()
+    if approve:
+        await moderator.approve_work(FakeCallback(1001, f"approve_{work_id}"))
+
+
+async def rate(user_id: int, work_id: int, rating: int):
+    await reader.process_review(FakeMessage(user_id, "пропустить"), FakeState(work_id=work_id, rating=rating))
+
+
+def test_top_uses_bayesian_average_and_filters(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(User(id=1, user_id=1001, role='owner'))
+            session.add_all([User(id=i, user_id=1000 + i, role='reader') for i in range(2, 42)])
+            await session.commit()
+        await submit(1, "Одна пятерка", "Поэзия")
+        await submit(2, "Много четверок", "Проза")
+        await submit(3, "Без оценок", "Проза")
+        await submit(4, "Не одобрена", "Проза", approve=False)
+
+        await rate(1002, 1, 5)
+        for user_id in range(1002, 1042):
+            await rate(user_id, 2, 4)
+
+        async with Session() as session:
+            overall = await top_works(session)
+            prose = await top_works(session, genre=" проза ")
+            plan = (await session.execute(text(
+                "EXPLAIN QUERY PLAN SELECT work_id FROM work_rankings WHERE genre = 'проза' "
+                "ORDER BY score DESC, work_id DESC LIMIT 10"
+            ))).all()
+
+        message = FakeMessage(1002, "/top genre Поэзия")
+        await reader.top(message)
+        return overall, prose, plan, message.sent
+
+    overall, prose, plan, sent = asyncio.run(scenario())
+    # 40 четверок выше одной пятерки; работа без оценок получает априорное среднее
+    assert [row.id for row in overall] == [2, 1, 3]
+    assert overall[0].score > overall[1].score > overall[2].score == 3.0
+    assert [row.id for row in prose] == [2, 3]
+    assert 'ix_work_rankings_genre_score' in ' '.join(str(row) for row in plan)
+    assert "Одна пятерка" in sent[0] and "Много четверок" not in sent[0]
+
+
+def test_deleted_work_leaves_top(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(User(id=1, user_id=1001, role='owner'))
+            await session.commit()
+        await submit(1, "Работа", "Проза")
+        await moderator.delete_work(FakeMessage(1001, "/delete_work 1"))
+        async with Session() as session:
+            return await session.get(WorkRanking, 1)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_rated_pending_work_stays_out_of_top(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(User(id=1, user_id=1001, role='owner'))
+            session.add(User(id=2, user_id=1002, role='reader'))
+            await session.commit()
+        await submit(1, "Одобренная", "Проза")
+        await submit(7, "Секретная неодобренная", "Проза", approve=False)
+        # оценка по подделанной кнопке rate_5_7
+        await rate(1002, 7, 5)
+
+        async with Session() as session:
+            ranked = (await session.execute(text("SELECT work_id FROM work_rankings"))).scalars().all()
+            overall = await top_works(session)
+        return ranked, overall
+
+    ranked, overall = asyncio.run(scenario())
+    assert ranked == [1]
+    assert [row.id for row in overall] == [1]
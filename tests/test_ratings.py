@@ -0,0 +1,68 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from core import database
+from core.database import Session, User, Work, Review
+from handlers import reader
+from fake_session import FakeMessage, FakeState
+
+RATERS = 300
+
+
+async def rate(user_id: int, rating: int, text: str = "пропустить") -> list:
+    message = FakeMessage(user_id, text)
+    await reader.process_review(message, FakeState(work_id=1, rating=rating))
+    return message.sent
+
+
+def test_concurrent_ratings_are_not_lost(db):
+    async def scenario():
+        # пул соединений как в работе бота: одновременных транзакций не больше его размера
+        engine = database.create_engine_from_url(db.url)
+        database.Session.configure(bind=engine)
+        async with Session() as session:
+            session.add(User(id=1, user_id=1, role='author'))
+            session.add_all([User(id=i, user_id=1000 + i, role='reader') for i in range(2, RATERS + 2)])
+            session.add(Work(id=1, author_id=1, title="Работа", content_length=0, is_approved=True,
+                             rating=0.0, rating_sum=0, ratings_count=0))
+            await session.commit()
+
+        ratings = {1000 + i: 1 + i % 5 for i in range(2, RATERS + 2)}
+        # каждый пользователь оценивает дважды одновременно: с отзывом и без
+        replies = await asyncio.gather(*(
+            rate(user_id, rating, text)
+            for user_id, rating in ratings.items()
+            for text in ("пропустить", "Хорошо")
+        ))
+
+        async with Session() as session:
+            work = await session.get(Work, 1)
+            reviews = await session.scalar(select(func.count(Review.id)))
+        await engine.dispose()
+        return ratings, replies, work, reviews
+
+    ratings, replies, work, reviews = asyncio.run(scenario())
+    duplicates = sum(1 for sent in replies if sent == ["Вы уже оценивали эту работу!"])
+    assert duplicates == RATERS
+    assert reviews == RATERS
+    assert work.ratings_count == RATERS
+    assert work.rating_sum == sum(ratings.values())
+    assert work.rating == sum(ratings.values()) / RATERS
+
+
+def test_rating_without_review_is_stored_and_blocks_repeat(db):
+    async def scenario():
+        async with Session() as session:
+            session.add_all([User(id=1, user_id=1, role='author'), User(id=2, user_id=2, role='reader')])
+            session.add(Work(id=1, author_id=1, title="Работа", content_length=0, is_approved=True))
+            await session.commit()
+        first = await rate(2, 5)
+        second = await rate(2, 1)
+        async with Session() as session:
+            return first, second, await session.get(Work, 1)
+
+    first, second, work = asyncio.run(scenario())
+    assert first == ["Спасибо за вашу оценку! Текущий рейтинг работы: 5.00⭐ (1 оценок)"]
+    assert second == ["Вы уже оценивали эту работу!"]
+    assert (work.rating, work.ratings_count) == (5.0, 1)
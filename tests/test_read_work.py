@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+
+from conftest import submit
+from core.config import MAX_MESSAGE_LENGTH
+from core.database import Session, User, Work
+from core.profiler import profile_queries
+from core.utils import utf16_length
+from handlers import moderator, reader
+from fake_session import FakeCallback, FakeMessage
+
+CHAPTER = "Глава {}.\n\n" + "Длинное предложение о героях и их приключениях, без переносов строк. " * 40 + "\n\n"
+TEXT = "".join(CHAPTER.format(i) for i in range(60))
+
+
+def test_work_is_read_page_by_page(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(User(id=1, user_id=1001, role='owner'))
+            await session.commit()
+        await submit(1, "Роман", TEXT)
+        await moderator.approve_work(FakeCallback(1001, "approve_1"))
+
+        message = FakeMessage(1001, "/read_work 1")
+        await reader.read_work(message)
+
+        pages = []
+        callback = FakeCallback(1001, "page_1_next_1")
+
+        async def edit_text(text, **kwargs):
+            pages.append((text, kwargs['reply_markup']))
+        callback.message = SimpleNamespace(edit_text=edit_text)
+        with profile_queries() as stats:
+            await reader.read_work_page(callback)
+
+        async with Session() as session:
+            pages_count = (await session.get(Work, 1)).pages_count
+        last = FakeCallback(1001, f"page_1_next_{pages_count}")
+        await reader.read_work_page(last)
+        return message.sent, pages, stats, pages_count, last.sent
+
+    sent, pages, stats, pages_count, beyond = asyncio.run(scenario())
+    # первая страница и сообщение с действиями вместо всего текста сразу
+    assert len(sent) == 2 and pages_count > 10
+    assert sent[0].startswith("📖 Роман") and sent[0].endswith(f"Страница 1 из {pages_count}")
+    text, keyboard = pages[0]
+    assert utf16_length(text) <= MAX_MESSAGE_LENGTH
+    assert f"Страница 2 из {pages_count}" in text
+    assert [button.callback_data for button in keyboard.inline_keyboard[0]] == ["page_1_prev_0", "page_1_next_2"]
+    # страница обрывается на конце предложения или абзаца
+    assert text.split("\n\n📄")[0].endswith(".")
+    # работа, страница, фрагменты текста
+    assert stats.count == 3
+    assert beyond == ["Здесь больше ничего нет."]
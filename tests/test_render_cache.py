@@ -0,0 +1,73 @@
+import asyncio
+
+from core.database import Session, User, Work
+from core.profiler import profile_queries
+from core.render_cache import RenderCache, renders
+from handlers import moderator, reader
+from fake_session import FakeCallback, FakeMessage, FakeState
+
+
+def test_repeated_pages_skip_database_until_data_changes(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(User(id=1, user_id=1001, role='owner'))
+            session.add(Work(id=1, author_id=1, title="Первая", content_length=0, is_approved=True,
+                             rating=0.0, rating_sum=0, ratings_count=0))
+            session.add(Work(id=2, author_id=1, title="Вторая", content_length=0, is_approved=False))
+            await session.commit()
+
+        first = FakeMessage(1001, "/works_list")
+        await reader.works_list(first)
+        await reader.read_works(FakeMessage(1001, "/read"))
+        hits_before = renders.hits
+        with profile_queries() as stats:
+            cached = FakeMessage(1001, "/works_list")
+            await reader.works_list(cached)
+            await reader.read_works(FakeMessage(1001, "/read"))
+            await reader.show_reviews(FakeCallback(1001, "reviews_1"))
+            await reader.show_reviews(FakeCallback(1001, "reviews_1"))
+        hits = renders.hits - hits_before
+
+        await moderator.approve_work(FakeCallback(1001, "approve_2"))
+        approved = FakeMessage(1001, "/works_list")
+        await reader.works_list(approved)
+
+        await reader.process_review(FakeMessage(1001, "Отлично"), FakeState(work_id=1, rating=5))
+        rated = FakeMessage(1001, "/works_list")
+        await reader.works_list(rated)
+        reviews = FakeCallback(1001, "reviews_1")
+        await reader.show_reviews(reviews)
+        return first.sent, cached.sent, stats, hits, approved.sent, rated.sent, reviews.sent
+
+    first, cached, stats, hits, approved, rated, reviews = asyncio.run(scenario())
+    assert cached == first
+    # из базы читаются только сводка и страница отзывов при первом открытии
+    assert stats.count == 2
+    assert hits == 3
+    assert "Вторая" in approved[0]
+    assert "⭐5.0" in rated[0]
+    assert "Отлично" in reviews[0]
+
+
+def test_cache_evicts_least_recently_used_within_memory_limit():
+    async def scenario():
+        cache = RenderCache(max_bytes=2000)
+        renders_done = []
+
+        async def render(key):
+            renders_done.append(key)
+            return "x" * 500
+
+        for key in range(3):
+            await cache.get_or_render(key, (), lambda key=key: render(key))
+        await cache.get_or_render(0, (), lambda: render(0))
+        await cache.get_or_render(3, (), lambda: render(3))
+        await cache.get_or_render(0, (), lambda: render(0))
+        await cache.get_or_render(1, (), lambda: render(1))
+        return cache, renders_done
+
+    cache, renders_done = asyncio.run(scenario())
+    assert cache.size <= cache.max_bytes
+    # ключ 1 вытеснен (давно не использовался), 0 остался
+    assert renders_done == [0, 1, 2, 3, 1]
+    assert (cache.hits, cache.misses) == (2, 5)
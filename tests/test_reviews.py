@@ -0,0 +1,80 @@
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from core.config import MAX_MESSAGE_LENGTH
+from core.database import Session, User, Work
+from core.utils import utf16_length
+from handlers import reader
+from fake_session import FakeCallback, FakeMessage, FakeState
+
+RATINGS = [5, 5, 4, 5, 3, 1, 5, 4, 4, 5, 2, 5]
+
+
+def test_reviews_show_histogram_and_newest_first_pages(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(User(id=1, user_id=1001, role='author'))
+            session.add_all([User(id=i + 2, user_id=2000 + i, role='reader') for i in range(len(RATINGS))])
+            session.add(Work(id=1, author_id=1, title="Роман", content_length=0, is_approved=True,
+                             rating=0.0, rating_sum=0, ratings_count=0))
+            await session.commit()
+        for i, rating in enumerate(RATINGS):
+            # последняя оценка - без отзыва
+            review = "пропустить" if i == len(RATINGS) - 1 else f"Отзыв {i}"
+            await reader.process_review(FakeMessage(2000 + i, review), FakeState(work_id=1, rating=rating))
+
+        first = FakeCallback(1001, "reviews_1")
+
+        async def answer_with_markup(text=None, reply_markup=None, **kwargs):
+            if text is not None:
+                first.sent.append(text)
+                first.sent_markup = reply_markup
+        first.answer = answer_with_markup
+        await reader.show_reviews(first)
+
+        pages = []
+
+        async def edit_text(text, **kwargs):
+            pages.append((text, kwargs['reply_markup']))
+        callback = FakeCallback(1001, first.sent_markup.inline_keyboard[0][0].callback_data)
+        callback.message = SimpleNamespace(edit_text=edit_text)
+        await reader.show_reviews(callback)
+
+        async with Session() as session:
+            plan = (await session.execute(text(
+                "EXPLAIN QUERY PLAN SELECT id FROM reviews WHERE work_id = 1 AND review_text IS NOT NULL "
+                "AND id < 8 ORDER BY id DESC LIMIT 6"
+            ))).all()
+        return first.sent[0], pages[0], plan
+
+    first, (second, keyboard), plan = asyncio.run(scenario())
+    assert "⭐ 4.0 (12 оценок)" in first
+    assert "5★ ▇▇▇▇▇▇▇▇▇▇ 6" in first and "2★ ▇▇ 1" in first
+    # новые отзывы первыми, по REVIEWS_PAGE_SIZE на странице, без оценки без отзыва
+    assert [line for line in first.split("\n") if line.startswith("Отзыв:")] == \
+        [f"Отзыв: Отзыв {i}" for i in (10, 9, 8, 7, 6)]
+    assert [line for line in second.split("\n") if line.startswith("Отзыв:")] == \
+        [f"Отзыв: Отзыв {i}" for i in (5, 4, 3, 2, 1)]
+    assert [button.text for button in keyboard.inline_keyboard[0]] == ["⬅️ Назад", "Вперед ➡️"]
+    plan_text = ' '.join(str(row) for row in plan)
+    assert 'ix_reviews_work_id' in plan_text and 'TEMP B-TREE' not in plan_text
+
+
+def test_emoji_reviews_fit_in_one_message(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(User(id=1, user_id=1001, role='author'))
+            session.add_all([User(id=i + 2, user_id=2000 + i, role='reader') for i in range(5)])
+            session.add(Work(id=1, author_id=1, title="😀" * 300, content_length=0, is_approved=True,
+                             rating=0.0, rating_sum=0, ratings_count=0))
+            await session.commit()
+        for i in range(5):
+            await reader.process_review(FakeMessage(2000 + i, "😀" * 600), FakeState(work_id=1, rating=5))
+        text, _ = await reader.render_reviews(FakeMessage(1001).bot, 1)
+        return text
+
+    text = asyncio.run(scenario())
+    assert utf16_length(text) <= MAX_MESSAGE_LENGTH
+    assert text.count("😀" * 249 + "…") == 5
@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from conftest import submit
+from core.database import Session, User
+from core.pagination import filter_token
+from core.search import search_works, build_match_query
+from handlers import moderator, reader
+from fake_session import FakeCallback, FakeMessage, FakeState
+
+
+def test_search_ranks_and_highlights_approved_works(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(User(id=1, user_id=1001, role='author'))
+            session.add(User(id=2, user_id=1002, role='moderator'))
+            await session.commit()
+        await submit(1, "Морская история", "Корабль вышел в море на рассвете.")
+        await submit(2, "Лесная сказка", "В лесу жил старый моряк, который вспоминал море.")
+        await submit(3, "Черновик про море", "Еще не одобрено.")
+        for work_id in (1, 2):
+            await moderator.approve_work(FakeCallback(1002, f"approve_{work_id}"))
+
+        async with Session() as session:
+            hits, has_next = await search_works(session, "море")
+            prefix_hits, _ = await search_works(session, "мор")
+        return hits, has_next, prefix_hits
+
+    hits, has_next, prefix_hits = asyncio.run(scenario())
+    # неодобренная работа не ищется; совпадение в названии выше
+    assert [hit.id for hit in hits] == [1, 2]
+    assert not has_next
+    assert '<b>море</b>' in hits[1].snippet_html()
+    assert {hit.id for hit in prefix_hits} == {1, 2}
+
+
+def test_search_pages_and_deletion(db):
+    async def scenario():
+        async with Session() as session:
+            session.add(User(id=1, user_id=1001, role='owner'))
+            await session.commit()
+        for work_id in range(1, 14):
+            await submit(work_id, f"Рассказ {work_id}", "Про дракона и рыцаря.")
+            await moderator.approve_work(FakeCallback(1001, f"approve_{work_id}"))
+
+        state = FakeState()
+        message = FakeMessage(1001, "/search дракон")
+        await reader.search(message, state)
+
+        await reader.search(FakeMessage(1001, "/search рыцар"), state)
+        # кнопка первого сообщения листает свой запрос, а не последний
+        callback = FakeCallback(1001, f"search_{filter_token('дракон')}_next_1")
+        callback.message = SimpleNamespace(edit_text=None)
+        pages = []
+
+        async def edit_text(text, **kwargs):
+            pages.append(text)
+        callback.message.edit_text = edit_text
+        await reader.search_page(callback, state)
+
+        stale = FakeCallback(1001, "search_next_1")
+        await reader.search_page(stale, state)
+
+        await moderator.delete_work(FakeMessage(1001, "/delete_work 1"))
+        async with Session() as session:
+            indexed = await session.scalar(text("SELECT count(*) FROM works_fts"))
+        return message.sent, state.data, pages, stale.sent, indexed
+
+    sent, data, pages, stale, indexed = asyncio.run(scenario())
+    assert sent[0].count("ID: ") == 10
+    assert list(data['search_queries'].values()) == ["дракон", "рыцар"]
+    assert pages[0].count("ID: ") == 3 and "дракон" in pages[0]
+    assert stale == ["Поиск устарел, повторите /search."]
+    assert indexed == 12
+
+
+def test_match_query_is_sanitized():
+    assert build_match_query('море" OR title:*') == '"море"* "or" "title"*'
+    assert build_match_query('!!!') is None
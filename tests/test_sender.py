@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage, GetChat
+
+from core.sender import (
+    OutboundScheduler, ThrottlingRequestMiddleware, send_priority,
+    PRIORITY_REPLY, PRIORITY_NOTIFICATION,
+)
+
+
+def test_replies_are_granted_before_notifications():
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=5, chat_rate=100, chat_burst=100)
+        scheduler.global_bucket.tokens = 0
+        order = []
+
+        async def send(name, chat_id, priority):
+            await scheduler.acquire(chat_id, priority)
+            order.append(name)
+
+        await asyncio.gather(
+            send('notification-1', 1, PRIORITY_NOTIFICATION),
+            send('notification-2', 2, PRIORITY_NOTIFICATION),
+            send('reply', 3, PRIORITY_REPLY),
+        )
+        return order
+
+    assert asyncio.run(scenario())[0] == 'reply'
+
+
+def test_per_chat_limit_does_not_block_other_chats():
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, chat_rate=10, chat_burst=1)
+        finished = {}
+
+        async def send(chat_id):
+            await scheduler.acquire(chat_id)
+            finished.setdefault(chat_id, []).append(time.monotonic())
+
+        started = time.monotonic()
+        await asyncio.gather(*(send(1) for _ in range(5)), send(2))
+        return started, finished
+
+    started, finished = asyncio.run(scenario())
+    assert finished[2][0] - started < 0.05
+    assert finished[1][-1] - started >= 0.35
+
+
+def test_retry_after_backs_off_and_retries():
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, chat_rate=1000, chat_burst=10)
+        middleware = ThrottlingRequestMiddleware(scheduler, max_retries=2)
+        calls = []
+
+        async def make_request(bot, method):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise TelegramRetryAfter(method, "Flood control exceeded", retry_after=0.2)
+            return "ok"
+
+        with send_priority(PRIORITY_NOTIFICATION):
+            result = await middleware(make_request, None, SendMessage(chat_id=5, text="hi"))
+        # запросы, не отправляющие сообщения, не ждут очередь
+        assert await middleware(make_request, None, GetChat(chat_id=5)) == "ok"
+        return result, calls
+
+    result, calls = asyncio.run(scenario())
+    assert result == "ok"
+    assert calls[1] - calls[0] >= 0.19
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import select, update
+
+from core.database import Session, FsmState
+from core.storage import DatabaseStorage
+from states.states import AuthorStates
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=42, chat_id=user_id, user_id=user_id)
+
+
+async def stored_keys():
+    async with Session() as session:
+        return set((await session.scalars(select(FsmState.key))).all())
+
+
+def test_state_survives_restart(db):
+    async def scenario():
+        storage = DatabaseStorage(flush_interval=60)
+        await storage.set_state(key(1), AuthorStates.waiting_for_content)
+        await storage.update_data(key(1), {'title': "Работа"})
+        # до сброса в базе ничего нет
+        before_flush = await stored_keys()
+        await storage.close()
+
+        restarted = DatabaseStorage()
+        return before_flush, await restarted.get_state(key(1)), await restarted.get_data(key(1))
+
+    before_flush, state, data = asyncio.run(scenario())
+    assert before_flush == set()
+    assert state == AuthorStates.waiting_for_content.state
+    assert data == {'title': "Работа"}
+
+
+def test_writes_are_flushed_in_background_and_cleared_rows_removed(db):
+    async def scenario():
+        storage = DatabaseStorage(flush_interval=0.05)
+        for user_id in range(1, 6):
+            await storage.set_state(key(user_id), AuthorStates.waiting_for_title)
+        await asyncio.sleep(0.2)
+        flushed = await stored_keys()
+
+        await storage.set_state(key(1), None)
+        await asyncio.sleep(0.2)
+        return len(flushed), len(await stored_keys())
+
+    assert asyncio.run(scenario()) == (5, 4)
+
+
+def test_abandoned_conversations_expire(db):
+    async def scenario():
+        storage = DatabaseStorage(ttl=3600)
+        await storage.set_state(key(1), AuthorStates.waiting_for_title)
+        await storage.set_state(key(2), AuthorStates.waiting_for_title)
+        await storage.flush()
+        async with Session() as session:
+            await session.execute(
+                update(FsmState).where(FsmState.key == storage.key_builder.build(key(1)))
+                .values(updated_at=time.time() - 7200)
+            )
+            await session.commit()
+
+        restarted = DatabaseStorage(ttl=3600)
+        expired_state = await restarted.get_state(key(1))
+        await restarted.flush()
+        return expired_state, len(await stored_keys())
+
+    assert asyncio.run(scenario()) == (None, 1)
+
+
+def test_cache_is_bounded(db):
+    async def scenario():
+        storage = DatabaseStorage(max_size=10)
+        for user_id in range(100):
+            await storage.set_state(key(user_id), AuthorStates.waiting_for_title)
+        await storage.flush()
+        cached = len(storage._entries)
+        # вытесненная запись читается из базы
+        return cached, await storage.get_state(key(0))
+
+    assert asyncio.run(scenario()) == (10, AuthorStates.waiting_for_title.state)
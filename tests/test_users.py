@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from core.database import Profile, Session, User
+from core.pagination import filter_token
+from core.profiles import search_key
+from handlers import admin
+from fake_session import FakeCallback, FakeMessage, FakeState
+
+NAMES = ["Иван Петров", "ирина Смирнова", "Anna Lee", "Пётр Иванов"]
+
+
+async def seed(users: int):
+    async with Session() as session:
+        session.add(User(id=1, user_id=1, role='owner'))
+        session.add_all([
+            User(id=i, user_id=2000 + i, role='author' if i % 3 == 0 else 'reader')
+            for i in range(2, users + 1)
+        ])
+        session.add_all([
+            Profile(user_id=2000 + i, username=f"User{i}", full_name=NAMES[i % len(NAMES)],
+                    username_key=search_key(f"User{i}"), name_key=search_key(NAMES[i % len(NAMES)]))
+            for i in range(2, users + 1)
+        ])
+        await session.commit()
+
+
+async def run(text: str, state: FakeState) -> tuple[list, int]:
+    message = FakeMessage(1, text)
+    calls = []
+
+    async def get_chat(chat_id):
+        calls.append(chat_id)
+    message.bot = SimpleNamespace(get_chat=get_chat)
+    await admin.list_users(message, state)
+    return message.sent, len(calls)
+
+
+def test_users_are_filtered_paged_and_counted(db):
+    async def scenario():
+        await seed(300)
+        state = FakeState()
+        everyone, chats = await run("/users", state)
+        authors, _ = await run("/users автор", state)
+
+        pages = []
+        token = filter_token({'role': 'author', 'prefix': None})
+        callback = FakeCallback(1, f"users_{token}_next_31")
+
+        async def edit_text(text, **kwargs):
+            pages.append(text)
+        callback.message = SimpleNamespace(edit_text=edit_text)
+        await admin.list_users_page(callback, state)
+
+        by_name, _ = await run("/users reader ИР", state)
+        by_id, _ = await run("/users 229", state)
+        nobody, _ = await run("/users moderator", state)
+
+        async with Session() as session:
+            plan = (await session.execute(text(
+                "EXPLAIN QUERY PLAN SELECT id FROM users WHERE role = 'author' AND id > 10 ORDER BY id LIMIT 11"
+            ))).all()
+        return everyone[0], chats, authors[0], pages[0], by_name[0], by_id[0], nobody[0], plan
+
+    everyone, chats, authors, page, by_name, by_id, nobody, plan = asyncio.run(scenario())
+    assert chats == 0
+    assert "Всего: 300 (автор: 100, владелец: 1, читатель: 199)" in everyone
+    assert everyone.count("• ") == 10
+    assert authors.count("Роль: автор") == 10 and "Роль: читатель" not in authors
+    # следующая страница авторов после id 31
+    assert "ID: 2033" in page and "ID: 2030" not in page
+    # префикс имени без учета регистра, в том числе кириллица
+    names = [line for line in by_name.split("\n") if line.startswith("• ")]
+    assert names and all(line.startswith("• ирина Смирнова") for line in names)
+    assert "Роль: автор" not in by_name
+    assert sorted(int(line.split("ID: ")[1]) for line in by_id.split("\n") if "ID: " in line) == \
+        list(range(2290, 2300))
+    assert nobody == "Пользователи не найдены."
+    plan_text = ' '.join(str(row) for row in plan)
+    assert 'ix_users_role_id' in plan_text and 'TEMP B-TREE' not in plan_text
+
+
+def test_unusual_prefixes_do_not_fail(db):
+    async def scenario():
+        await seed(30)
+        async with Session() as session:
+            session.add(User(id=100, user_id=12345, role='reader'))
+            await session.commit()
+        state = FakeState()
+        bare_at, _ = await run("/users @", state)
+        overlong, _ = await run("/users 99999999999999999999", state)
+        zeros, _ = await run("/users 00012", state)
+        plain, _ = await run("/users 12", state)
+        return bare_at[0], overlong[0], zeros[0], plain[0]
+
+    bare_at, overlong, zeros, plain = asyncio.run(scenario())
+    assert "Всего: 31" in bare_at and bare_at.count("• ") == 10
+    assert overlong == "Пользователи не найдены."
+    assert zeros == "Пользователи не найдены."
+    assert "ID: 12345" in plain
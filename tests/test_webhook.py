@@ -0,0 +1,142 @@
+import asyncio
+import os
+import signal
+import time
+
+import aiohttp
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.filters import Command
+from aiohttp.test_utils import TestClient, TestServer, unused_port
+
+from core import webhook
+from core.webhook import build_app
+from fake_session import FakeSession
+
+SECRET = 'test-secret'
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+            'text': text,
+        },
+    }
+
+
+def make_app(handled: list, delay: float = 0.0, **kwargs):
+    bot = Bot(token='42:TEST', session=FakeSession())
+    dp = Dispatcher()
+
+    @dp.message(Command('ping'))
+    async def ping(message):
+        await asyncio.sleep(delay)
+        handled.append(message.from_user.id)
+        await message.answer("pong")
+
+    return bot, build_app(dp, bot, secret_token=SECRET, **kwargs)
+
+
+def test_updates_are_handled_concurrently_and_drained():
+    handled = []
+
+    async def scenario():
+        bot, app = make_app(handled, delay=0.3)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+
+        started = time.monotonic()
+        responses = await asyncio.gather(*(
+            client.post('/webhook', json=make_update(i, 100 + i, '/ping'),
+                        headers={'X-Telegram-Bot-Api-Secret-Token': SECRET})
+            for i in range(10)
+        ))
+        acknowledged = time.monotonic() - started
+
+        # остановка сервера дожидается начатых обработчиков
+        await client.close()
+        return [response.status for response in responses], acknowledged, bot.session
+
+    statuses, acknowledged, session = asyncio.run(scenario())
+    assert statuses == [200] * 10
+    # Telegram получает ответ до завершения обработчиков
+    assert acknowledged < 0.3
+    assert sorted(handled) == list(range(100, 110))
+    assert session.sent_texts() == ["pong"] * 10
+
+
+def test_wrong_secret_is_rejected():
+    handled = []
+
+    async def scenario():
+        _, app = make_app(handled)
+        async with TestClient(TestServer(app)) as client:
+            wrong = await client.post('/webhook', json=make_update(1, 100, '/ping'),
+                                      headers={'X-Telegram-Bot-Api-Secret-Token': 'wrong'})
+            missing = await client.post('/webhook', json=make_update(2, 100, '/ping'))
+            return wrong.status, missing.status
+
+    assert asyncio.run(scenario()) == (401, 401)
+    assert handled == []
+
+
+def test_sigterm_drains_webhook_updates(monkeypatch):
+    handled = []
+    port = unused_port()
+    monkeypatch.setattr(webhook, 'WEBHOOK_HOST', '127.0.0.1')
+    monkeypatch.setattr(webhook, 'WEBHOOK_PORT', port)
+    monkeypatch.setattr(webhook, 'WEBHOOK_URL', 'https://bot.example.com')
+    monkeypatch.setattr(webhook, 'WEBHOOK_SECRET', SECRET)
+
+    async def scenario():
+        bot = Bot(token='42:TEST', session=FakeSession())
+        dp = Dispatcher()
+
+        @dp.message(Command('ping'))
+        async def ping(message):
+            await asyncio.sleep(0.3)
+            handled.append(message.from_user.id)
+
+        server = asyncio.create_task(webhook.run_webhook(dp, bot))
+        await asyncio.sleep(0.2)
+        async with aiohttp.ClientSession() as client:
+            response = await client.post(f'http://127.0.0.1:{port}/webhook', json=make_update(1, 100, '/ping'),
+                                         headers={'X-Telegram-Bot-Api-Secret-Token': SECRET})
+        os.kill(os.getpid(), signal.SIGTERM)
+        # run_webhook завершается сам, дождавшись обработчика
+        await asyncio.wait_for(server, timeout=5)
+        return response.status
+
+    assert asyncio.run(scenario()) == 200
+    assert handled == [100]
+
+
+def test_webhook_without_configured_secret_still_checks_token(monkeypatch):
+    port = unused_port()
+    monkeypatch.setattr(webhook, 'WEBHOOK_HOST', '127.0.0.1')
+    monkeypatch.setattr(webhook, 'WEBHOOK_PORT', port)
+    monkeypatch.setattr(webhook, 'WEBHOOK_URL', 'https://bot.example.com')
+    monkeypatch.setattr(webhook, 'WEBHOOK_SECRET', None)
+
+    async def scenario():
+        bot = Bot(token='42:TEST', session=FakeSession())
+        stop = asyncio.Event()
+        server = asyncio.create_task(webhook.run_webhook(Dispatcher(), bot, stop))
+        await asyncio.sleep(0.2)
+        async with aiohttp.ClientSession() as client:
+            response = await client.post(f'http://127.0.0.1:{port}/webhook', json=make_update(1, 1, '/setrole'))
+        stop.set()
+        await asyncio.wait_for(server, timeout=5)
+        registered = next(method for method in bot.session.requests if type(method).__name__ == 'SetWebhook')
+        return response.status, registered.secret_token
+
+    status, secret = asyncio.run(scenario())
+    assert status == 401
+    assert secret and len(secret) >= 32
+    with pytest.raises(ValueError):
+        build_app(Dispatcher(), Bot(token='42:TEST', session=FakeSession()), secret_token=None)